@@ -1,10 +1,9 @@
 # agents/ask_agent.py
 import json
 from typing import Dict, Any, List
-from langchain_ollama import ChatOllama
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
+from langchain.schema import BaseMessage
 from .base_agent import STATE, log_event
+from .langchain_core import ask_chain
 
 
 class AskAgent:
@@ -14,26 +13,7 @@ class AskAgent:
     """
 
     def __init__(self):
-        self.llm = ChatOllama(model="llama3", temperature=0.4, num_ctx=4096)
-        self.prompt = PromptTemplate.from_template("""
-You are an explainable fitness assistant.
-You have access to:
-- user plans (workout + meals)
-- agent logs (actions + reasons)
-- rules that affected these plans
-
-Answer the user's question in simple, supportive, and factual tone.
-If the answer cannot be found, say "I don't have enough data to answer that."
-
-USER QUESTION:
-{question}
-
-USER STATE DATA:
-{context}
-
-Your answer:
-""")
-        self.chain = LLMChain(prompt=self.prompt, llm=self.llm)
+        self.chain = ask_chain
 
     def answer(self, user_id: str, question: str) -> Dict[str, Any]:
         # Collect contextual data
@@ -48,13 +28,12 @@ Your answer:
         }
 
         try:
-            # Replace chain.run with chain.invoke
+            # sort_keys keeps the serialized state byte-stable, so repeat questions hit the prompt cache
             response = self.chain.invoke({
                 "question": question,
-                "context": json.dumps(context, indent=2)
+                "context": json.dumps(context, indent=2, sort_keys=True, default=str)
             })
-            # Extract text from the response object
-            response_text = response.get('text', '')
+            response_text = response.content if isinstance(response, BaseMessage) else str(response)
         except Exception as e:
             response_text = f"Sorry, I couldn't process that: {e}"
 
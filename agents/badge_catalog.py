@@ -0,0 +1,132 @@
+# agents/badge_catalog.py
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Badge(NamedTuple):
+    """
+    One declarative badge. Kinds:
+      total   `agg` (sum/avg/max/min/count) of `metric` over every entry of `stream`
+      window  `agg` of `metric` over the last `window` entries that have it
+      streak  consecutive days with an entry (whose `metric` passes `qualify`), `threshold` days long
+      recent  entries dated within the last `window` days
+    The badge is earned when the value compares (`cmp`: ge/le) to `threshold`.
+    """
+    name: str
+    stream: str              # "progress" | "wearables"
+    kind: str
+    metric: Optional[str]    # None: any entry counts
+    agg: str = "count"
+    window: int = 0
+    threshold: float = 1
+    cmp: str = "ge"
+    qualify: Optional[float] = None
+    reason: str = ""
+
+
+def _k(n: float) -> str:
+    return f"{n / 1000:g}k" if n >= 1000 else f"{n:g}"
+
+
+# The three original badges come first, and the catalog is append-only: a badge's
+# position is its bit in each user's earned-badge bitmap.
+CATALOG: List[Badge] = [
+    Badge("Consistency Star", "progress", "recent", None, window=7, threshold=4, reason="4+ logs this week"),
+    Badge("Calorie Controller", "progress", "total", "kcals_burned", agg="avg", threshold=300,
+          reason="Avg burn ≥ 300 kcals"),
+    Badge("Step Master", "wearables", "window", "steps", agg="avg", window=3, threshold=8000,
+          reason="Avg steps ≥ 8k (last 3)"),
+]
+
+# Logging milestones and streaks
+for n in (1, 5, 10, 25, 50, 100, 250, 500, 1000):
+    CATALOG.append(Badge(f"Logbook {n}", "progress", "total", None, threshold=n, reason=f"{n} progress logs"))
+for n in (10, 50, 100, 365, 1000):
+    CATALOG.append(Badge(f"Connected {n}", "wearables", "total", None, threshold=n, reason=f"{n} wearable syncs"))
+for days in (3, 5, 7, 14, 21, 30, 60, 100, 180, 365):
+    CATALOG.append(Badge(f"Streak {days}d", "progress", "streak", None, threshold=days,
+                         reason=f"Logged progress {days} days in a row"))
+for days in (3, 7, 14, 30):
+    for minutes in (20, 30, 45, 60):
+        CATALOG.append(Badge(f"Active Streak {days}d×{minutes}min", "progress", "streak", "workout_minutes",
+                             threshold=days, qualify=minutes,
+                             reason=f"{minutes}+ workout minutes {days} days in a row"))
+    for steps in (8000, 10000):
+        CATALOG.append(Badge(f"Walker Streak {days}d×{_k(steps)}", "wearables", "streak", "steps",
+                             threshold=days, qualify=steps, reason=f"{_k(steps)}+ steps {days} days in a row"))
+for days, count in ((7, 7), (14, 10), (30, 12), (30, 20), (30, 30)):
+    CATALOG.append(Badge(f"Regular {count}/{days}d", "progress", "recent", None, window=days, threshold=count,
+                         reason=f"{count}+ logs in {days} days"))
+
+# Lifetime totals
+for total in (300, 1000, 2500, 5000, 10000, 25000, 50000):
+    CATALOG.append(Badge(f"Time Invested {_k(total)}min", "progress", "total", "workout_minutes", agg="sum",
+                         threshold=total, reason=f"{total:,} workout minutes in total"))
+for total in (1000, 5000, 10000, 50000, 100000, 250000, 500000, 1000000):
+    CATALOG.append(Badge(f"Furnace {_k(total)}kcal", "progress", "total", "kcals_burned", agg="sum",
+                         threshold=total, reason=f"{total:,} kcals burned in total"))
+for total in (100000, 250000, 500000, 1000000, 2500000, 5000000, 10000000):
+    CATALOG.append(Badge(f"Distance {_k(total)} steps", "wearables", "total", "steps", agg="sum",
+                         threshold=total, reason=f"{total:,} steps in total"))
+for best in (15000, 20000, 25000, 30000, 40000):
+    CATALOG.append(Badge(f"Big Day {_k(best)}", "wearables", "total", "steps", agg="max", threshold=best,
+                         reason=f"{best:,} steps in a single day"))
+for best in (60, 90, 120, 180):
+    CATALOG.append(Badge(f"Marathon Session {best}min", "progress", "total", "workout_minutes", agg="max",
+                         threshold=best, reason=f"A {best}-minute workout"))
+for best in (500, 750, 1000, 1500):
+    CATALOG.append(Badge(f"Burner {best}kcal", "progress", "total", "kcals_burned", agg="max", threshold=best,
+                         reason=f"{best} kcals in one session"))
+
+# Rolling averages over recent entries
+WINDOWS = (3, 7, 14, 30)
+for w in WINDOWS:
+    for steps in (6000, 8000, 10000, 12000, 15000):
+        if (w, steps) != (3, 8000):  # covered by Step Master
+            CATALOG.append(Badge(f"Steps {_k(steps)} avg/{w}", "wearables", "window", "steps", agg="avg", window=w,
+                                 threshold=steps, reason=f"Avg steps ≥ {_k(steps)} (last {w})"))
+    for hours in (7, 7.5, 8):
+        CATALOG.append(Badge(f"Well Rested {hours:g}h/{w}", "wearables", "window", "sleep_hours", agg="avg",
+                             window=w, threshold=hours, reason=f"Avg sleep ≥ {hours:g}h (last {w})"))
+    for bpm in (65, 60, 55, 50):
+        CATALOG.append(Badge(f"Calm Heart {bpm}bpm/{w}", "wearables", "window", "hr_rest", agg="avg", window=w,
+                             threshold=bpm, cmp="le", reason=f"Avg resting HR ≤ {bpm} (last {w})"))
+    for minutes in (30, 45, 60, 90):
+        CATALOG.append(Badge(f"Dedicated {minutes}min/{w}", "progress", "window", "workout_minutes", agg="avg",
+                             window=w, threshold=minutes, reason=f"Avg workout ≥ {minutes} min (last {w})"))
+    for kcals in (250, 400, 600):
+        CATALOG.append(Badge(f"Steady Burn {kcals}/{w}", "progress", "window", "kcals_burned", agg="avg",
+                             window=w, threshold=kcals, reason=f"Avg burn ≥ {kcals} kcals (last {w})"))
+    for floor in (20, 30, 45):
+        CATALOG.append(Badge(f"No Off Days {floor}min/{w}", "progress", "window", "workout_minutes", agg="min",
+                             window=w, threshold=floor, reason=f"Every one of the last {w} workouts ≥ {floor} min"))
+for vo2 in (35, 40, 45, 50, 55, 60):
+    CATALOG.append(Badge(f"Engine VO2 {vo2}", "wearables", "total", "vo2max", agg="max", threshold=vo2,
+                         reason=f"VO2max reached {vo2}"))
+
+BY_NAME: Dict[str, int] = {b.name: i for i, b in enumerate(CATALOG)}
+if len(BY_NAME) != len(CATALOG):
+    raise ValueError("duplicate badge names in CATALOG")
+
+# Badges that read the same value and differ only in threshold form a family, ordered
+# easiest first: one value computation per family, and a tier can only be earned once
+# every easier tier is, so each user needs just a pointer to the next unearned tier.
+_families: Dict[tuple, List[int]] = {}
+for _i, _b in enumerate(CATALOG):
+    _families.setdefault((_b.stream, _b.kind, _b.metric, _b.agg, _b.window, _b.qualify, _b.cmp), []).append(_i)
+FAMILIES: List[Tuple[int, ...]] = [
+    tuple(sorted(ids, key=lambda i: CATALOG[i].threshold, reverse=CATALOG[ids[0]].cmp == "le"))
+    for ids in _families.values()
+]
+
+# stream -> metric (None: every entry) -> family ids, so an event only touches badges it can affect
+INDEX: Dict[str, Dict[Optional[str], Tuple[int, ...]]] = {}
+for _f, _ids in enumerate(FAMILIES):
+    _b = CATALOG[_ids[0]]
+    INDEX.setdefault(_b.stream, {}).setdefault(_b.metric, ())
+    INDEX[_b.stream][_b.metric] += (_f,)
+
+# Longest window / recency span per (stream, metric), so trackers keep only what some badge reads
+MAX_WINDOW: Dict[Tuple[str, Optional[str]], int] = {}
+for _b in CATALOG:
+    if _b.kind in ("window", "recent"):
+        MAX_WINDOW[(_b.stream, _b.metric)] = max(MAX_WINDOW.get((_b.stream, _b.metric), 0), _b.window)
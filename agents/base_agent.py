@@ -1,19 +1,40 @@
 # agents/base_agent.py
-import time, uuid
-from typing import Any, Dict, Optional, List
+import threading, time, uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, List, Tuple
 
 class MemoryStore:
     """
     Replace with MuleRun persistent state client in production.
+
+    Every write bumps a per-user version counter, so readers can cache anything
+    derived from a user's state and invalidate it with a single integer compare.
+
+    An attached journal sees every write as (op, user_id, key, value, version),
+    called under the write lock so the journal order matches version order.
     """
     def __init__(self):
         self._store: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lazy: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._create_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._journal: Optional[Callable[[str, str, Optional[str], Any, int], None]] = None
 
     def _ensure(self, user_id: str):
-        if user_id not in self._store:
+        if user_id in self._store:
+            return
+        with self._create_lock:
+            if user_id in self._store:
+                return
+            loader = self._lazy.pop(user_id, None)
+            if loader is not None:
+                self._store[user_id] = loader()
+                return
             self._store[user_id] = {
                 "profile": None,
                 "plans": {"workout": [], "nutrition": []},
+                "plan_versions": [],
                 "progress": [],
                 "wearables": [],
                 "logs": [],
@@ -26,14 +47,127 @@ class MemoryStore:
 
     def set(self, user_id: str, key: str, value: Any):
         self._ensure(user_id)
-        self._store[user_id][key] = value
+        with self._write_lock:
+            self._store[user_id][key] = value
+            self._bump(user_id)
+            if self._journal:
+                self._journal("set", user_id, key, value, self._versions[user_id])
 
     def append(self, user_id: str, key: str, value: Any):
         self._ensure(user_id)
-        self._store[user_id].setdefault(key, [])
-        self._store[user_id][key].append(value)
+        with self._write_lock:
+            self._store[user_id].setdefault(key, [])
+            self._store[user_id][key].append(value)
+            self._bump(user_id)
+            if self._journal:
+                self._journal("append", user_id, key, value, self._versions[user_id])
+
+    def _bump(self, user_id: str):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def attach_journal(self, journal: Optional[Callable[[str, str, Optional[str], Any, int], None]]):
+        with self._write_lock:
+            self._journal = journal
+
+    def apply_journal(self, op: str, user_id: str, key: Optional[str], value: Any, version: int) -> bool:
+        """
+        Re-apply one journaled write during recovery. Writes the store already has
+        (version not newer than the user's) are skipped, so replaying a journal over
+        a snapshot taken at any point is idempotent. Returns whether it applied.
+        """
+        if op != "drop" and version <= self.version(user_id):
+            return False
+        if op == "set":
+            self._ensure(user_id)
+            self._store[user_id][key] = value
+        elif op == "append":
+            self._ensure(user_id)
+            self._store[user_id].setdefault(key, []).append(value)
+        elif op == "import":
+            self._lazy.pop(user_id, None)
+            self._store[user_id] = value
+        elif op == "import_lazy":
+            self._store.pop(user_id, None)
+            self._lazy[user_id] = value
+        elif op == "drop":
+            self.drop_user(user_id)
+            return True
+        else:
+            raise ValueError(f"unknown journal op: {op}")
+        self._versions[user_id] = version
+        return True
+
+    def read_consistent(self, user_id: str, read: Callable[[Any], Any]) -> Tuple[int, Any]:
+        """(version, read(state or lazy loader)) with no write landing in between."""
+        with self._write_lock:
+            return self.version(user_id), read(self._lazy.get(user_id) or self._store.get(user_id, {}))
+
+    def version(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+    # Whole-user access for snapshots and shard migration
+    def user_ids(self) -> List[str]:
+        return list(self._store) + list(self._lazy)
+
+    def export_user(self, user_id: str) -> Dict[str, Any]:
+        if user_id in self._lazy:
+            self._ensure(user_id)
+        return self._store.get(user_id, {})
+
+    def import_user(self, user_id: str, state: Dict[str, Any], version: int = 0):
+        with self._write_lock:
+            self._set_version(user_id, version)
+            self._lazy.pop(user_id, None)
+            self._store[user_id] = state
+            if self._journal:
+                self._journal("import", user_id, None, state, self._versions[user_id])
+
+    def import_user_lazy(self, user_id: str, loader: Callable[[], Dict[str, Any]], version: int = 0):
+        """Register a user whose state is only decoded (by `loader`) on first access."""
+        with self._write_lock:
+            self._set_version(user_id, version)
+            self._store.pop(user_id, None)
+            self._lazy[user_id] = loader
+            if self._journal:
+                self._journal("import_lazy", user_id, None, loader, self._versions[user_id])
+
+    def lazy_loader(self, user_id: str) -> Optional[Callable[[], Dict[str, Any]]]:
+        return self._lazy.get(user_id)
+
+    def drop_user(self, user_id: str):
+        """Forget a user entirely (after it has been migrated to another worker)."""
+        with self._create_lock, self._write_lock:
+            self._store.pop(user_id, None)
+            self._lazy.pop(user_id, None)
+            self._versions.pop(user_id, None)
+            if self._journal:
+                self._journal("drop", user_id, None, None, 0)
+
+    def _set_version(self, user_id: str, version: int):
+        # never move a live user's version backwards, or version-keyed caches could match stale data
+        if user_id in self._versions:
+            version = max(version, self._versions[user_id] + 1)
+        self._versions[user_id] = version
 
 STATE = MemoryStore()
+_LOG_BUFFER = threading.local()
+
+@contextmanager
+def buffered_logs() -> Iterator[List[Tuple[str, dict]]]:
+    """
+    Collect the log_event calls made on this thread as (user_id, entry) instead of
+    writing them to STATE, so speculative work leaves no trace until commit_logs.
+    """
+    outer = getattr(_LOG_BUFFER, "entries", None)
+    _LOG_BUFFER.entries = buffer = []
+    try:
+        yield buffer
+    finally:
+        _LOG_BUFFER.entries = outer
+
+def commit_logs(entries: List[Tuple[str, dict]]):
+    for user_id, entry in entries:
+        STATE.append(user_id, "logs", entry)
 
 def log_event(user_id: str, agent: str, action: str, reason: str = "", payload: Optional[dict] = None):
     entry = {
@@ -44,4 +178,8 @@ def log_event(user_id: str, agent: str, action: str, reason: str = "", payload:
         "reason": reason,
         "payload": payload or {}
     }
-    STATE.append(user_id, "logs", entry)
+    buffer = getattr(_LOG_BUFFER, "entries", None)
+    if buffer is not None:
+        buffer.append((user_id, entry))
+    else:
+        STATE.append(user_id, "logs", entry)
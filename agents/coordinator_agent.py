@@ -1,13 +1,13 @@
 # agents/coordinator_agent.py
 from typing import Dict, Any, List
 from .base_agent import log_event
+from .profile_agent import CanonicalProfile, Flag
 
 class CoordinatorAgent:
-    def resolve(self, user_id: str, profile: Dict[str, Any], workout: List[Dict[str, Any]], meals: List[Dict[str, Any]]) -> Dict[str, Any]:
-        constraints = [c.lower() for c in profile.get("constraints", [])]
+    def resolve(self, user_id: str, profile: CanonicalProfile, workout: List[Dict[str, Any]], meals: List[Dict[str, Any]]) -> Dict[str, Any]:
         reason = "ok"
 
-        if any("injury" in c or "knee" in c for c in constraints):
+        if profile.flags & Flag.LOW_IMPACT:
             for day in workout:
                 day["exercises"] = [ex for ex in day["exercises"] if "Jump Rope" not in ex and "Mountain Climbers" not in ex]
                 if "Cycling (Low Impact)" not in day["exercises"]:
@@ -1,38 +1,27 @@
 # agents/dynamic_rule_generator.py
 import json
 from typing import Dict, Any
-from langchain_ollama import ChatOllama
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
+from langchain.schema import BaseMessage
 from .base_agent import log_event
+from .langchain_core import rule_chain
+
+# Used when the LLM is unavailable; written in the RuleEngine DSL so it still compiles.
+DEFAULT_RULES = json.dumps([
+    {"condition": "wearable.sleep_hours < 6 or wearable.hr_avg >= 100", "action": "delta_sets(-1); add_note('limit overtraining')"},
+    {"condition": "progress.avg_workout_minutes >= 60", "action": "add_note('ensure hydration')"},
+])
 
-class DynamicRuleGenerator:
-    def __init__(self):
-        self.llm = ChatOllama(model="llama3", temperature=0.5)
-        self.prompt = PromptTemplate.from_template("""
-        You are a rule generator for a personalized fitness system.
-        Based on the user's profile and feedback summary,
-        create concise rule adjustments or safety guidelines.
-        
-        Profile:
-        {profile}
-        
-        Feedback Summary:
-        {feedback_summary}
-        
-        Output as plain text rules.
-        """)
-        self.chain = LLMChain(prompt=self.prompt, llm=self.llm)
 
-    def generate(self, user_id: str, profile, feedback_summary: str) -> Dict[str, Any]:
+class DynamicRuleGenerator:
+    def generate(self, user_id: str, profile: Dict[str, Any], feedback_summary: str) -> Dict[str, Any]:
         try:
-            raw = self.chain.invoke({
-                "profile": json.dumps(profile.model_dump(), indent=2),
+            raw = rule_chain.invoke({
+                "profile": json.dumps(profile, indent=2, sort_keys=True),
                 "feedback_summary": feedback_summary
             })
-            text = raw.get("text", raw)
+            text = raw.content if isinstance(raw, BaseMessage) else str(raw)
             log_event(user_id, "DynamicRuleGenerator", "rule_generation", payload={"rules": text})
             return {"rules": text}
         except Exception as e:
             log_event(user_id, "DynamicRuleGenerator", "error", payload={"error": str(e)})
-            return {"rules": "default safety: limit overtraining; ensure hydration"}
+            return {"rules": DEFAULT_RULES}
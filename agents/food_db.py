@@ -0,0 +1,202 @@
+# agents/food_db.py
+import bisect
+import csv
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+CSV_PATH = os.path.join(DATA_DIR, "foods.csv")
+
+# Numeric columns, per serving, named like the CalorieNinjas response fields.
+COLUMNS = ("serving_size_g", "calories", "protein_g", "carbohydrates_total_g",
+           "fat_total_g", "fiber_g", "sugar_g", "sodium_mg")
+
+FUZZY_MIN = 0.6  # Dice similarity over trigrams needed to accept a fuzzy match
+STOPWORDS = frozenset({"a", "an", "and", "with", "of", "some", "plus", "the", "side"})
+
+# Compiled file: header | float32 columns (column-major) | "name\ttags\n" rows.
+# The header is padded to 24 bytes so every column starts 8-byte aligned.
+_MAGIC = b"FDB1"
+_HEADER = struct.Struct("<4sIIQ4x")
+
+
+def _norm(text: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def _trigrams(text: str) -> FrozenSet[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def compile_csv(csv_path: str) -> bytes:
+    """Compile the food CSV into the binary layout FoodDB memory-maps."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    n = len(rows)
+    numeric = b"".join(
+        struct.pack(f"<{n}f", *(float(r[c] or 0) for r in rows)) for c in COLUMNS
+    )
+    strings = "".join(f"{r['name'].strip()}\t{r.get('tags', '').strip()}\n" for r in rows).encode()
+    return _HEADER.pack(_MAGIC, n, len(COLUMNS), _HEADER.size + len(numeric)) + numeric + strings
+
+
+class FoodDB:
+    """
+    Local nutrition table with a name index.
+
+    Numeric columns stay in the memory-mapped compiled file and are read through
+    zero-copy little-endian float32 views; only names and tags are materialized, to build:
+      - an exact-name dict,
+      - a sorted name list for prefix search (bisect),
+      - a trigram inverted index for fuzzy matching.
+    """
+
+    def __init__(self, buf):
+        magic, n, ncols, strings_at = _HEADER.unpack_from(buf)
+        if magic != _MAGIC or ncols != len(COLUMNS):
+            raise ValueError("not a compiled food database")
+        self._buf = buf
+        view = memoryview(buf)
+        # the file is packed '<f'; an explicit dtype keeps the views right on big-endian hosts
+        self.columns: Dict[str, np.ndarray] = {
+            c: np.frombuffer(buf, dtype="<f4", count=n, offset=_HEADER.size + i * 4 * n)
+            for i, c in enumerate(COLUMNS)
+        }
+        self.names: List[str] = []
+        self.tags: List[FrozenSet[str]] = []
+        for line in bytes(view[strings_at:]).decode().splitlines():
+            name, _, tags = line.partition("\t")
+            self.names.append(name)
+            self.tags.append(frozenset(t for t in tags.split(";") if t))
+
+        self._exact: Dict[str, int] = {}
+        self._grams: Dict[str, List[int]] = defaultdict(list)
+        self._gram_counts: List[int] = []
+        for i, name in enumerate(self.names):
+            key = _norm(name)
+            self._exact.setdefault(key, i)
+            grams = _trigrams(key)
+            self._gram_counts.append(len(grams))
+            for g in grams:
+                self._grams[g].append(i)
+        self._sorted: List[Tuple[str, int]] = sorted((_norm(n), i) for i, n in enumerate(self.names))
+        self._sorted_keys = [k for k, _ in self._sorted]
+        self._max_words = max((len(k.split()) for k in self._exact), default=1)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # -------------------------------
+    # Records
+    # -------------------------------
+    def record(self, idx: int) -> Dict[str, Any]:
+        """A CalorieNinjas-shaped nutrition item."""
+        item: Dict[str, Any] = {"name": self.names[idx]}
+        for c, col in self.columns.items():
+            item[c] = round(float(col[idx]), 1)
+        return item
+
+    def ids_with_tags(self, include: Iterable[str] = (), exclude: Iterable[str] = ()) -> List[int]:
+        include, exclude = frozenset(include), frozenset(exclude)
+        return [i for i, t in enumerate(self.tags) if include <= t and not (exclude & t)]
+
+    # -------------------------------
+    # Search
+    # -------------------------------
+    def prefix(self, text: str, limit: int = 10) -> List[str]:
+        key = _norm(text)
+        start = bisect.bisect_left(self._sorted_keys, key)
+        out = []
+        for k, i in self._sorted[start:start + limit]:
+            if not k.startswith(key):
+                break
+            out.append(self.names[i])
+        return out
+
+    def fuzzy(self, text: str) -> Tuple[Optional[int], float]:
+        """Best match by trigram Dice similarity, counting only names sharing a trigram."""
+        grams = _trigrams(_norm(text))
+        shared: Dict[int, int] = defaultdict(int)
+        for g in grams:
+            for i in self._grams.get(g, ()):
+                shared[i] += 1
+        best, score = None, 0.0
+        for i, common in shared.items():
+            s = 2.0 * common / (len(grams) + self._gram_counts[i])
+            if s > score:
+                best, score = i, s
+        return best, score
+
+    def _segment(self, key: str) -> Optional[List[int]]:
+        """Split a multi-food query ("chicken breast and rice") into known names, longest match first."""
+        words = key.split()
+        found, pos = [], 0
+        while pos < len(words):
+            if words[pos] in STOPWORDS:
+                pos += 1
+                continue
+            for end in range(min(len(words), pos + self._max_words), pos, -1):
+                idx = self._exact.get(" ".join(words[pos:end]))
+                if idx is not None:
+                    found.append(idx)
+                    pos = end
+                    break
+            else:
+                return None
+        return found or None
+
+    def lookup(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Resolve a free-text query to nutrition items: exact name, then segmentation
+        into several known foods, then a fuzzy match. None means "ask the API".
+        """
+        key = _norm(query)
+        if not key:
+            return None
+        idx = self._exact.get(key)
+        if idx is not None:
+            return [self.record(idx)]
+        parts = self._segment(key)
+        if parts:
+            return [self.record(i) for i in parts]
+        idx, score = self.fuzzy(key)
+        if idx is not None and score >= FUZZY_MIN:
+            return [self.record(idx)]
+        return None
+
+
+def _load(csv_path: str) -> FoodDB:
+    """Compile the CSV next to itself when stale, then memory-map the compiled file."""
+    bin_path = os.path.splitext(csv_path)[0] + ".bin"
+    try:
+        if not os.path.exists(bin_path) or os.path.getmtime(bin_path) < os.path.getmtime(csv_path):
+            tmp = f"{bin_path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(compile_csv(csv_path))
+            os.replace(tmp, bin_path)
+        with open(bin_path, "rb") as f:
+            return FoodDB(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except OSError:
+        # read-only install: keep the compiled table in memory instead
+        return FoodDB(compile_csv(csv_path))
+
+
+_DB: Optional[FoodDB] = None
+_DB_LOCK = threading.Lock()
+
+
+def get_food_db() -> FoodDB:
+    global _DB
+    if _DB is None:
+        with _DB_LOCK:
+            if _DB is None:
+                _DB = _load(CSV_PATH)
+    return _DB
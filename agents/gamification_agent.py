@@ -1,56 +1,196 @@
 # agents/gamification_agent.py
-from typing import Dict, Any, List
-from datetime import datetime, timedelta
+import threading
+from collections import deque
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Tuple
 from .base_agent import STATE, log_event
+from .badge_catalog import BY_NAME, CATALOG, FAMILIES, INDEX, MAX_WINDOW, Badge
+
+STREAMS = ("progress", "wearables")
+# distinct (metric, qualify) streak definitions per stream
+STREAKS: Dict[str, Tuple[Tuple[Optional[str], Optional[float]], ...]] = {
+    s: tuple(dict.fromkeys((b.metric, b.qualify) for b in CATALOG if b.stream == s and b.kind == "streak"))
+    for s in STREAMS
+}
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _day(entry: Dict[str, Any]) -> Optional[int]:
+    """
+    Entry date as an ordinal. Entries are stamped when written; one without a date
+    (stored before that) still counts towards totals but not towards recent or streak
+    badges, since on a rebuild it could be from any day.
+    """
+    try:
+        return date.fromisoformat(str(entry.get("date"))[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+class _Tracker:
+    """Running aggregates for one user, folded forward one entry at a time."""
+
+    __slots__ = ("seen", "bits", "next_tier", "count", "sums", "maxs", "mins", "windows", "days", "streaks")
+
+    def __init__(self, bits: int):
+        self.seen = {s: 0 for s in STREAMS}
+        self.bits = bits
+        self.next_tier = [0] * len(FAMILIES)
+        for f, ids in enumerate(FAMILIES):
+            while self.next_tier[f] < len(ids) and bits >> ids[self.next_tier[f]] & 1:
+                self.next_tier[f] += 1
+        self.count: Dict[Tuple[str, Optional[str]], int] = {}
+        self.sums: Dict[Tuple[str, str], float] = {}
+        self.maxs: Dict[Tuple[str, str], float] = {}
+        self.mins: Dict[Tuple[str, str], float] = {}
+        self.windows: Dict[Tuple[str, str], Deque[float]] = {}
+        self.days: Dict[str, List[int]] = {s: [] for s in STREAMS}
+        self.streaks: Dict[Tuple[str, Optional[str], Optional[float]], List[int]] = {}
+
+    def fold(self, stream: str, entry: Dict[str, Any], today: int) -> List[int]:
+        """Add one entry; return the badge families it can affect."""
+        day = _day(entry)
+        self.count[(stream, None)] = self.count.get((stream, None), 0) + 1
+        span = MAX_WINDOW.get((stream, None))
+        if span and day is not None:
+            recent = [d for d in self.days[stream] if d > today - span]
+            recent.append(day)
+            self.days[stream] = recent
+
+        by_metric = INDEX.get(stream, {})
+        affected = list(by_metric.get(None, ()))
+        for metric, ids in by_metric.items():
+            if metric is None:
+                continue
+            value = _number(entry.get(metric))
+            if value is None:
+                continue
+            key = (stream, metric)
+            self.count[key] = self.count.get(key, 0) + 1
+            self.sums[key] = self.sums.get(key, 0.0) + value
+            self.maxs[key] = max(self.maxs.get(key, value), value)
+            self.mins[key] = min(self.mins.get(key, value), value)
+            if key in MAX_WINDOW:
+                self.windows.setdefault(key, deque(maxlen=MAX_WINDOW[key])).append(value)
+            affected.extend(ids)
+
+        for metric, qualify in STREAKS[stream]:
+            if day is None:
+                break
+            if metric is not None:
+                value = _number(entry.get(metric))
+                if value is None or (qualify is not None and value < qualify):
+                    continue
+            streak = self.streaks.setdefault((stream, metric, qualify), [0, 0])
+            if day == streak[0] + 1:
+                streak[0], streak[1] = day, streak[1] + 1
+            elif day > streak[0]:
+                streak[0], streak[1] = day, 1
+        return affected
+
+    def value(self, b: Badge, today: int) -> Optional[float]:
+        key = (b.stream, b.metric)
+        if b.kind == "recent":
+            return sum(1 for d in self.days[b.stream] if today - b.window < d <= today)
+        if b.kind == "streak":
+            return self.streaks.get((b.stream, b.metric, b.qualify), (0, 0))[1]
+        if b.kind == "total":
+            n = self.count.get(key, 0)
+            if b.agg == "count":
+                return n
+            if not n:
+                return None
+            return {"sum": self.sums, "max": self.maxs, "min": self.mins}.get(b.agg, self.sums)[key] / (n if b.agg == "avg" else 1)
+        if b.kind == "window":
+            values = self.windows.get(key, ())
+            if len(values) < b.window:
+                return None
+            last = list(islice(values, len(values) - b.window, None))
+            return {"sum": sum, "max": max, "min": min}.get(b.agg, lambda v: sum(v) / len(v))(last)
+        raise ValueError(f"unknown badge kind: {b.kind}")
+
 
 class GamificationAgent:
-    def _issue(self, user_id: str, badge: str, reason: str) -> None:
-        badges: List[Dict[str, Any]] = STATE.get(user_id, "badges", []) or []
-        if any(b.get("name") == badge for b in badges):
-            return
-        badges.append({
-            "name": badge,
-            "earned_at": datetime.utcnow().isoformat(),
-            "reason": reason
-        })
+    """
+    Awards badges from the declarative CATALOG as progress and wearable entries arrive.
+
+    Each user has a tracker of running aggregates (totals, rolling windows, streaks)
+    that folds in only entries it has not seen yet. Per new entry, each badge family
+    the entry can affect computes its value once and compares it with the next
+    unearned tier, so cost does not grow with stored entries or catalog size.
+    Earned badges are a bitmap (bit = catalog position), making dedupe O(1).
+    Trackers are derived data: after a restart or shard migration they are rebuilt
+    from the stored entries on the user's first event.
+    """
+
+    def __init__(self):
+        self._trackers: Dict[str, _Tracker] = {}
+        self._lock = threading.Lock()
+
+    def _tracker(self, user_id: str) -> _Tracker:
+        tracker = self._trackers.get(user_id)
+        if tracker is None:
+            bits = STATE.get(user_id, "badge_bits")
+            if bits is None:  # users from before the bitmap: derive it from the earned list
+                bits = 0
+                for b in STATE.get(user_id, "badges", []) or []:
+                    if b.get("name") in BY_NAME:
+                        bits |= 1 << BY_NAME[b["name"]]
+            tracker = self._trackers[user_id] = _Tracker(bits)
+        return tracker
+
+    def _issue(self, user_id: str, earned: List[int], bits: int) -> None:
+        now = datetime.utcnow().isoformat()
+        badges: List[Dict[str, Any]] = list(STATE.get(user_id, "badges", []) or [])
+        badges.extend({"name": CATALOG[i].name, "earned_at": now, "reason": CATALOG[i].reason} for i in earned)
         STATE.set(user_id, "badges", badges)
-        log_event(user_id, "GamificationAgent", "badge_awarded", reason, {"badge": badge})
+        STATE.set(user_id, "badge_bits", bits)
+        for i in earned:
+            log_event(user_id, "GamificationAgent", "badge_awarded", CATALOG[i].reason, {"badge": CATALOG[i].name})
 
     def evaluate(self, user_id: str) -> Dict[str, Any]:
-        # Safely retrieve lists from STATE
-        logs: List[Dict[str, Any]] = STATE.get(user_id, "progress", []) or []
-        wearable: List[Dict[str, Any]] = STATE.get(user_id, "wearables", []) or []
-
-        # --- Consistency badge ---
-        recent_logs = [
-            l for l in logs
-            if l.get("date") and self._is_recent(l["date"], days=7)
-        ]
-        if len(recent_logs) >= 4:
-            self._issue(user_id, "Consistency Star", "4+ logs this week")
-
-        # --- Calorie control badge ---
-        kcals = [l.get("kcals_burned", 0) for l in logs if l.get("kcals_burned") is not None]
-        if kcals:
-            avg_burn = sum(kcals) / len(kcals)
-            if avg_burn >= 300:
-                self._issue(user_id, "Calorie Controller", "Avg burn ≥ 300 kcals")
-
-        # --- Step master badge ---
-        if len(wearable) >= 3:
-            steps = [w.get("steps", 0) for w in wearable[-3:]]
-            if steps and sum(steps) / len(steps) >= 8000:
-                self._issue(user_id, "Step Master", "Avg steps ≥ 8k (last 3)")
-
-        # Return badges safely
+        """Fold in entries logged since the last call and award any badges they complete."""
+        today = date.today().toordinal()
+        with self._lock:
+            tracker = self._tracker(user_id)
+            earned: List[int] = []
+            for stream in STREAMS:
+                entries: List[Dict[str, Any]] = STATE.get(user_id, stream, []) or []
+                for entry in islice(entries, tracker.seen[stream], None):
+                    for f in tracker.fold(stream, entry, today):
+                        ids, tier = FAMILIES[f], tracker.next_tier[f]
+                        if tier == len(ids):
+                            continue
+                        value = tracker.value(CATALOG[ids[tier]], today)
+                        while value is not None and tier < len(ids):
+                            b = CATALOG[ids[tier]]
+                            if not (value >= b.threshold if b.cmp == "ge" else value <= b.threshold):
+                                break
+                            if not tracker.bits >> ids[tier] & 1:
+                                tracker.bits |= 1 << ids[tier]
+                                earned.append(ids[tier])
+                            tier += 1
+                        tracker.next_tier[f] = tier
+                tracker.seen[stream] = len(entries)
+            if earned:
+                self._issue(user_id, earned, tracker.bits)
+        return self.badges(user_id)
+
+    def badges(self, user_id: str) -> Dict[str, Any]:
+        """Read-only view of earned badges."""
         badges: List[Dict[str, Any]] = STATE.get(user_id, "badges", []) or []
         return {"badges": badges}
 
-    # Utility: safely check recency
-    @staticmethod
-    def _is_recent(date_str: str, days: int = 7) -> bool:
-        try:
-            entry_date = datetime.fromisoformat(date_str)
-            return entry_date >= datetime.utcnow() - timedelta(days=days)
-        except Exception:
-            return False
+    def forget(self, user_id: str) -> None:
+        """Drop the tracker of a user who left this process; it is rebuilt if they come back."""
+        with self._lock:
+            self._trackers.pop(user_id, None)
@@ -0,0 +1,66 @@
+# agents/hash_ring.py
+import bisect
+import hashlib
+from typing import Iterable, List, Optional
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping user_ids to worker nodes.
+
+    Each node owns `vnodes` points on a 64-bit ring; a key belongs to the first
+    point clockwise from its hash. Adding a node only takes over keys from its
+    neighbours (about 1/N of them) and removing one hands its keys to the next
+    points, so a rebalance moves the minimum number of users.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 128):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def copy(self) -> "HashRing":
+        ring = HashRing(vnodes=self.vnodes)
+        ring._points, ring._owners, ring._nodes = list(self._points), list(self._owners), list(self._nodes)
+        return ring
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            at = bisect.bisect_left(self._points, point)
+            self._points.insert(at, point)
+            self._owners.insert(at, node)
+
+    def remove(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        at = bisect.bisect_right(self._points, _hash(key))
+        return self._owners[at % len(self._owners)]
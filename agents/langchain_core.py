@@ -1,31 +1,56 @@
 # agents/langchain_core.py
+import os
+from functools import lru_cache
 from langchain_ollama import ChatOllama
-from langchain.prompts import PromptTemplate
+from langchain.prompts import ChatPromptTemplate
 
 # --------------------------
 # Initialize Ollama model
 # --------------------------
 # Supported local models: "llama3", "mistral", "phi3", etc.
-llm = ChatOllama(
-    model="llama3",
-    temperature=0.5,
-    num_ctx=4096,       # context length
-    num_predict=512     # max tokens
-)
+#
+# Every chain shares one model name and one num_ctx: a request that changes either
+# makes Ollama reload the runner and drop its KV cache. keep_alive keeps the model
+# (and the cached prompt prefixes) resident between requests. Ollama reuses the
+# longest cached token prefix of each request. Each prompt below therefore starts
+# with a static system message, and everything that varies comes after it. With
+# OLLAMA_NUM_PARALLEL >= 3 the feedback, rule and ask prefixes each keep a slot.
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+NUM_CTX = 4096          # context length
+NUM_PREDICT = 512       # max tokens
+
+
+@lru_cache(maxsize=None)
+def chat_model(temperature: float = 0.5) -> ChatOllama:
+    """Shared ChatOllama client; only sampling settings may differ between callers."""
+    return ChatOllama(
+        model=OLLAMA_MODEL,
+        base_url=OLLAMA_BASE_URL,
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        temperature=temperature,
+        num_ctx=NUM_CTX,
+        num_predict=NUM_PREDICT,
+    )
+
+
+llm = chat_model(0.5)
 
 # --------------------------
 # FEEDBACK INTERPRETATION CHAIN
 # --------------------------
-feedback_prompt = PromptTemplate.from_template("""
-You are a fitness AI assistant.
+FEEDBACK_SYSTEM = """You are a fitness AI assistant.
 Given the user's feedback on their workout or diet, extract:
 - workout_adjustment: describe changes like "increase sets" or "reduce intensity"
 - nutrition_adjustment: describe food preference or swap
 - reason: short justification
-Respond ONLY in valid JSON.
+Respond ONLY in valid JSON."""
 
-User feedback: "{feedback}"
-""")
+feedback_prompt = ChatPromptTemplate.from_messages([
+    ("system", FEEDBACK_SYSTEM),
+    ("human", 'User feedback: "{feedback}"'),
+])
 
 # LCEL: pipe prompt → llm
 feedback_chain = feedback_prompt | llm
@@ -34,16 +59,54 @@ feedback_chain = feedback_prompt | llm
 # --------------------------
 # RULE GENERATION CHAIN
 # --------------------------
-rule_prompt = PromptTemplate.from_template("""
-You are a health and safety reasoning engine.
+RULE_SYSTEM = """You are a health and safety reasoning engine.
 Given a user's profile and feedback summary, create safe adaptive fitness rules.
 Each rule prevents injury or overtraining and improves adherence.
-Return concise JSON like:
-[{{"condition": "...", "action": "..."}}]
 
-Profile: {profile}
-Feedback Summary: {feedback_summary}
-""")
+"condition" is an expression over these fields, combined with and / or / not
+and compared with < <= > >= == != or `in ("a", "b")`:
+profile.age, profile.goal, profile.level,
+wearable.hr_rest, wearable.hr_avg, wearable.sleep_hours, wearable.steps, wearable.vo2max,
+progress.count, progress.avg_weight, progress.avg_workout_minutes,
+progress.avg_kcals_burned, progress.adherence (0-100)
+profile.goal is one of "Fat Loss", "Muscle Gain", "Endurance", "General Fitness";
+profile.level is one of "Beginner", "Intermediate", "Advanced". Text comparisons
+ignore case. Arithmetic (+ - * /) is only allowed on numeric fields, and
+and / or / not only combine comparisons (write progress.count > 0, not progress.count).
+
+"action" is one or more of these calls separated by ";":
+delta_sets(n), cap_sets(n), floor_sets(n),
+remove_exercise("name"), add_exercise("name"), add_note("text")
+
+Return ONLY concise JSON like:
+[{{"condition": "wearable.sleep_hours < 6 and progress.adherence >= 50", "action": "cap_sets(3); add_note('prioritise recovery')"}}]"""
+
+rule_prompt = ChatPromptTemplate.from_messages([
+    ("system", RULE_SYSTEM),
+    ("human", "Profile: {profile}\nFeedback Summary: {feedback_summary}"),
+])
 
 # LCEL: pipe prompt → llm
 rule_chain = rule_prompt | llm
+
+
+# --------------------------
+# QUESTION ANSWERING CHAIN
+# --------------------------
+ASK_SYSTEM = '''You are an explainable fitness assistant.
+You have access to:
+- user plans (workout + meals)
+- agent logs (actions + reasons)
+- rules that affected these plans
+
+Answer the user's question in simple, supportive, and factual tone.
+If the answer cannot be found, say "I don't have enough data to answer that."'''
+
+# The user's state goes before the question so follow-up questions from the same
+# user also reuse the cached state tokens.
+ask_prompt = ChatPromptTemplate.from_messages([
+    ("system", ASK_SYSTEM),
+    ("human", "USER STATE DATA:\n{context}\n\nUSER QUESTION:\n{question}\n\nYour answer:"),
+])
+
+ask_chain = ask_prompt | chat_model(0.4)
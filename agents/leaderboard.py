@@ -0,0 +1,342 @@
+# agents/leaderboard.py
+import bisect
+import math
+import threading
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from .base_agent import STATE
+from .profile_agent import Goal, Level, canonical_profile, canonicalize
+from .scoring import adherence_of, adherence_score
+
+METRICS = ("adherence", "weekly_kcals", "weekly_steps")
+WEEKLY = ("weekly_kcals", "weekly_steps")
+ALL = "all"
+# Cohort of users without a profile. Not a goal/level pair, so it cannot be queried;
+# rank() places such users on the overall board instead.
+UNKNOWN = "unknown/unknown"
+
+
+def current_week(today: Optional[date] = None) -> str:
+    year, week, _ = (today or date.today()).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _week_of(entry: Dict[str, Any]) -> str:
+    """ISO week of an entry; entries logged without a date count as this week."""
+    try:
+        return current_week(date.fromisoformat(str(entry.get("date"))[:10]))
+    except ValueError:
+        return current_week()
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0.0
+    return float(value)
+
+
+def cohort_of(goal: Goal, level: Level) -> str:
+    """Cohort key, e.g. "fat_loss/beginner"."""
+    return f"{goal.name.lower()}/{level.name.lower()}"
+
+
+def _cohort(user_id: str) -> str:
+    canon = canonical_profile(user_id)
+    return cohort_of(canon.goal, canon.level) if canon else UNKNOWN
+
+
+def board_scores(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A user's leaderboard entries computed from their state: {"cohort": ..., metric:
+    (score, period), ...}. Snapshots store it next to each encoded user, so a lazily
+    restored user is filed on the boards without being decoded.
+    """
+    profile = state.get("profile")
+    canon = canonicalize(profile) if profile else None
+    scores: Dict[str, Any] = {"cohort": cohort_of(canon.goal, canon.level) if canon else UNKNOWN}
+    week = current_week()
+    progress: List[Dict[str, Any]] = state.get("progress") or []
+    wearables: List[Dict[str, Any]] = state.get("wearables") or []
+    if progress:
+        scores["adherence"] = (adherence_of(progress), "")
+        scores["weekly_kcals"] = (sum(_number(e.get("kcals_burned")) for e in progress if _week_of(e) == week), week)
+    if wearables:
+        scores["weekly_steps"] = (sum(_number(e.get("steps")) for e in wearables if _week_of(e) == week), week)
+    return scores
+
+
+class RankedList:
+    """
+    Sorted multiset with O(log n) rank (bisect) and select (index) queries.
+
+    Items live in sorted buckets of at most 2 * LOAD; a Fenwick tree over bucket
+    sizes converts between a (bucket, offset) position and a global index in
+    O(log buckets). Same order-statistic guarantees as an indexable skip list,
+    at a fraction of the memory per item: one tuple in a list instead of a node
+    with per-level pointer and width arrays.
+    """
+
+    LOAD = 1000
+
+    def __init__(self):
+        self._lists: List[list] = []
+        self._maxes: list = []
+        self._tree: List[int] = [0]
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _rebuild(self) -> None:
+        tree = [0] + [len(sub) for sub in self._lists]
+        for i in range(1, len(tree)):
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, pos: int, delta: int) -> None:
+        i, tree = pos + 1, self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, pos: int) -> int:
+        """Number of items in buckets before `pos`."""
+        total, i, tree = 0, pos, self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, item) -> None:
+        if not self._lists:
+            self._lists, self._maxes, self._len = [[item]], [item], 1
+            self._rebuild()
+            return
+        pos = bisect.bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._lists[pos].append(item)
+            self._maxes[pos] = item
+        else:
+            bisect.insort(self._lists[pos], item)
+        self._len += 1
+        sub = self._lists[pos]
+        if len(sub) > 2 * self.LOAD:
+            half = sub[self.LOAD:]
+            del sub[self.LOAD:]
+            self._maxes[pos] = sub[-1]
+            self._lists.insert(pos + 1, half)
+            self._maxes.insert(pos + 1, half[-1])
+            self._rebuild()
+        else:
+            self._tree_add(pos, 1)
+
+    def remove(self, item) -> None:
+        pos = bisect.bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            raise KeyError(item)
+        sub = self._lists[pos]
+        i = bisect.bisect_left(sub, item)
+        if i == len(sub) or sub[i] != item:
+            raise KeyError(item)
+        del sub[i]
+        self._len -= 1
+        if sub:
+            self._maxes[pos] = sub[-1]
+            self._tree_add(pos, -1)
+        else:
+            del self._lists[pos]
+            del self._maxes[pos]
+            self._rebuild()
+
+    def bisect_left(self, item) -> int:
+        pos = bisect.bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            return self._len
+        return self._prefix(pos) + bisect.bisect_left(self._lists[pos], item)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("RankedList index out of range")
+        # Fenwick descent: largest bucket prefix not exceeding index
+        pos, rest, tree = 0, index, self._tree
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= rest:
+                pos, rest = nxt, rest - tree[nxt]
+            step >>= 1
+        return self._lists[pos][rest]
+
+
+class Leaderboards:
+    """
+    Per-metric rankings over all users and per goal/level cohort.
+
+    Each (metric, cohort) board is a RankedList of (score, user_id); scores are
+    updated in place as events arrive (remove old, insert new), so rank and
+    percentile queries never scan users. Weekly metrics are scored per ISO week:
+    the first update of a new week starts that metric's boards afresh.
+
+    Boards are derived data: `load` re-files a user from STATE after a restart or
+    shard migration, and the on_* hooks fold in each new entry.
+    """
+
+    def __init__(self):
+        self._boards: Dict[Tuple[str, str], RankedList] = {}
+        self._entries: Dict[Tuple[str, str], Tuple[float, str]] = {}  # (metric, user) -> (score, cohort)
+        self._periods: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    # -------------------------------
+    # Updates
+    # -------------------------------
+    def _board(self, metric: str, cohort: str) -> RankedList:
+        board = self._boards.get((metric, cohort))
+        if board is None:
+            board = self._boards[(metric, cohort)] = RankedList()
+        return board
+
+    def _roll(self, metric: str, period: str) -> bool:
+        """Start a new period for the metric if `period` is newer; False for a stale period."""
+        current = self._periods.get(metric)
+        if current == period:
+            return True
+        if current is not None and period < current:
+            return False
+        self._periods[metric] = period
+        for key in [k for k in self._boards if k[0] == metric]:
+            del self._boards[key]
+        for key in [k for k in self._entries if k[0] == metric]:
+            del self._entries[key]
+        return True
+
+    def _put(self, metric: str, user_id: str, score: float, cohort: str) -> None:
+        old = self._entries.get((metric, user_id))
+        if old is not None:
+            if old == (score, cohort):
+                return
+            for c in (ALL, old[1]):
+                self._board(metric, c).remove((old[0], user_id))
+        for c in (ALL, cohort):
+            self._board(metric, c).add((score, user_id))
+        self._entries[(metric, user_id)] = (score, cohort)
+
+    def set(self, metric: str, user_id: str, score: float, cohort: str, period: str = "") -> None:
+        with self._lock:
+            if self._roll(metric, period):
+                self._put(metric, user_id, float(score), cohort)
+
+    def increment(self, metric: str, user_id: str, delta: float, cohort: str, period: str = "") -> None:
+        with self._lock:
+            if self._roll(metric, period):
+                old = self._entries.get((metric, user_id))
+                self._put(metric, user_id, (old[0] if old else 0.0) + float(delta), cohort)
+
+    def move(self, user_id: str, cohort: str) -> None:
+        """Re-file a user whose goal or level changed."""
+        with self._lock:
+            for metric in METRICS:
+                old = self._entries.get((metric, user_id))
+                if old is not None and old[1] != cohort:
+                    self._put(metric, user_id, old[0], cohort)
+
+    # -------------------------------
+    # STATE hooks
+    # -------------------------------
+    def on_progress(self, user_id: str, entry: Dict[str, Any]) -> None:
+        cohort = _cohort(user_id)
+        self.set("adherence", user_id, adherence_score(user_id, log=False), cohort)
+        week = _week_of(entry)
+        if week == current_week():
+            self.increment("weekly_kcals", user_id, _number(entry.get("kcals_burned")), cohort, week)
+
+    def on_wearable(self, user_id: str, entry: Dict[str, Any]) -> None:
+        week = _week_of(entry)
+        if week == current_week():
+            self.increment("weekly_steps", user_id, _number(entry.get("steps")),
+                           _cohort(user_id), week)
+
+    def on_profile(self, user_id: str) -> None:
+        self.move(user_id, _cohort(user_id))
+
+    def load(self, user_id: str) -> None:
+        """
+        (Re)compute a user's scores from stored entries. A user still encoded since
+        restore or migration is filed from the scores saved with it instead of decoded.
+        """
+        scores = getattr(STATE.lazy_loader(user_id), "summary", None)
+        if scores is None:
+            scores = board_scores(STATE.export_user(user_id))
+        for metric in METRICS:
+            if metric in scores:
+                score, period = scores[metric]
+                if period == self.period(metric):  # weekly scores from an earlier week are void
+                    self.set(metric, user_id, score, scores["cohort"], period)
+
+    def drop(self, user_id: str) -> None:
+        with self._lock:
+            for metric in METRICS:
+                old = self._entries.pop((metric, user_id), None)
+                if old is not None:
+                    for c in (ALL, old[1]):
+                        self._board(metric, c).remove((old[0], user_id))
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def _live(self, metric: str) -> bool:
+        if metric not in METRICS:
+            raise ValueError(f"unknown leaderboard metric '{metric}'; expected one of {METRICS}")
+        return metric not in WEEKLY or self._periods.get(metric) == current_week()
+
+    def period(self, metric: str) -> str:
+        return current_week() if metric in WEEKLY else ""
+
+    def standing(self, metric: str, score: float, cohort: str = ALL) -> Dict[str, Any]:
+        """How many users on the board score above, equal to and below `score`."""
+        with self._lock:
+            board = self._boards.get((metric, cohort)) if self._live(metric) else None
+            total = len(board) if board else 0
+            below = board.bisect_left((score, "")) if board else 0
+            above = total - board.bisect_left((math.nextafter(score, math.inf), "")) if board else 0
+        equal = total - above - below
+        percentile = round(100.0 * (below + 0.5 * equal) / total, 2) if total else None
+        return {"above": above, "equal": equal, "below": below, "total": total, "percentile": percentile}
+
+    def rank(self, metric: str, user_id: str, scope: str = "cohort") -> Optional[Dict[str, Any]]:
+        """
+        1-based rank (ties share a rank) and percentile of a user, in their cohort or
+        overall. Users without a profile are always ranked overall ("scope": "all").
+        """
+        if scope not in ("cohort", ALL):
+            raise ValueError(f"scope must be 'cohort' or '{ALL}'")
+        with self._lock:
+            entry = self._entries.get((metric, user_id)) if self._live(metric) else None
+        if entry is None:
+            return None
+        score, cohort = entry
+        board = cohort if scope == "cohort" and cohort != UNKNOWN else ALL
+        s = self.standing(metric, score, board)
+        return {"metric": metric, "user_id": user_id, "score": score, "cohort": cohort, "scope": board,
+                "rank": s["above"] + 1, "total": s["total"], "percentile": s["percentile"]}
+
+    def top(self, metric: str, cohort: str = ALL, limit: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            board = self._boards.get((metric, cohort)) if self._live(metric) else None
+            rows, rank, prev = [], 0, None
+            for i in range(min(limit, len(board) if board else 0)):
+                score, user_id = board[-1 - i]
+                if score != prev:
+                    rank, prev = i + 1, score
+                rows.append({"rank": rank, "user_id": user_id, "score": score})
+            total = len(board) if board else 0
+        return {"metric": metric, "cohort": cohort, "period": self.period(metric), "total": total, "entries": rows}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"boards": len(self._boards), "entries": len(self._entries), "periods": dict(self._periods)}
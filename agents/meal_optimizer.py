@@ -0,0 +1,223 @@
+# agents/meal_optimizer.py
+import threading
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+from .food_db import FoodDB
+from .profile_agent import CanonicalProfile, Flag, Goal, Level, canonicalize
+
+MACROS = ("calories", "protein_g", "carbohydrates_total_g", "fat_total_g")
+
+# Meal slots and their share of the day's energy
+SLOTS = (("breakfast", 0.25), ("lunch", 0.35), ("dinner", 0.30), ("snack", 0.10))
+PORTIONS = np.array([0.5, 0.75, 1.0, 1.25, 1.5, 2.0], dtype=np.float32)
+
+# goal -> (energy factor on maintenance, protein g/kg, fat share of kcal)
+GOAL_TARGETS = {
+    Goal.FAT_LOSS: (0.80, 2.0, 0.25),
+    Goal.MUSCLE_GAIN: (1.10, 1.8, 0.25),
+    Goal.ENDURANCE: (1.05, 1.4, 0.25),
+    Goal.GENERAL_FITNESS: (1.00, 1.6, 0.30),
+}
+ACTIVITY = {Level.BEGINNER: 1.4, Level.INTERMEDIATE: 1.55, Level.ADVANCED: 1.7}
+DEFAULT_WEIGHT_KG = 70.0
+
+# Relative-error weights for kcal, protein, carbs, fat
+MACRO_WEIGHTS = np.array([2.0, 1.5, 0.75, 0.75], dtype=np.float32)
+# A day counts as on target when every macro is within this relative error
+TOLERANCE = {"calories": 0.10, "protein_g": 0.25, "carbohydrates_total_g": 0.25, "fat_total_g": 0.25}
+REPEAT_PENALTY = 0.15    # per earlier day the food was already served
+LIKE_BONUS = 0.10        # name mentions something from the user's preferences
+REFINE_PASSES = 2
+
+# Profile flags -> food tags they require / exclude
+REQUIRE_TAGS = {Flag.VEGAN: "vegan", Flag.VEGETARIAN: "vegetarian", Flag.PESCATARIAN: "vegetarian_or_fish"}
+EXCLUDE_TAGS = {Flag.NO_DAIRY: "dairy", Flag.NO_GLUTEN: "gluten", Flag.NO_NUTS: "nuts",
+                Flag.NO_EGG: "egg", Flag.NO_FISH: "fish", Flag.NO_SOY: "soy"}
+
+
+def daily_targets(profile: CanonicalProfile, weight_kg: Optional[float] = None) -> Dict[str, float]:
+    """
+    Daily kcal and macro targets. Profiles carry no height or sex, so maintenance
+    is a weight-based estimate (22 kcal/kg, tapering after 30) times an activity
+    factor taken from the training level.
+    """
+    weight = float(weight_kg or DEFAULT_WEIGHT_KG)
+    age = profile.age
+    factor, protein_per_kg, fat_share = GOAL_TARGETS[profile.goal]
+    activity = ACTIVITY[profile.level]
+
+    maintenance = (22.0 * weight - 5.0 * max(0, age - 30)) * activity
+    kcal = max(1200.0, maintenance * factor)
+    protein = protein_per_kg * weight
+    fat = kcal * fat_share / 9.0
+    carbs = max(0.0, (kcal - protein * 4.0 - fat * 9.0) / 4.0)
+    return {"calories": round(kcal), "protein_g": round(protein), "carbohydrates_total_g": round(carbs), "fat_total_g": round(fat)}
+
+
+def diet_filters(profile: CanonicalProfile) -> Tuple[List[str], List[str], List[str]]:
+    """(required tags, excluded tags, liked words) from the profile's parsed flags."""
+    require = sorted(tag for flag, tag in REQUIRE_TAGS.items() if profile.flags & flag)
+    exclude = sorted(tag for flag, tag in EXCLUDE_TAGS.items() if profile.flags & flag)
+    return require, exclude, list(profile.likes)
+
+
+class _Table:
+    """Dense numpy view of a FoodDB: macro matrix plus one bitmask per food for tags."""
+
+    def __init__(self, db: FoodDB):
+        self.db = db
+        self.macros = np.stack([db.columns[c] for c in MACROS], axis=1).astype(np.float32)
+        vocab = sorted({t for tags in db.tags for t in tags})
+        self.bits = {t: np.uint64(1) << np.uint64(i) for i, t in enumerate(vocab)}
+        masks = np.zeros(len(db), dtype=np.uint64)
+        for i, tags in enumerate(db.tags):
+            for t in tags:
+                masks[i] |= self.bits[t]
+        self.masks = masks
+        self.lower_names = [n.lower() for n in db.names]
+
+    def has(self, tag: str) -> np.ndarray:
+        bit = self.bits.get(tag)
+        if bit is None:
+            return np.zeros(len(self.masks), dtype=bool)
+        return (self.masks & bit) != 0
+
+    def allowed(self, require: Iterable[str], exclude: Iterable[str]) -> np.ndarray:
+        ok = np.ones(len(self.masks), dtype=bool)
+        for tag in require:
+            if tag == "vegetarian_or_fish":
+                ok &= self.has("vegetarian") | self.has("fish")
+            else:
+                ok &= self.has(tag)
+        for tag in exclude:
+            ok &= ~self.has(tag)
+        return ok
+
+
+_TABLES: "weakref.WeakKeyDictionary[FoodDB, _Table]" = weakref.WeakKeyDictionary()
+_TABLES_LOCK = threading.Lock()
+
+
+def _table(db: FoodDB) -> _Table:
+    with _TABLES_LOCK:
+        table = _TABLES.get(db)
+        if table is None:
+            table = _TABLES[db] = _Table(db)
+        return table
+
+
+def _off_target(totals: np.ndarray, target: np.ndarray) -> Dict[str, float]:
+    errors = (totals - target) / np.maximum(target, 1.0)
+    return {m: round(float(e), 2) for m, e in zip(MACROS, errors) if abs(e) > TOLERANCE[m]}
+
+
+class MealOptimizer:
+    """
+    Picks one food and a portion size per meal slot so each day lands close to the
+    profile's kcal/macro targets.
+
+    Every candidate (food x portion) is scored at once with numpy as a weighted
+    relative error against the slot's target. Slots are filled greedily, each
+    aiming at whatever the day still needs, and a few coordinate-descent passes then
+    re-pick each slot with the others held fixed. Foods served on earlier days pay
+    a repeat penalty so the week varies.
+
+    Targets the allowed foods cannot reach (strict diets, very high needs) are not
+    an error: each day lists the macros outside TOLERANCE under "off_target" as
+    signed relative errors, and the plan's "met" says whether every day was on target.
+    """
+
+    def __init__(self, db: FoodDB):
+        self.db = db
+        self.table = _table(db)
+
+    def plan(self, profile: Union[CanonicalProfile, Dict[str, Any]], days: int = 7,
+             weight_kg: Optional[float] = None) -> Dict[str, Any]:
+        if not isinstance(profile, CanonicalProfile):
+            profile = canonicalize(profile)
+        targets = daily_targets(profile, weight_kg)
+        target_vec = np.array([targets[m] for m in MACROS], dtype=np.float32)
+        require, exclude, likes = diet_filters(profile)
+        allowed = self.table.allowed(require, exclude)
+
+        bonus = np.zeros(len(self.db), dtype=np.float32)
+        if likes:
+            for i, name in enumerate(self.table.lower_names):
+                if any(w in name for w in likes):
+                    bonus[i] = LIKE_BONUS
+
+        slot_ids = []
+        for slot, _ in SLOTS:
+            ids = np.flatnonzero(allowed & self.table.has(slot))
+            if ids.size == 0:  # constraints emptied the slot: fall back to any allowed main dish
+                ids = np.flatnonzero(allowed & ~self.table.has("ingredient") & ~self.table.has("side"))
+            slot_ids.append(ids)
+
+        # Every (food, portion) candidate per slot as rows of a (F*P, 4) matrix, plus its squares,
+        # so a weighted squared error against any goal is two mat-vec products (see _solve_day).
+        values = [(self.table.macros[ids][:, None, :] * PORTIONS[None, :, None]).reshape(-1, len(MACROS))
+                  for ids in slot_ids]
+        squares = [v * v for v in values]
+        shares = np.array([s for _, s in SLOTS], dtype=np.float32)
+        served = np.zeros(len(self.db), dtype=np.float32)
+
+        out = []
+        for day in range(days):
+            penalties = [np.repeat(served[ids] * REPEAT_PENALTY - bonus[ids], len(PORTIONS)) for ids in slot_ids]
+            picks = self._solve_day(slot_ids, values, squares, penalties, shares, target_vec)
+            meals, totals = [], np.zeros(len(MACROS), dtype=np.float32)
+            for (slot, _), (idx, portion) in zip(SLOTS, picks):
+                if idx < 0:
+                    continue
+                served[idx] += 1
+                totals += self.table.macros[idx] * portion
+                meals.append({"slot": slot, "food_id": int(idx), "name": self.db.names[idx], "servings": float(portion)})
+            out.append({"day": day + 1, "meals": meals,
+                        "totals": {m: round(float(v), 1) for m, v in zip(MACROS, totals)},
+                        "off_target": _off_target(totals, target_vec)})
+        return {"targets": targets, "require": require, "exclude": exclude, "days": out,
+                "met": not any(d["off_target"] for d in out)}
+
+    def _solve_day(self, slot_ids, values, squares, penalties, shares, target) -> List[Tuple[int, float]]:
+        n, n_portions = len(SLOTS), len(PORTIONS)
+        picks: List[Tuple[int, float]] = [(-1, 0.0)] * n
+        vals = np.zeros((n, len(MACROS)), dtype=np.float32)
+
+        def best(s: int, offset: np.ndarray, goal: np.ndarray, used: set) -> Tuple[int, float, np.ndarray]:
+            ids = slot_ids[s]
+            if ids.size == 0:
+                return -1, 0.0, np.zeros(len(MACROS), dtype=np.float32)
+            # sum_m w_m ((v_m + offset_m - goal_m) / goal_m)^2, dropping the candidate-independent term
+            a = MACRO_WEIGHTS / np.maximum(goal, 1.0) ** 2
+            cost = squares[s] @ a - values[s] @ (2.0 * a * (goal - offset)) + penalties[s]
+            while True:
+                row = int(np.argmin(cost))
+                f, p = divmod(row, n_portions)
+                if int(ids[f]) not in used:
+                    return int(ids[f]), float(PORTIONS[p]), values[s][row]
+                cost[f * n_portions:(f + 1) * n_portions] = np.inf
+                if used.issuperset(ids.tolist()):
+                    return -1, 0.0, np.zeros(len(MACROS), dtype=np.float32)
+
+        # Greedy: each slot targets its share of what is still missing
+        zero = np.zeros(len(MACROS), dtype=np.float32)
+        remaining = target.copy()
+        for s in range(n):
+            need = np.maximum(remaining * (shares[s] / shares[s:].sum()), 0.0)
+            idx, portion, v = best(s, zero, need, {p[0] for p in picks if p[0] >= 0})
+            picks[s], vals[s] = (idx, portion), v
+            remaining = remaining - v
+
+        # Coordinate descent on the whole day's error, one slot at a time
+        for _ in range(REFINE_PASSES):
+            changed = False
+            for s in range(n):
+                others = vals.sum(axis=0) - vals[s]
+                used = {p[0] for i, p in enumerate(picks) if i != s and p[0] >= 0}
+                idx, portion, v = best(s, others, target, used)
+                if (idx, portion) != picks[s]:
+                    picks[s], vals[s], changed = (idx, portion), v, True
+            if not changed:
+                break
+        return picks
@@ -1,9 +1,12 @@
 # agents/nutrition_agent.py
 import os
 import requests
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
-from .base_agent import log_event
+from .base_agent import STATE, log_event
+from .food_db import get_food_db
+from .meal_optimizer import MealOptimizer
+from .profile_agent import CanonicalProfile
 
 load_dotenv()
 
@@ -17,7 +20,14 @@ class NutritionAgent:
             raise ValueError("CALORIE_NINJAS_KEY missing in .env")
 
     def _fetch_nutrition(self, query: str) -> List[Dict[str, Any]]:
-        """Fetch nutrition info for a given food query."""
+        """Nutrition info for a food query: local database first, API for unknown foods."""
+        local = get_food_db().lookup(query)
+        if local is not None:
+            return local
+        return self._fetch_remote(query)
+
+    def _fetch_remote(self, query: str) -> List[Dict[str, Any]]:
+        """Fetch nutrition info for a given food query from the CalorieNinjas API."""
         try:
             headers = {"X-Api-Key": API_KEY}
             params = {"query": query}
@@ -29,30 +39,38 @@ class NutritionAgent:
         except Exception as e:
             return [{"error": str(e)}]
 
-    def generate(self, user_id: str, profile: Dict[str, Any], days: int = 7) -> List[Dict[str, Any]]:
-        """Generate meal plan for the given profile."""
+    def generate(self, user_id: str, profile: CanonicalProfile, days: int = 7) -> List[Dict[str, Any]]:
+        """Generate a meal plan that hits the profile's daily kcal/macro targets."""
+        db = get_food_db()
+        plan = MealOptimizer(db).plan(profile, days, weight_kg=self._latest_weight(user_id))
+
         meals = []
-        goal = profile.get("goal", "").lower()
-
-        # Basic mapping (can later use LLM-driven menu)
-        if goal == "fat_loss":
-            items = ["grilled chicken salad", "oatmeal with fruits", "boiled eggs"]
-        elif goal == "muscle_gain":
-            items = ["chicken breast rice", "protein shake", "scrambled eggs"]
-        else:
-            items = ["vegetable curry", "dal rice", "fruit smoothie"]
-
-        for i, food in enumerate(items[:days]):
-            nutrition_info = self._fetch_nutrition(food)
+        for day in plan["days"]:
+            nutrition_info = []
+            for m in day["meals"]:
+                rec = db.record(m["food_id"])
+                nutrition_info.append({k: round(v * m["servings"], 1) if k != "name" else v for k, v in rec.items()})
             meals.append({
-                "day": i + 1,
-                "item": food,
+                "day": day["day"],
+                "item": ", ".join(m["name"] for m in day["meals"]),
+                "meals": [{"slot": m["slot"], "item": m["name"], "servings": m["servings"]} for m in day["meals"]],
+                "totals": day["totals"],
+                "targets": plan["targets"],
+                "off_target": day["off_target"],
                 "nutrition_info": nutrition_info
             })
 
-        log_event(user_id, "NutritionAgent", "generate_meal_plan", payload={"meals": meals})
+        log_event(user_id, "NutritionAgent", "generate_meal_plan",
+                  payload={"targets": plan["targets"], "exclude": plan["exclude"], "met": plan["met"],
+                           "items": [m["item"] for m in meals]})
         return meals
 
+    def _latest_weight(self, user_id: str) -> Optional[float]:
+        for entry in reversed(STATE.get(user_id, "progress") or []):
+            if entry.get("weight_kg"):
+                return float(entry["weight_kg"])
+        return None
+
     def adjust(self, user_id: str, adjustment_text: str):
         """Optional future: adjust meals via feedback text."""
         nutrition_info = self._fetch_nutrition(adjustment_text)
@@ -1,7 +1,10 @@
 # agents/orchestrator.py
-from typing import Dict, Any, List
-from .base_agent import STATE, log_event
-from .profile_agent import ProfileAgent, UserProfile
+import hashlib
+import json
+import time
+from typing import Dict, Any, List, Optional
+from .base_agent import STATE, buffered_logs, commit_logs, log_event
+from .profile_agent import ProfileAgent, UserProfile, parse_goal, parse_level
 from .workout_agent import WorkoutAgent
 from .nutrition_agent import NutritionAgent
 from .feedback_agent import FeedbackAgent
@@ -13,10 +16,15 @@ from .gamification_agent import GamificationAgent
 from .scoring import adherence_score, auto_tune_sets
 from .rl_adapter import RLAdapter
 from .ask_agent import AskAgent
+from .plan_store import PlanStore
+from .rule_engine import RuleEngine
+from .precompute import PrecomputeScheduler
+from .leaderboard import ALL, Leaderboards, cohort_of
+from .replay import EventRecorder
 
 
 class Orchestrator:
-    def __init__(self):
+    def __init__(self, precompute: bool = True, recorder: Optional[EventRecorder] = None):
         self.profile = ProfileAgent()
         self.workout = WorkoutAgent()
         self.nutrition = NutritionAgent()
@@ -28,8 +36,100 @@ class Orchestrator:
         self.gamify = GamificationAgent()
         self.rl = RLAdapter()
         self.ask = AskAgent()  # Using FeedbackAgent for Q&A functionality
+        self.plans = PlanStore()
+        self.rule_engine = RuleEngine()
+        self.leaderboards = Leaderboards()
+        self.recorder = recorder
+        self.precompute = PrecomputeScheduler(self._build_plan, self._plan_fingerprint) if precompute else None
+
+    def _feedback_summary(self, user_id: str) -> str:
+        logs: List[Dict[str, Any]] = STATE.get(user_id, "logs", []) or []
+        return " ".join(
+            [l.get("payload", {}).get("reason", "") for l in logs if l.get("agent") == "FeedbackAgent"]
+        )
+
+    def _plan_fingerprint(self, user_id: str, days: int) -> str:
+        """Hash of everything generate_plan reads; progress and wearables are append-only."""
+        progress = STATE.get(user_id, "progress", []) or []
+        wearables = STATE.get(user_id, "wearables", []) or []
+        key = json.dumps([
+            days,
+            STATE.get(user_id, "profile"),
+            len(progress), progress[-1] if progress else None,
+            len(wearables), wearables[-1] if wearables else None,
+            self._feedback_summary(user_id),
+        ], sort_keys=True, default=str)
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    def _schedule_precompute(self, user_id: str) -> None:
+        if self.precompute:
+            self.precompute.notify(user_id)
+
+    def _cohort(self, payload: Dict[str, Any]) -> str:
+        goal, level = payload.get("goal"), payload.get("level")
+        if not goal and not level:
+            return ALL
+        if not (goal and level):
+            raise ValueError("goal and level must be given together")
+        return cohort_of(parse_goal(goal), parse_level(level))
+
+    def _build_plan(self, user_id: str, days: int) -> Dict[str, Any]:
+        """
+        Everything generate_plan computes before committing; safe to run speculatively.
+        Nothing is written to STATE: agent log entries come back under "logs" and are
+        committed only if generate_plan uses this build.
+        """
+        with buffered_logs() as logs:
+            built = self._build_plan_unlogged(user_id, days)
+        return {**built, "logs": logs}
+
+    def _build_plan_unlogged(self, user_id: str, days: int) -> Dict[str, Any]:
+        profile = self.profile.get(user_id)
+        if not profile:
+            raise ValueError("No profile found. Call create_profile first.")
+        canon = self.profile.canonical(user_id)
+
+        # Generate workout and nutrition plans
+        workout = self.workout.generate(user_id, canon, days)
+        meals = self.nutrition.generate(user_id, canon, days)
+
+        # Conflict resolution and rule generation
+        resolved = self.coordinator.resolve(user_id, canon, workout, meals)
+        llm_rules = self.rules.generate(user_id, profile, self._feedback_summary(user_id))
+
+        # Wearable, adherence, and RL-based adjustments
+        signal = self.wearable.latest_signal(user_id) or {}
+        score = adherence_score(user_id, log=False)
+        rl_suggestion = self.rl.suggest(user_id, profile, workout, signal) or {}
+        delta = rl_suggestion.get("delta_sets", 0)
+        fatigue_flag = (signal.get("hr_avg", 0) >= 100) or (signal.get("sleep_hours", 7) < 6)
+
+        # Tune workouts dynamically
+        for d in workout:
+            tuned = auto_tune_sets(d.get("sets", 2), score, fatigue_flag)
+            tuned += delta
+            d["sets"] = max(1, min(5, tuned))
+
+        # Evaluate compiled LLM rules against the plan's signals
+        self.rule_engine.load(user_id, llm_rules.get("rules"))
+        row = self.rule_engine.signals(profile, signal, self.progress.summarize(user_id), score)
+        workout, applied = self.rule_engine.apply(user_id, workout, row)
+        llm_rules = {**llm_rules, "applied": applied}
+
+        return {"workout": workout, "meals": meals, "rules": llm_rules, "score": score}
 
     def handle_event(self, event: str, user_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.recorder is None:
+            return self._dispatch(event, user_id, payload)
+        started, t0, ok = time.time(), time.perf_counter(), False
+        try:
+            result = self._dispatch(event, user_id, payload)
+            ok = True
+            return result
+        finally:
+            self.recorder.record(started, event, user_id, payload, (time.perf_counter() - t0) * 1000, ok)
+
+    def _dispatch(self, event: str, user_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         e = event.strip().lower()
 
         # -------------------------------
@@ -39,6 +139,7 @@ class Orchestrator:
             prof = payload.get("profile", payload)
             profile = UserProfile(**prof)
             stored = self.profile.upsert(user_id, profile)
+            self.leaderboards.on_profile(user_id)
             log_event(user_id, "Orchestrator", "profile_created", payload=prof)
             return {"status": "ok", "profile": stored}
 
@@ -51,50 +152,32 @@ class Orchestrator:
 
             # Ensure profile exists
             if profile_data:
-                stored = self.profile.upsert(user_id, UserProfile(**profile_data))
-                profile = stored
-            else:
-                profile = self.profile.get(user_id)
-                if not profile:
-                    raise ValueError("No profile found. Call create_profile first.")
-
-            # Generate workout and nutrition plans
-            workout = self.workout.generate(user_id, profile, days)
-            meals = self.nutrition.generate(user_id, profile, days)  # ← API call happens here
-
-            # Feedback summary
-            logs: List[Dict[str, Any]] = STATE.get(user_id, "logs", []) or []
-            feedback_summary = " ".join(
-                [l.get("payload", {}).get("reason", "") for l in logs if l.get("agent") == "FeedbackAgent"]
-            )
-
-            # Conflict resolution and rule generation
-            resolved = self.coordinator.resolve(user_id, profile, workout, meals)
-            llm_rules = self.rules.generate(user_id, profile, feedback_summary)
-
-            # Wearable, adherence, and RL-based adjustments
-            signal = self.wearable.latest_signal(user_id) or {}
-            score = adherence_score(user_id)
-            rl_suggestion = self.rl.suggest(user_id, profile, workout, signal) or {}
-            delta = rl_suggestion.get("delta_sets", 0)
-            fatigue_flag = (signal.get("hr_avg", 0) >= 100) or (signal.get("sleep_hours", 7) < 6)
-
-            # Tune workouts dynamically
-            for d in workout:
-                tuned = auto_tune_sets(d.get("sets", 2), score, fatigue_flag)
-                tuned += delta
-                d["sets"] = max(1, min(5, tuned))
-
-            # Save plan in memory
-            STATE.set(user_id, "plans", {"workout": workout, "nutrition": meals})
-            log_event(user_id, "Orchestrator", "store_plans", payload={"rules": llm_rules})
+                self.profile.upsert(user_id, UserProfile(**profile_data))
+                self.leaderboards.on_profile(user_id)
+            elif not self.profile.get(user_id):
+                raise ValueError("No profile found. Call create_profile first.")
+
+            # Serve the speculatively precomputed plan if its inputs are unchanged
+            built = self.precompute.take(user_id, days) if self.precompute else None
+            precomputed = built is not None
+            if built is None:
+                built = self._build_plan(user_id, days)
+            workout, meals, llm_rules, score = built["workout"], built["meals"], built["rules"], built["score"]
+            commit_logs(built["logs"])
+            STATE.set(user_id, "rules", llm_rules)
+
+            # Save plan as a new version
+            version = self.plans.commit(user_id, {"workout": workout, "nutrition": meals}, "generate_plan")
+            log_event(user_id, "Orchestrator", "store_plans", payload={"rules": llm_rules, "version": version})
 
             return {
                 "status": "ok",
                 "workout_plan": workout,
                 "meal_plan": meals,  # ✅ includes real nutrition data
                 "rules": llm_rules,
-                "adherence_score": score
+                "adherence_score": score,
+                "plan_version": version,
+                "precomputed": precomputed
             }
 
         # -------------------------------
@@ -106,37 +189,47 @@ class Orchestrator:
                 raise ValueError("feedback_text required")
 
             adj = self.feedback.interpret(user_id, fb_text) or {}
-            plans = STATE.get(user_id, "plans", {"workout": [], "nutrition": []}) or {}
+            plans = self.plans.current(user_id)
             workout = plans.get("workout", []) or []
             nutrition = plans.get("nutrition", []) or []
 
             # Ensure adj is a dictionary
             adj = adj if isinstance(adj, dict) else {}
 
-            # Adjust intensity
+            # Adjust intensity (copy-on-write: committed days are shared with older versions)
             delta = adj.get("workout", {}).get("delta_sets", 0)
             if delta and workout:
-                for d in workout:
-                    d["sets"] = max(1, d.get("sets", 2) + delta)
+                workout = [{**d, "sets": max(1, d.get("sets", 2) + delta)} for d in workout]
 
             # Nutrition tweak
             nutrition_adj = adj.get("nutrition", {})
             if nutrition and isinstance(nutrition_adj, dict) and nutrition_adj.get("swap"):
-                for d in nutrition:
-                    d.setdefault("notes", "")
-                    d["notes"] += " " + str(nutrition_adj.get("swap", ""))
+                swap = " " + str(nutrition_adj.get("swap", ""))
+                nutrition = [{**d, "notes": d.get("notes", "") + swap} for d in nutrition]
 
-            STATE.set(user_id, "plans", {"workout": workout, "nutrition": nutrition})
-            log_event(user_id, "Orchestrator", "apply_feedback", payload=adj)
-            return {"status": "ok", "adjustment": adj, "workout_plan": workout, "meal_plan": nutrition}
+            # No plan yet: record the feedback for the next generate_plan, but commit no empty version
+            version = None
+            if self.plans.count(user_id):
+                version = self.plans.commit(user_id, {"workout": workout, "nutrition": nutrition}, "apply_feedback")
+            log_event(user_id, "Orchestrator", "apply_feedback", payload={**adj, "version": version})
+            self._schedule_precompute(user_id)
+            return {
+                "status": "ok",
+                "adjustment": adj,
+                "workout_plan": workout,
+                "meal_plan": nutrition,
+                "plan_version": version
+            }
 
         # -------------------------------
         # 4. LOG PROGRESS
         # -------------------------------
         if e == "log_progress":
-            entry = ProgressLog(**payload)
-            self.progress.log(user_id, entry)
-            log_event(user_id, "Orchestrator", "progress_logged", payload=entry.dict())
+            stored = self.progress.log(user_id, ProgressLog(**payload))
+            log_event(user_id, "Orchestrator", "progress_logged", payload=stored)
+            self.gamify.evaluate(user_id)
+            self.leaderboards.on_progress(user_id, stored)
+            self._schedule_precompute(user_id)
             return {"status": "ok", "message": "progress logged"}
 
         # -------------------------------
@@ -155,30 +248,82 @@ class Orchestrator:
                 raise ValueError("wearable metrics required")
             result = self.wearable.ingest(user_id, payload)
             log_event(user_id, "Orchestrator", "wearable_ingested", payload=payload)
+            self.gamify.evaluate(user_id)
+            self.leaderboards.on_wearable(user_id, payload)
+            self._schedule_precompute(user_id)
             return result
 
         # -------------------------------
         # 7. GAMIFICATION / BADGES
         # -------------------------------
+        # Badges are awarded on the write path (log_progress / ingest_wearable),
+        # so this read, like get_progress and get_metrics, has no side effects.
         if e == "get_badges":
-            badges = self.gamify.evaluate(user_id)
-            log_event(user_id, "Orchestrator", "get_badges", payload=badges)
-            return {"status": "ok", **badges}
+            return {"status": "ok", **self.gamify.badges(user_id)}
 
         # -------------------------------
         # 8. METRICS / STATS
         # -------------------------------
         if e == "get_metrics":
-            score = adherence_score(user_id)
-            logs: List[Dict[str, Any]] = STATE.get(user_id, "logs", []) or []
-            revisions = len([
-                l for l in logs
-                if l.get("action") in ("apply_feedback", "resolve_conflicts", "store_plans")
-            ])
-            metrics = {"adherence_score": score, "plan_revisions": revisions}
-            log_event(user_id, "Orchestrator", "metrics", payload=metrics)
+            score = adherence_score(user_id, log=False)
+            metrics = {"adherence_score": score, "plan_revisions": self.plans.count(user_id)}
             return {"status": "ok", **metrics}
-        
+
+        # -------------------------------
+        # LEADERBOARDS (all users, or one goal/level cohort)
+        # -------------------------------
+        if e == "get_leaderboard":
+            board = self.leaderboards.top(payload.get("metric", "adherence"), self._cohort(payload),
+                                          max(1, min(int(payload.get("limit", 10)), 100)))
+            return {"status": "ok", **board}
+
+        if e == "get_rank":
+            metric = payload.get("metric", "adherence")
+            rank = self.leaderboards.rank(metric, user_id, payload.get("scope", "cohort"))
+            if rank is None:
+                raise ValueError(f"user '{user_id}' has no {metric} score yet")
+            return {"status": "ok", **rank}
+
+        if e == "get_percentile":
+            metric = payload.get("metric", "adherence")
+            cohort = self._cohort(payload)
+            standing = self.leaderboards.standing(metric, float(payload["value"]), cohort)
+            return {"status": "ok", "metric": metric, "cohort": cohort, **standing}
+
+        # -------------------------------
+        # 9. PLAN HISTORY / VERSIONS
+        # -------------------------------
+        if e == "get_plan_history":
+            return {"status": "ok", "versions": self.plans.history(user_id)}
+
+        if e == "get_plan_version":
+            version = payload.get("version")
+            plan = self.plans.get(user_id, None if version is None else int(version))
+            return {"status": "ok", "workout_plan": plan["workout"], "meal_plan": plan["nutrition"]}
+
+        if e == "get_plan_diff":
+            from_version = int(payload.get("from_version", 0))
+            to_version = payload.get("to_version")
+            if to_version is None:
+                to_version = self.plans.count(user_id) - 1
+            diff = self.plans.diff(user_id, from_version, int(to_version))
+            return {"status": "ok", "from_version": from_version, "to_version": int(to_version), "diff": diff}
+
+
+        if e == "precompute_stats":
+            stats = self.precompute.stats() if self.precompute else {"enabled": False}
+            return {"status": "ok", **stats}
+
+        if e == "rule_stats":
+            # How many users each rule fires for right now, over users with compiled rules
+            users = self.rule_engine.users()
+            fired = self.rule_engine.evaluate_batch(users, self.rule_engine.collect_columns(users, self.progress.summarize))
+            counts: Dict[str, int] = {}
+            for hits in fired.values():
+                for cond, _ in hits:
+                    counts[cond.source] = counts.get(cond.source, 0) + 1
+            return {"status": "ok", "users": len(users),
+                    "rules": dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))}
 
         # -------------------------------
         # ASK AI (Conversational Q&A)
@@ -198,5 +343,6 @@ class Orchestrator:
         raise ValueError(
             f"Unsupported event '{event}'. Supported: "
             "create_profile, generate_plan, submit_feedback, "
-            "log_progress, get_progress, ingest_wearable, get_badges, get_metrics"
+            "log_progress, get_progress, ingest_wearable, get_badges, get_metrics, "
+            "get_plan_history, get_plan_version, get_plan_diff, precompute_stats, rule_stats, get_leaderboard, get_rank, get_percentile, ask_ai"
         )
@@ -0,0 +1,140 @@
+# agents/plan_store.py
+import time
+from typing import Any, Dict, List, Optional
+from .base_agent import STATE
+
+SECTIONS = ("workout", "nutrition")
+CHECKPOINT_EVERY = 16  # full snapshot every N versions bounds replay cost
+
+
+def _day_key(day: Dict[str, Any], idx: int) -> int:
+    return day.get("day", idx + 1)
+
+
+def _diff_section(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Day-level diff: only the fields that changed on each day are recorded.
+    Days that are the same object (structurally shared) are skipped without a compare.
+    """
+    old_by_day = {_day_key(d, i): d for i, d in enumerate(old)}
+    changed: Dict[int, Dict[str, Any]] = {}
+    new_order: List[int] = []
+
+    for i, nd in enumerate(new):
+        day = _day_key(nd, i)
+        new_order.append(day)
+        od = old_by_day.get(day)
+        if od is nd:
+            continue
+        if od is None:
+            changed[day] = {"set": dict(nd)}
+            continue
+        fields = {k: v for k, v in nd.items() if k not in od or od[k] != v}
+        unset = [k for k in od if k not in nd]
+        if fields or unset:
+            change: Dict[str, Any] = {"set": fields}
+            if unset:
+                change["unset"] = unset
+            changed[day] = change
+
+    diff: Dict[str, Any] = {}
+    if changed:
+        diff["changed"] = changed
+    if new_order != [_day_key(d, i) for i, d in enumerate(old)]:
+        diff["order"] = new_order
+    return diff
+
+
+def _apply_section(base: List[Dict[str, Any]], diff: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Apply a section diff, reusing every untouched day dict from `base`."""
+    if not diff:
+        return base
+    by_day = {_day_key(d, i): d for i, d in enumerate(base)}
+    for day, change in diff.get("changed", {}).items():
+        cur = by_day.get(day)
+        if cur is None:
+            nd = dict(change["set"])
+        else:
+            unset = change.get("unset", ())
+            nd = {k: v for k, v in cur.items() if k not in unset}
+            nd.update(change["set"])
+        by_day[day] = nd
+    # an emptied section records order == [], which must not fall back to base
+    order = diff["order"] if "order" in diff else [_day_key(d, i) for i, d in enumerate(base)]
+    return [by_day[d] for d in order]
+
+
+def diff_plans(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    diff = {}
+    for section in SECTIONS:
+        d = _diff_section(old.get(section, []) or [], new.get(section, []) or [])
+        if d:
+            diff[section] = d
+    return diff
+
+
+def apply_diff(plan: Dict[str, Any], diff: Dict[str, Any]) -> Dict[str, Any]:
+    return {s: _apply_section(plan.get(s, []) or [], diff.get(s, {})) for s in SECTIONS}
+
+
+class PlanStore:
+    """
+    Copy-on-write plan history per user.
+
+    Every commit stores only a day-level diff against the previous version; a full
+    checkpoint is kept every CHECKPOINT_EVERY versions. Checkpoints and the current
+    plan share unchanged day dicts, so committed plans must be treated as read-only:
+    build new day dicts instead of mutating the ones returned here.
+    """
+
+    def _versions(self, user_id: str) -> List[Dict[str, Any]]:
+        return STATE.get(user_id, "plan_versions", []) or []
+
+    def commit(self, user_id: str, plan: Dict[str, Any], reason: str = "") -> int:
+        versions = self._versions(user_id)
+        version = len(versions)
+        current = {s: list(plan.get(s, []) or []) for s in SECTIONS}
+
+        entry: Dict[str, Any] = {"version": version, "ts": int(time.time()), "reason": reason}
+        if versions:
+            previous = STATE.get(user_id, "plans", {}) or {}
+            entry["diff"] = diff_plans(previous, current)
+        if version % CHECKPOINT_EVERY == 0:
+            entry["checkpoint"] = current
+
+        STATE.append(user_id, "plan_versions", entry)
+        STATE.set(user_id, "plans", current)
+        return version
+
+    def current(self, user_id: str) -> Dict[str, Any]:
+        return STATE.get(user_id, "plans", {}) or {"workout": [], "nutrition": []}
+
+    def count(self, user_id: str) -> int:
+        return len(self._versions(user_id))
+
+    def get(self, user_id: str, version: Optional[int] = None) -> Dict[str, Any]:
+        versions = self._versions(user_id)
+        if version is None:
+            version = len(versions) - 1
+        if version < 0 or version >= len(versions):
+            raise ValueError(f"Plan version {version} not found for user '{user_id}'")
+        if version == len(versions) - 1:
+            return self.current(user_id)
+
+        start = version - version % CHECKPOINT_EVERY
+        plan = versions[start]["checkpoint"]
+        for entry in versions[start + 1:version + 1]:
+            plan = apply_diff(plan, entry.get("diff", {}))
+        return plan
+
+    def diff(self, user_id: str, from_version: int, to_version: int) -> Dict[str, Any]:
+        versions = self._versions(user_id)
+        if to_version == from_version + 1 and 0 < to_version < len(versions):
+            return versions[to_version].get("diff", {})
+        return diff_plans(self.get(user_id, from_version), self.get(user_id, to_version))
+
+    def history(self, user_id: str) -> List[Dict[str, Any]]:
+        return [
+            {"version": v["version"], "ts": v["ts"], "reason": v["reason"], "sections": sorted(v.get("diff", {}))}
+            for v in self._versions(user_id)
+        ]
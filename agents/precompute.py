@@ -0,0 +1,148 @@
+# agents/precompute.py
+import heapq
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class PrecomputeScheduler:
+    """
+    Debounced background plan regeneration.
+
+    Writes that change a user's plan inputs call `notify`; after `debounce_s` of quiet
+    the plan is rebuilt on a worker thread and parked with the input fingerprint it
+    was built from. `take` hands it out only if the fingerprint still matches, so a
+    stale plan is never served and the caller falls back to building synchronously.
+    """
+
+    def __init__(self, build: Callable[[str, int], Any], fingerprint: Callable[[str, int], str],
+                 debounce_s: float = 2.0, workers: int = 1, default_days: int = 7):
+        self._build = build
+        self._fingerprint = fingerprint
+        self.debounce_s = debounce_s
+        self.workers = workers
+        self.default_days = default_days
+
+        self._cv = threading.Condition()
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due: Dict[str, float] = {}
+        self._ready: Dict[str, Tuple[str, int, Any]] = {}
+        self._days: Dict[str, int] = {}
+        self._in_flight = 0
+        self._seq = 0
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+        self._stats = {"scheduled": 0, "built": 0, "discarded": 0, "errors": 0,
+                       "hits": 0, "misses": 0, "stale": 0, "build_ms_total": 0.0}
+
+    # -------------------------------
+    # Producer side
+    # -------------------------------
+    def notify(self, user_id: str) -> None:
+        """Inputs changed: drop any parked plan and (re)schedule a build after the debounce window."""
+        with self._cv:
+            if self._stopped:
+                return
+            self._ready.pop(user_id, None)
+            deadline = time.monotonic() + self.debounce_s
+            self._due[user_id] = deadline
+            self._seq += 1
+            heapq.heappush(self._heap, (deadline, self._seq, user_id))
+            self._stats["scheduled"] += 1
+            self._start()
+            self._cv.notify()
+
+    def take(self, user_id: str, days: int) -> Optional[Any]:
+        """Return the precomputed plan if it was built from the current inputs, else None."""
+        with self._cv:
+            self._days[user_id] = days
+            entry = self._ready.pop(user_id, None)
+        if entry is None:
+            self._count("misses")
+            return None
+        fp, built_days, result = entry
+        if built_days != days or fp != self._fingerprint(user_id, days):
+            self._count("stale")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cv:
+            s = dict(self._stats)
+            s["queue_depth"] = len(self._due)
+            s["in_flight"] = self._in_flight
+            s["ready"] = len(self._ready)
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = round(s["hits"] / lookups, 3) if lookups else 0.0
+        total_ms, builds = s.pop("build_ms_total"), s["built"] + s["discarded"]
+        s["avg_build_ms"] = round(total_ms / builds, 1) if builds else 0.0
+        return s
+
+    def stop(self) -> None:
+        with self._cv:
+            self._stopped = True
+            self._cv.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+
+    # -------------------------------
+    # Worker side
+    # -------------------------------
+    def _count(self, key: str) -> None:
+        with self._cv:
+            self._stats[key] += 1
+
+    def _start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"plan-precompute-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _next(self) -> Optional[str]:
+        """Block until a user's debounce deadline passes; skip heap entries superseded by a later notify."""
+        with self._cv:
+            while not self._stopped:
+                if not self._heap:
+                    self._cv.wait()
+                    continue
+                deadline, _, user_id = self._heap[0]
+                wait = deadline - time.monotonic()
+                if wait > 0:
+                    self._cv.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                if self._due.get(user_id) != deadline:
+                    continue
+                del self._due[user_id]
+                self._in_flight += 1
+                return user_id
+        return None
+
+    def _run(self) -> None:
+        while True:
+            user_id = self._next()
+            if user_id is None:
+                return
+            days = self._days.get(user_id, self.default_days)
+            try:
+                fp = self._fingerprint(user_id, days)
+                start = time.perf_counter()
+                result = self._build(user_id, days)
+                elapsed = (time.perf_counter() - start) * 1000
+                with self._cv:
+                    self._stats["build_ms_total"] += elapsed
+                    # Inputs changed while building: a newer notify is already queued.
+                    if user_id in self._due or fp != self._fingerprint(user_id, days):
+                        self._stats["discarded"] += 1
+                    else:
+                        self._ready[user_id] = (fp, days, result)
+                        self._stats["built"] += 1
+            except Exception:
+                self._count("errors")
+            finally:
+                with self._cv:
+                    self._in_flight -= 1
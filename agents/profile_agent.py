@@ -1,8 +1,142 @@
 # agents/profile_agent.py
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+import re
+import threading
+from enum import IntEnum, IntFlag
+from pydantic import BaseModel, Field, field_validator
+from typing import List, NamedTuple, Optional, Dict, Any, Tuple
 from .base_agent import STATE, log_event
 
+
+class Goal(IntEnum):
+    FAT_LOSS = 0
+    MUSCLE_GAIN = 1
+    ENDURANCE = 2
+    GENERAL_FITNESS = 3
+
+    @property
+    def label(self) -> str:
+        return self.name.replace("_", " ").title()
+
+
+class Level(IntEnum):
+    BEGINNER = 0
+    INTERMEDIATE = 1
+    ADVANCED = 2
+
+    @property
+    def label(self) -> str:
+        return self.name.title()
+
+
+class Flag(IntFlag):
+    """Constraints and dietary rules, parsed once from the free-text lists."""
+    NONE = 0
+    LOW_IMPACT = 1 << 0       # injury / knee: no jumping
+    VEGAN = 1 << 1
+    VEGETARIAN = 1 << 2
+    PESCATARIAN = 1 << 3
+    NO_DAIRY = 1 << 4
+    NO_GLUTEN = 1 << 5
+    NO_NUTS = 1 << 6
+    NO_EGG = 1 << 7
+    NO_FISH = 1 << 8
+    NO_SOY = 1 << 9
+
+
+LOW_IMPACT_WORDS = ("injury", "injuries", "injured", "knee")
+DIET_WORDS = {Flag.VEGAN: "vegan", Flag.VEGETARIAN: "vegetarian", Flag.PESCATARIAN: "pescatarian"}
+# Words that rule a food group out ("lactose intolerant", "no fish")
+AVOID_WORDS = {
+    Flag.NO_DAIRY: ("dairy", "lactose", "milk", "cheese"),
+    Flag.NO_GLUTEN: ("gluten", "wheat", "celiac", "coeliac"),
+    Flag.NO_NUTS: ("nut", "peanut", "almond"),
+    Flag.NO_EGG: ("egg",),
+    Flag.NO_FISH: ("fish", "seafood", "shellfish"),
+    Flag.NO_SOY: ("soy", "tofu"),
+}
+NEGATIONS = ("no", "free", "avoid", "avoiding", "without", "don't", "dont", "never",
+             "allergy", "allergies", "allergic", "intolerant", "intolerance")
+
+
+def _word_pattern(words: Tuple[str, ...]) -> "re.Pattern[str]":
+    """Whole words (plus a plural s/es), so "minutes" is not "nut" and "veggies" is not "egg"."""
+    return re.compile(r"\b(?:" + "|".join(map(re.escape, words)) + r")(?:s|es)?\b")
+
+
+_LOW_IMPACT_RE = _word_pattern(LOW_IMPACT_WORDS)
+_DIET_RE = {flag: _word_pattern((word,)) for flag, word in DIET_WORDS.items()}
+_AVOID_RE = {flag: _word_pattern(words) for flag, words in AVOID_WORDS.items()}
+_NEGATION_RE = _word_pattern(NEGATIONS)
+
+
+def _key(text: Any) -> str:
+    return "_".join(str(text or "").replace("-", " ").split()).upper()
+
+
+def parse_goal(text: Any) -> Goal:
+    """"Fat Loss", "fat_loss" and "fat-loss" are all Goal.FAT_LOSS; anything else is a ValueError."""
+    try:
+        return Goal[_key(text)]
+    except KeyError:
+        raise ValueError(f"unknown goal '{text}'; expected one of {[g.label for g in Goal]}") from None
+
+
+def parse_level(text: Any) -> Level:
+    try:
+        return Level[_key(text)]
+    except KeyError:
+        raise ValueError(f"unknown level '{text}'; expected one of {[l.label for l in Level]}") from None
+
+
+class CanonicalProfile(NamedTuple):
+    """Enum-coded profile the agents read on hot paths; strings are parsed once, at upsert."""
+    goal: Goal
+    level: Level
+    age: int
+    flags: Flag
+    likes: Tuple[str, ...]    # preference words that name no rule, for meal scoring
+
+    @property
+    def template_key(self) -> Tuple[int, int, bool]:
+        """Everything the workout template depends on."""
+        return self.goal, self.level, bool(self.flags & Flag.LOW_IMPACT)
+
+
+def canonicalize(profile: Dict[str, Any]) -> CanonicalProfile:
+    """
+    Canonical form of a stored profile. Profiles stored before goal/level were
+    validated fall back to General Fitness / Beginner instead of failing.
+    Constraints always apply; a preference excludes a food group only when
+    phrased negatively ("no fish"), and otherwise counts as a liked word.
+    """
+    try:
+        goal = parse_goal(profile.get("goal"))
+    except ValueError:
+        goal = Goal.GENERAL_FITNESS
+    try:
+        level = parse_level(profile.get("level"))
+    except ValueError:
+        level = Level.BEGINNER
+    flags, likes = Flag.NONE, []
+    texts = [(str(c).lower(), True) for c in profile.get("constraints") or []]
+    texts += [(str(p).lower(), False) for p in profile.get("preferences") or []]
+    for text, hard in texts:
+        found = Flag.NONE
+        if hard and _LOW_IMPACT_RE.search(text):
+            found |= Flag.LOW_IMPACT
+        for flag, pattern in _DIET_RE.items():
+            if pattern.search(text):
+                found |= flag
+        negated = hard or bool(_NEGATION_RE.search(text))
+        for flag, pattern in _AVOID_RE.items():
+            if negated and pattern.search(text):
+                found |= flag
+        if not found and not hard:
+            likes.extend(w for w in text.split() if len(w) > 3)
+        flags |= found
+    return CanonicalProfile(goal, level, int(profile.get("age") or 30), flags, tuple(likes))
+
+
 class UserProfile(BaseModel):
     name: str
     age: int = Field(ge=12, le=100)
@@ -11,11 +145,52 @@ class UserProfile(BaseModel):
     preferences: Optional[List[str]] = []
     constraints: Optional[List[str]] = []
 
+    @field_validator("goal")
+    @classmethod
+    def _goal(cls, v: str) -> str:
+        return parse_goal(v).label
+
+    @field_validator("level")
+    @classmethod
+    def _level(cls, v: str) -> str:
+        return parse_level(v).label
+
+
+# user_id -> (stored profile dict, its canonical form); the dict's identity says whether
+# the entry is current, so profiles restored or migrated into STATE are re-derived on first use.
+_CANONICAL: Dict[str, Tuple[Dict[str, Any], CanonicalProfile]] = {}
+_CANONICAL_LOCK = threading.Lock()
+
+
+def canonical_profile(user_id: str) -> Optional[CanonicalProfile]:
+    profile = STATE.get(user_id, "profile")
+    if not profile:
+        return None
+    cached = _CANONICAL.get(user_id)
+    if cached is not None and cached[0] is profile:
+        return cached[1]
+    canon = canonicalize(profile)
+    with _CANONICAL_LOCK:
+        _CANONICAL[user_id] = (profile, canon)
+    return canon
+
+
 class ProfileAgent:
     def upsert(self, user_id: str, profile: UserProfile) -> Dict[str, Any]:
-        STATE.set(user_id, "profile", profile.dict())
+        stored = profile.dict()
+        STATE.set(user_id, "profile", stored)
+        with _CANONICAL_LOCK:
+            _CANONICAL[user_id] = (stored, canonicalize(stored))
         log_event(user_id, "ProfileAgent", "upsert_profile", payload=profile.dict())
         return profile.dict()
 
     def get(self, user_id: str) -> Optional[Dict[str, Any]]:
         return STATE.get(user_id, "profile")
+
+    def canonical(self, user_id: str) -> Optional[CanonicalProfile]:
+        return canonical_profile(user_id)
+
+    def forget(self, user_id: str) -> None:
+        """Drop the cached canonical form of a user who left this process."""
+        with _CANONICAL_LOCK:
+            _CANONICAL.pop(user_id, None)
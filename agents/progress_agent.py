@@ -1,4 +1,5 @@
 # agents/progress_agent.py
+from datetime import date
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 from .base_agent import STATE, log_event
@@ -12,17 +13,21 @@ class ProgressLog(BaseModel):
 
 
 class ProgressAgent:
-    def log(self, user_id: str, entry: ProgressLog) -> None:
+    def log(self, user_id: str, entry: ProgressLog) -> Dict[str, Any]:
         """
-        Log a new progress entry for a user.
+        Log a new progress entry for a user and return it as stored. Entries without
+        a date are stamped with today's, so day-based badges never have to guess.
         """
-        STATE.append(user_id, "progress", entry.model_dump())
-        log_event(user_id, "ProgressAgent", "log_progress", payload=entry.model_dump())
+        stored = entry.model_dump()
+        stored["date"] = stored["date"] or date.today().isoformat()
+        STATE.append(user_id, "progress", stored)
+        log_event(user_id, "ProgressAgent", "log_progress", payload=stored)
+        return stored
 
     def summarize(self, user_id: str) -> Dict[str, Any]:
         """
         Summarize user progress metrics (weight, duration, kcal averages).
-        Returns safe defaults if no entries exist.
+        Returns safe defaults if no entries exist. Read-only: does not log.
         """
         entries: List[Dict[str, Any]] = STATE.get(user_id, "progress", []) or []
 
@@ -39,8 +44,6 @@ class ProgressAgent:
             "avg_workout_minutes": round(sum(durations) / len(durations), 1) if durations else None,
             "avg_kcals_burned": round(sum(kcals) / len(kcals), 1) if kcals else None,
         }
-
-        log_event(user_id, "ProgressAgent", "summarize", payload=summary)
         return summary
     
 
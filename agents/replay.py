@@ -0,0 +1,235 @@
+# agents/replay.py
+"""
+Record Orchestrator.handle_event traffic and replay it against a fresh orchestrator.
+
+    FITSYMPHONY_RECORD=traffic.rec uvicorn app:app        # record
+    python replay.py traffic.rec --speedup 10              # replay
+
+The replay runs every event in recorded order on one thread, against an
+Orchestrator without precompute whose LLM and nutrition-API calls are stubbed
+with deterministic answers, so it can serve as a regression benchmark for
+storage and caching changes. What comes from the wall clock is not replayed:
+log entry ids and timestamps, badge and plan-version times, and the date
+stamped on undated entries (with the day-based badges and weekly boards that
+follow from it). `normalized_state` leaves out the first three, so the same
+recording replayed on the same day yields the same normalized state. Events
+the app served from its response cache (304s, cache hits) never reach the
+orchestrator and are not recorded.
+"""
+import json
+import marshal
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from .base_agent import STATE, log_event
+from .wal import _FRAME, read_segment
+
+MARSHAL_VERSION = 4
+
+# (wall-clock start, event, user_id, payload, duration_ms, ok)
+Record = Tuple[float, str, str, Dict[str, Any], float, bool]
+
+
+class EventRecorder:
+    """
+    Appends one framed record per handle_event call (same length + crc32 framing
+    as the WAL, so a torn tail from a crash is detected and dropped on read).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "ab")
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def record(self, started: float, event: str, user_id: str, payload: Dict[str, Any],
+               duration_ms: float, ok: bool) -> None:
+        rec = (started, event, user_id, payload, round(duration_ms, 3), ok)
+        try:
+            data = marshal.dumps(rec, MARSHAL_VERSION)
+        except ValueError:
+            data = marshal.dumps(json.loads(json.dumps(rec, default=str)), MARSHAL_VERSION)
+        frame = _FRAME.pack(len(data), zlib.crc32(data)) + data
+        with self._lock:
+            if self._file is not None:
+                self._file.write(frame)
+                self.records += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_recording(path: str) -> Iterator[Record]:
+    records, _ = read_segment(path)
+    for rec in records:
+        yield tuple(rec)
+
+
+# -------------------------------
+# Deterministic backends
+# -------------------------------
+class _StubChain:
+    """Stands in for the ask chain: AskAgent still builds and serializes its context."""
+
+    def invoke(self, inputs: Dict[str, Any]) -> str:
+        return f"(replay) {len(inputs.get('context', ''))} bytes of context for: {inputs.get('question', '')[:80]}"
+
+
+def _stub_feedback(user_id: str, text: str) -> Dict[str, Any]:
+    lowered = text.lower()
+    delta = -1 if any(w in lowered for w in ("hard", "intense", "tired", "sore")) else \
+        1 if any(w in lowered for w in ("easy", "more", "bored")) else 0
+    data = {"workout": {"delta_sets": delta}, "nutrition": {}, "reason": "replay stub"}
+    log_event(user_id, "FeedbackAgent", "llm_feedback_parse", payload=data)
+    return data
+
+
+def stub_backends(orc) -> None:
+    """Swap LLM and remote nutrition calls for deterministic, network-free stand-ins."""
+    from .dynamic_rule_generator import DEFAULT_RULES
+
+    def rules(user_id: str, profile: Dict[str, Any], feedback_summary: str) -> Dict[str, Any]:
+        log_event(user_id, "DynamicRuleGenerator", "rule_generation", payload={"rules": DEFAULT_RULES})
+        return {"rules": DEFAULT_RULES}
+
+    orc.rules.generate = rules
+    orc.feedback.interpret = _stub_feedback
+    orc.ask.chain = _StubChain()
+    orc.nutrition._fetch_remote = lambda query: []
+
+
+# -------------------------------
+# Replay
+# -------------------------------
+# state key -> fields of its entries taken from the clock or a random id
+VOLATILE = {"logs": ("id", "ts"), "badges": ("earned_at",), "plan_versions": ("ts",)}
+
+
+def normalized_state(user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """The users' state without VOLATILE fields, for comparing a replay with the recorded run."""
+    out = {}
+    for uid in user_ids:
+        state = dict(STATE.export_user(uid))
+        for key, fields in VOLATILE.items():
+            if key in state:
+                state[key] = [{k: v for k, v in e.items() if k not in fields} for e in state[key]]
+        out[uid] = state
+    return out
+
+
+def _pct(values: List[float], q: float) -> float:
+    return round(values[min(len(values) - 1, int(len(values) * q))], 3)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {"p50": _pct(values, 0.50), "p95": _pct(values, 0.95), "p99": _pct(values, 0.99),
+            "max": round(values[-1], 3)}
+
+
+def replay(path: str, speedup: float = 0.0, sample_every: int = 1000, limit: Optional[int] = None,
+           reset: bool = False) -> Dict[str, Any]:
+    """
+    Replay a recording and report per-event latency and state growth.
+
+    speedup   0 replays back to back; otherwise inter-arrival gaps are divided by it
+              (10 = ten times faster than recorded). Events run one at a time, so
+              when one takes longer than its gap the replay falls behind (see lag_ms).
+    sample_every  take a state-size sample every N events; only users touched since
+              the previous sample are re-encoded, so sampling stays cheap.
+    reset     drop any users already in STATE first; replay otherwise refuses to
+              mix recorded traffic into existing state.
+    """
+    from .orchestrator import Orchestrator
+    from .snapshot import encode_user
+
+    if STATE.user_ids():
+        if not reset:
+            raise RuntimeError("replay needs an empty STATE; run it in its own process or pass reset=True")
+        for uid in STATE.user_ids():
+            STATE.drop_user(uid)
+
+    orc = Orchestrator(precompute=False)
+    stub_backends(orc)
+
+    latencies: Dict[str, List[float]] = {}
+    recorded: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    mismatches = 0
+    sizes: Dict[str, int] = {}
+    touched: set = set()
+    growth: List[Dict[str, Any]] = []
+    lag_max = sampling = 0.0
+
+    def sample(events: int) -> None:
+        nonlocal sampling
+        t = time.perf_counter()
+        for uid in touched:
+            sizes[uid] = len(encode_user(STATE.export_user(uid)))
+        touched.clear()
+        growth.append({"events": events, "users": len(STATE.user_ids()), "state_bytes": sum(sizes.values())})
+        sampling += time.perf_counter() - t
+
+    first, start, n = None, time.perf_counter(), 0
+    for started, event, user_id, payload, duration_ms, ok in read_recording(path):
+        if limit is not None and n >= limit:
+            break
+        if first is None:
+            first = started
+        if speedup > 0:
+            due = start + (started - first) / speedup
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                lag_max = max(lag_max, -wait * 1000)
+
+        t0 = time.perf_counter()
+        try:
+            orc.handle_event(event, user_id, payload)
+            replay_ok = True
+        except Exception:
+            replay_ok = False
+            errors[event] = errors.get(event, 0) + 1
+        latencies.setdefault(event, []).append((time.perf_counter() - t0) * 1000)
+        recorded.setdefault(event, []).append(duration_ms)
+        mismatches += replay_ok != ok
+        if user_id:
+            touched.add(user_id)
+        n += 1
+        if sample_every and n % sample_every == 0:
+            sample(n)
+
+    elapsed = time.perf_counter() - start - sampling
+    if not growth or growth[-1]["events"] != n:
+        sample(n)
+    events = {
+        e: {"count": len(lat), "errors": errors.get(e, 0), "ms": _summary(lat), "recorded_ms": _summary(recorded[e])}
+        for e, lat in sorted(latencies.items())
+    }
+    return {
+        "events": n,
+        "seconds": round(elapsed, 3),
+        "events_per_s": round(n / elapsed, 1) if elapsed else None,
+        "speedup": speedup,
+        "lag_ms": round(lag_max, 3),
+        "outcome_mismatches": mismatches,
+        "per_event": events,
+        "state": growth,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['events']} events in {report['seconds']} s ({report['events_per_s']}/s), "
+          f"max lag {report['lag_ms']} ms, {report['outcome_mismatches']} outcome mismatches")
+    print(f"{'event':<20}{'count':>8}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'rec p50':>9}")
+    for e, s in report["per_event"].items():
+        print(f"{e:<20}{s['count']:>8}{s['errors']:>8}{s['ms']['p50']:>9}{s['ms']['p99']:>9}{s['ms']['max']:>9}"
+              f"{s['recorded_ms']['p50']:>9}")
+    print(f"{'events':>10}{'users':>8}{'state KB':>12}")
+    for g in report["state"]:
+        print(f"{g['events']:>10}{g['users']:>8}{g['state_bytes'] / 1024:>12.1f}")
@@ -0,0 +1,63 @@
+# agents/response_cache.py
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResponseCache:
+    """
+    Serialized read responses keyed on (route, user_id), valid for one state version.
+
+    Two levels sit in front of the read handlers:
+      1. the client's copy: a matching If-None-Match is answered with 304 from the
+         version counter alone, without touching this cache or the handler;
+      2. this in-process LRU of encoded bodies, so a client without the current
+         ETag still skips recomputation and JSON encoding.
+
+    ETags embed a per-process epoch because version counters restart with the process.
+    """
+
+    def __init__(self, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self._epoch = uuid.uuid4().hex[:8]
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"not_modified": 0, "hits": 0, "misses": 0}
+
+    def etag(self, route: str, user_id: str, version: int) -> str:
+        digest = hashlib.blake2b(f"{route}\0{user_id}".encode(), digest_size=8).hexdigest()
+        return f'"{self._epoch}-{digest}-{version}"'
+
+    def not_modified(self, if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        hit = etag in tags or "*" in tags
+        if hit:
+            with self._lock:
+                self._stats["not_modified"] += 1
+        return hit
+
+    def get(self, route: str, user_id: str, version: int) -> Optional[bytes]:
+        key = (route, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, route: str, user_id: str, version: int, body: bytes) -> None:
+        with self._lock:
+            self._entries[(route, user_id)] = (version, body)
+            self._entries.move_to_end((route, user_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
@@ -0,0 +1,406 @@
+# agents/rule_engine.py
+import ast
+import json
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from .base_agent import STATE, log_event
+from .scoring import adherence_score
+
+NAN = float("nan")
+
+# Fields a rule condition may reference, as "<namespace>.<field>" -> default.
+# Numeric defaults are NaN so comparisons on missing data never fire.
+FIELDS: Dict[str, Any] = {
+    "profile.age": NAN,
+    "profile.goal": "",
+    "profile.level": "",
+    "wearable.hr_rest": NAN,
+    "wearable.hr_avg": NAN,
+    "wearable.sleep_hours": NAN,
+    "wearable.steps": NAN,
+    "wearable.vo2max": NAN,
+    "progress.count": 0,
+    "progress.avg_weight": NAN,
+    "progress.avg_workout_minutes": NAN,
+    "progress.avg_kcals_burned": NAN,
+    "progress.adherence": NAN,
+}
+
+# action name -> number of arguments
+ACTIONS: Dict[str, int] = {
+    "delta_sets": 1,
+    "cap_sets": 1,
+    "floor_sets": 1,
+    "remove_exercise": 1,
+    "add_exercise": 1,
+    "add_note": 1,
+}
+
+_CMP_OPS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq, ast.In, ast.NotIn)
+_ARITH_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+MAX_OPERAND = 1e6  # larger arithmetic constants are never meaningful for these fields
+
+
+def _key(name: str) -> str:
+    return name.replace(".", "__")
+
+
+def _field_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        return f"{node.value.id}.{node.attr}"
+    return None
+
+
+def _is_test(n: ast.AST) -> bool:
+    """Comparisons, and/or/not of them, and True/False: the only operands of boolean logic."""
+    return isinstance(n, (ast.Compare, ast.BoolOp)) or \
+        (isinstance(n, ast.UnaryOp) and isinstance(n.op, ast.Not)) or \
+        (isinstance(n, ast.Constant) and isinstance(n.value, bool))
+
+
+def _validate(node: ast.AST) -> List[str]:
+    """Walk a condition AST, rejecting anything outside the DSL. Returns referenced fields."""
+    fields: List[str] = []
+
+    def test(n: ast.AST) -> None:
+        # `progress.count and ...` relies on truthiness, which numpy arrays do not have
+        if not _is_test(n):
+            raise ValueError("conditions and the operands of and/or/not must be comparisons")
+        visit(n)
+
+    def visit(n: ast.AST) -> None:
+        name = _field_name(n)
+        if name is not None:
+            if name not in FIELDS:
+                raise ValueError(f"unknown field '{name}'")
+            fields.append(name)
+        elif isinstance(n, ast.BoolOp):
+            for v in n.values:
+                test(v)
+        elif isinstance(n, ast.UnaryOp) and isinstance(n.op, ast.Not):
+            test(n.operand)
+        elif isinstance(n, ast.UnaryOp) and isinstance(n.op, ast.USub):
+            visit(n.operand)
+        elif isinstance(n, ast.BinOp) and isinstance(n.op, _ARITH_OPS):
+            for side in (n.left, n.right):
+                name = _field_name(side)
+                if (name is not None and isinstance(FIELDS.get(name), str)) or \
+                        (isinstance(side, ast.Constant) and isinstance(side.value, str)):
+                    raise ValueError("arithmetic on text is not allowed")
+                if isinstance(side, ast.Constant) and abs(side.value) > MAX_OPERAND:
+                    raise ValueError(f"arithmetic constant {side.value!r} is out of range")
+                visit(side)
+        elif isinstance(n, ast.Compare) and all(isinstance(op, _CMP_OPS) for op in n.ops):
+            visit(n.left)
+            for c in n.comparators:
+                visit(c)
+        elif isinstance(n, (ast.Tuple, ast.List)):
+            for e in n.elts:
+                if not isinstance(e, ast.Constant):
+                    raise ValueError("membership lists may only contain literals")
+        elif isinstance(n, ast.Constant) and isinstance(n.value, (int, float, str, bool)):
+            pass
+        else:
+            raise ValueError(f"unsupported expression: {ast.dump(n)[:60]}")
+
+    test(node)
+    return fields
+
+
+class _ScalarRewrite(ast.NodeTransformer):
+    """profile.age -> S["profile__age"]; text constants are lowercased like the text fields in signals()."""
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        if isinstance(node.value, str):
+            return ast.Constant(node.value.lower())
+        return node
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        return ast.Subscript(
+            value=ast.Name(id="S", ctx=ast.Load()),
+            slice=ast.Constant(_key(_field_name(node))),
+            ctx=ast.Load(),
+        )
+
+
+# Error-row masks, where None stands for "no row can fail"
+def _or(left: Optional[ast.AST], right: Optional[ast.AST]) -> Optional[ast.AST]:
+    if left is None or right is None:
+        return right if left is None else left
+    return ast.BinOp(left=left, op=ast.BitOr(), right=right)
+
+
+def _and(left: ast.AST, right: Optional[ast.AST]) -> Optional[ast.AST]:
+    return None if right is None else ast.BinOp(left=left, op=ast.BitAnd(), right=right)
+
+
+def _invert(node: ast.AST) -> ast.AST:
+    return ast.UnaryOp(op=ast.Invert(), operand=node)
+
+
+class _VectorRewrite:
+    """
+    The scalar form with boolean logic mapped to elementwise numpy ops. Each node
+    compiles to (value, error rows): rows where the scalar form would divide by
+    zero, counting a division only where and/or/chained comparisons would reach
+    it. Those rows are masked out, as evaluate() skips a rule that raises there.
+    """
+
+    def __init__(self):
+        self._leaf = _ScalarRewrite()
+
+    def visit(self, node: ast.AST) -> ast.AST:
+        value, errors = self._compile(node)
+        return value if errors is None else _and(value, _invert(errors))
+
+    def _compile(self, node: ast.AST) -> Tuple[ast.AST, Optional[ast.AST]]:
+        if isinstance(node, ast.BoolOp):
+            value, errors = self._compile(node.values[0])
+            for v in node.values[1:]:
+                right, right_errors = self._compile(v)
+                if isinstance(node.op, ast.And):
+                    errors = _or(errors, _and(value, right_errors))
+                    value = ast.BinOp(left=value, op=ast.BitAnd(), right=right)
+                else:
+                    errors = _or(errors, _and(_invert(value), right_errors))
+                    value = ast.BinOp(left=value, op=ast.BitOr(), right=right)
+            return value, errors
+        if isinstance(node, ast.UnaryOp):
+            operand, errors = self._compile(node.operand)
+            return ast.UnaryOp(op=ast.Invert() if isinstance(node.op, ast.Not) else node.op, operand=operand), errors
+        if isinstance(node, ast.BinOp):
+            left, errors = self._compile(node.left)
+            right, right_errors = self._compile(node.right)
+            errors = _or(errors, right_errors)
+            if isinstance(node.op, ast.Div):
+                zero = ast.Compare(left=right, ops=[ast.Eq()], comparators=[ast.Constant(0)])
+                errors = _or(errors, zero)
+            return ast.BinOp(left=left, op=node.op, right=right), errors
+        if isinstance(node, ast.Compare):
+            left, errors = self._compile(node.left)
+            value = None
+            for op, comparator in zip(node.ops, node.comparators):
+                right, right_errors = self._compile(comparator)
+                # a chained comparison stops at the first False, like `and`
+                errors = _or(errors, right_errors if value is None else _and(value, right_errors))
+                if isinstance(op, (ast.In, ast.NotIn)):
+                    part: ast.AST = ast.Call(
+                        func=ast.Name(id="_isin", ctx=ast.Load()), args=[left, right], keywords=[]
+                    )
+                    if isinstance(op, ast.NotIn):
+                        part = _invert(part)
+                else:
+                    part = ast.Compare(left=left, ops=[op], comparators=[right])
+                value = part if value is None else ast.BinOp(left=value, op=ast.BitAnd(), right=part)
+                left = right
+            return value, errors
+        return self._leaf.visit(node), None  # field, constant or literal list
+
+
+def _to_lambda(expr: ast.AST) -> Callable:
+    fn = ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=[ast.arg(arg="S")], kwonlyargs=[], kw_defaults=[], defaults=[]),
+        body=expr,
+    )
+    tree = ast.fix_missing_locations(ast.Expression(body=fn))
+    return eval(compile(tree, "<rule>", "eval"), {"__builtins__": {}, "_isin": np.isin})
+
+
+class Condition:
+    """A compiled condition with a scalar (dict row) and a vectorized (column dict) form."""
+
+    __slots__ = ("source", "fields", "scalar", "vector")
+
+    def __init__(self, source: str):
+        parse = lambda: ast.parse(source.strip(), mode="eval").body  # transformers mutate the tree
+        self.source = source
+        self.fields = tuple(dict.fromkeys(_validate(parse())))
+        self.scalar = _to_lambda(_ScalarRewrite().visit(parse()))
+        self.vector = _to_lambda(_VectorRewrite().visit(parse()))
+
+
+@lru_cache(maxsize=4096)
+def compile_condition(source: str) -> Condition:
+    """Compiled conditions are shared across users with identical rule text."""
+    return Condition(source)
+
+
+@lru_cache(maxsize=4096)
+def compile_action(source: str) -> Tuple[Tuple[str, Any], ...]:
+    """Parse `delta_sets(-1); add_note("hydrate")` into ((name, arg), ...)."""
+    steps = []
+    for part in source.split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        call = ast.parse(part, mode="eval").body
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id in ACTIONS):
+            raise ValueError(f"unsupported action: {part}")
+        if len(call.args) != ACTIONS[call.func.id] or call.keywords:
+            raise ValueError(f"wrong arguments for {call.func.id}")
+        steps.append((call.func.id, ast.literal_eval(call.args[0])))
+    if not steps:
+        raise ValueError("empty action")
+    return tuple(steps)
+
+
+def parse_rules(text: Any) -> Tuple[List[Tuple[Condition, Tuple]], List[str]]:
+    """
+    Parse LLM output (a JSON list of {"condition","action"}, possibly wrapped in prose)
+    into compiled rules. Invalid rules are skipped and reported.
+    """
+    if isinstance(text, str):
+        match = re.search(r"\[.*\]", text, re.DOTALL)
+        try:
+            items = json.loads(match.group(0)) if match else []
+        except ValueError:
+            return [], ["rules are not valid JSON"]
+    else:
+        items = text or []
+
+    compiled, errors = [], []
+    for item in items:
+        if not isinstance(item, dict):
+            errors.append(f"not a rule object: {item!r}"[:120])
+            continue
+        try:
+            compiled.append((
+                compile_condition(str(item.get("condition", ""))),
+                compile_action(str(item.get("action", ""))),
+            ))
+        except (SyntaxError, ValueError) as e:
+            errors.append(f"{item.get('condition')!r}: {e}"[:120])
+    return compiled, errors
+
+
+def apply_actions(workout: List[Dict[str, Any]], steps: Iterable[Tuple[str, Any]]) -> List[Dict[str, Any]]:
+    """Apply action steps to a workout plan, returning new day dicts (plans are copy-on-write)."""
+    for name, arg in steps:
+        if name == "delta_sets":
+            workout = [{**d, "sets": max(1, min(5, d.get("sets", 2) + int(arg)))} for d in workout]
+        elif name == "cap_sets":
+            workout = [{**d, "sets": min(d.get("sets", 2), int(arg))} for d in workout]
+        elif name == "floor_sets":
+            workout = [{**d, "sets": max(d.get("sets", 2), int(arg))} for d in workout]
+        elif name == "remove_exercise":
+            workout = [{**d, "exercises": [x for x in d.get("exercises", []) if x != arg]} for d in workout]
+        elif name == "add_exercise":
+            workout = [
+                d if arg in d.get("exercises", []) else {**d, "exercises": d.get("exercises", []) + [arg]}
+                for d in workout
+            ]
+        elif name == "add_note":
+            workout = [{**d, "notes": (d.get("notes", "") + " " + str(arg)).strip()} for d in workout]
+    return workout
+
+
+class RuleEngine:
+    """
+    Compiles per-user rules from DynamicRuleGenerator output and evaluates them
+    against the signals behind a plan (profile, latest wearable, progress summary).
+    """
+
+    def __init__(self):
+        self._cache: Dict[str, Tuple[int, List[Tuple[Condition, Tuple]]]] = {}
+
+    def load(self, user_id: str, rules_text: Any) -> List[Tuple[Condition, Tuple]]:
+        key = hash(rules_text if isinstance(rules_text, str) else json.dumps(rules_text, sort_keys=True))
+        cached = self._cache.get(user_id)
+        if cached and cached[0] == key:
+            return cached[1]
+        compiled, errors = parse_rules(rules_text)
+        self._cache[user_id] = (key, compiled)
+        log_event(user_id, "RuleEngine", "compile_rules", payload={"compiled": len(compiled), "errors": errors})
+        return compiled
+
+    def rules(self, user_id: str) -> List[Tuple[Condition, Tuple]]:
+        cached = self._cache.get(user_id)
+        return cached[1] if cached else []
+
+    def users(self) -> List[str]:
+        """Users whose rules are compiled in this process."""
+        return list(self._cache)
+
+    @staticmethod
+    def signals(profile: Dict[str, Any], wearable: Dict[str, Any], progress: Dict[str, Any],
+                adherence: Optional[float] = None) -> Dict[str, Any]:
+        """Flatten the inputs into the S[...] row a compiled condition reads."""
+        row = {_key(k): v for k, v in FIELDS.items()}
+        sources = {"profile": profile or {}, "wearable": wearable or {}, "progress": progress or {}}
+        for name in FIELDS:
+            ns, field = name.split(".", 1)
+            value = sources[ns].get(field)
+            if value is not None:
+                row[_key(name)] = value.lower() if isinstance(value, str) else value
+        if adherence is not None:
+            row["progress__adherence"] = adherence
+        return row
+
+    def evaluate(self, user_id: str, row: Dict[str, Any]) -> List[Tuple[Condition, Tuple]]:
+        fired = []
+        for cond, steps in self.rules(user_id):
+            try:
+                if cond.scalar(row):
+                    fired.append((cond, steps))
+            except (TypeError, ArithmeticError):
+                continue  # e.g. comparing a string field to a number, or dividing by progress.count == 0
+        return fired
+
+    def apply(self, user_id: str, workout: List[Dict[str, Any]], row: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        fired = self.evaluate(user_id, row)
+        for _, steps in fired:
+            workout = apply_actions(workout, steps)
+        return workout, [cond.source for cond, _ in fired]
+
+    def evaluate_batch(self, user_ids: Sequence[str], columns: Dict[str, Sequence[Any]]) -> Dict[str, List[Tuple[Condition, Tuple]]]:
+        """
+        Evaluate every user's rules over columnar signals (one array per field, rows
+        aligned with `user_ids`). Users sharing a rule text share one compiled condition,
+        so each distinct condition runs once as a vectorized numpy expression over
+        the rows of the users that own it. Per user, the result equals evaluate().
+        """
+        cols = {}
+        n = len(user_ids)
+        for name, default in FIELDS.items():
+            values = columns.get(name)
+            if values is None:
+                cols[_key(name)] = np.full(n, default, dtype=object if isinstance(default, str) else float)
+            else:
+                cols[_key(name)] = np.asarray(values, dtype=object if isinstance(default, str) else float)
+
+        owners: Dict[int, Tuple[Condition, List[Tuple[int, int, Tuple]]]] = {}
+        for i, uid in enumerate(user_ids):
+            for j, (cond, steps) in enumerate(self.rules(uid)):
+                owners.setdefault(id(cond), (cond, []))[1].append((i, j, steps))
+
+        hits: Dict[str, List[Tuple[int, Condition, Tuple]]] = {uid: [] for uid in user_ids}
+        for cond, rows in owners.values():
+            idx = np.fromiter((i for i, _, _ in rows), dtype=np.intp, count=len(rows))
+            try:
+                with np.errstate(divide="ignore", invalid="ignore"):  # x/0 rows are masked out
+                    mask = np.broadcast_to(cond.vector({_key(f): cols[_key(f)][idx] for f in cond.fields}), idx.shape)
+            except (TypeError, ArithmeticError):
+                continue
+            for (i, j, steps), hit in zip(rows, mask):
+                if hit:
+                    hits[user_ids[i]].append((j, cond, steps))
+        # back into each user's rule order, as evaluate() returns them
+        return {uid: [(cond, steps) for _, cond, steps in sorted(h, key=lambda h: h[0])] for uid, h in hits.items()}
+
+    def collect_columns(self, user_ids: Sequence[str],
+                        summarize: Callable[[str], Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """Build batch columns from STATE, with the same signals generate_plan evaluates."""
+        columns: Dict[str, List[Any]] = {name: [] for name in FIELDS}
+        for uid in user_ids:
+            wearables = STATE.get(uid, "wearables", []) or []
+            row = self.signals(
+                STATE.get(uid, "profile") or {},
+                wearables[-1] if wearables else {},
+                summarize(uid),
+                adherence_score(uid, log=False),
+            )
+            for name in FIELDS:
+                columns[name].append(row[_key(name)])
+        return columns
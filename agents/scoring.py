@@ -2,13 +2,20 @@
 from typing import Dict, Any, List
 from .base_agent import STATE, log_event
 
-def adherence_score(user_id: str) -> float:
+def adherence_score(user_id: str, log: bool = True) -> float:
     """
     Compute user adherence score based on last 7 workout logs.
     Combines workout frequency and intensity consistency into a 0–100 score.
+    Pass log=False from read paths so the call has no side effects.
     """
-    entries: List[Dict[str, Any]] = STATE.get(user_id, "progress", []) or []
+    score = adherence_of(STATE.get(user_id, "progress", []) or [])
+    if log:
+        log_event(user_id, "Scoring", "adherence_score", payload={"score": score})
+    return score
+
 
+def adherence_of(entries: List[Dict[str, Any]]) -> float:
+    """adherence_score over a list of progress entries, for callers holding a user's state."""
     if not entries:
         return 0.0
 
@@ -23,9 +30,7 @@ def adherence_score(user_id: str) -> float:
     hit_ratio = sum(1 for m in mins if m >= target_min) / len(mins)
     freq = len(mins) / 7.0  # normalized frequency factor
 
-    score = round(50 * hit_ratio + 50 * min(freq, 1.0), 1)  # weighted 0–100
-    log_event(user_id, "Scoring", "adherence_score", payload={"score": score})
-    return score
+    return round(50 * hit_ratio + 50 * min(freq, 1.0), 1)  # weighted 0–100
 
 
 def auto_tune_sets(current_sets: int, score: float, fatigue_flag: bool) -> int:
@@ -0,0 +1,363 @@
+# agents/snapshot.py
+import gc
+import json
+import marshal
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .base_agent import STATE, MemoryStore
+
+MAGIC = b"FSNP"
+FORMAT_VERSION = 2
+READABLE_FORMATS = (1, 2)  # 1: records without a summary
+MARSHAL_VERSION = 4
+COLUMN_MIN_ROWS = 4  # shorter record lists are not worth a column block
+
+# A column block replaces a top-level list of same-shaped records (progress,
+# wearables, ...): (_COLS_TAG, keys, rows, [column, ...]).
+_COLS_TAG = b"\x00cols"
+# Column kinds
+_INT, _FLOAT, _ANY = 0, 1, 2
+
+_PRIMITIVES = (str, int, float, bool, bytes, type(None))
+_INT64 = (-(2 ** 63), 2 ** 63 - 1)
+
+
+def shard_of(user_id: str, shards: int) -> int:
+    return zlib.crc32(user_id.encode()) % shards
+
+
+class _Packer:
+    """
+    Prepares user state for marshal, which then builds every object on restore in C.
+
+      - dict keys are interned, so marshal writes each key once per user blob and
+        back-references it afterwards;
+      - objects referenced twice (plan days shared between plan versions) are copied
+        once, so marshal also writes them once and restore shares them again;
+      - top-level lists of same-shaped records become column blocks, with int and
+        float columns packed into int64/float64 arrays plus a null mask.
+    """
+
+    def __init__(self):
+        self._memo: Dict[int, Any] = {}
+
+    def pack_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        return {sys.intern(k): self._columns(v) or self._intern(v) for k, v in state.items()}
+
+    def _intern(self, obj: Any) -> Any:
+        t = type(obj)
+        if t in _PRIMITIVES:
+            return obj
+        copy = self._memo.get(id(obj))
+        if copy is not None:
+            return copy
+        if t is dict:
+            copy = {(sys.intern(k) if type(k) is str else k): self._intern(v) for k, v in obj.items()}
+        elif t is list:
+            copy = [self._intern(v) for v in obj]
+        elif t is tuple:
+            copy = tuple(self._intern(v) for v in obj)
+        else:
+            raise TypeError(f"cannot snapshot value of type {t.__name__}")
+        self._memo[id(obj)] = copy
+        return copy
+
+    def _columns(self, rows: Any) -> Optional[tuple]:
+        if type(rows) is not list or len(rows) < COLUMN_MIN_ROWS or type(rows[0]) is not dict:
+            return None
+        keys = tuple(rows[0])
+        if not all(type(k) is str for k in keys):
+            return None
+        if not all(type(r) is dict and len(r) == len(keys) and tuple(r) == keys for r in rows):
+            return None
+        cols = [self._column([r[k] for r in rows]) for k in keys]
+        if all(c[0] == _ANY for c in cols):
+            return None
+        return (_COLS_TAG, tuple(sys.intern(k) for k in keys), len(rows), cols)
+
+    def _column(self, values: List[Any]) -> tuple:
+        present = [v for v in values if v is not None]
+        nulls = bytes(v is None for v in values) if len(present) != len(values) else b""
+        if present and all(type(v) is int and _INT64[0] <= v <= _INT64[1] for v in present):
+            return (_INT, array("q", [0 if v is None else v for v in values]).tobytes(), nulls)
+        if present and all(type(v) is float for v in present):
+            return (_FLOAT, array("d", [0.0 if v is None else v for v in values]).tobytes(), nulls)
+        return (_ANY, [self._intern(v) for v in values])
+
+
+def _unpack_columns(block: tuple, byteswap: bool) -> List[Dict[str, Any]]:
+    _, keys, _, cols = block
+    columns = []
+    for col in cols:
+        if col[0] == _ANY:
+            columns.append(col[1])
+            continue
+        arr = array("q" if col[0] == _INT else "d")
+        arr.frombytes(col[1])
+        if byteswap:
+            arr.byteswap()
+        values = arr.tolist()
+        if col[2]:
+            values = [None if null else v for v, null in zip(values, col[2])]
+        columns.append(values)
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def _unpack_state(state: Dict[str, Any], byteswap: bool) -> Dict[str, Any]:
+    # Only top-level values can be column blocks, so restore never walks the tree.
+    for key, value in state.items():
+        if type(value) is tuple and value and value[0] == _COLS_TAG:
+            state[key] = _unpack_columns(value, byteswap)
+    return state
+
+
+# -------------------------------
+# File encoding
+# -------------------------------
+# header: magic, format version, flags (bit0 zlib, bit1 big-endian arrays), marshal version
+_HEADER = struct.Struct("<4sBBB")
+_FLAG_ZLIB, _FLAG_BIG_ENDIAN = 1, 2
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Bulk-creating millions of containers triggers repeated full cyclic-GC passes
+    over an ever larger heap; snapshot data is acyclic, so pause collection.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class LazyUser:
+    """
+    One user's encoded state; calling it decodes. Held by MemoryStore until first access.
+    `summary` is whatever the encoder's summarize() returned for the state: small data
+    (leaderboard scores) that is readable without decoding the user.
+    """
+
+    __slots__ = ("blob", "byteswap", "summary")
+
+    def __init__(self, blob: bytes, byteswap: bool, summary: Any = None):
+        self.blob = blob
+        self.byteswap = byteswap
+        self.summary = summary
+
+    def __call__(self) -> Dict[str, Any]:
+        return _unpack_state(marshal.loads(self.blob), self.byteswap)
+
+
+def encode_user(state: Dict[str, Any]) -> bytes:
+    return marshal.dumps(_Packer().pack_state(state), MARSHAL_VERSION)
+
+
+Summarize = Optional[Callable[[Dict[str, Any]], Any]]
+
+
+def _capture(state: Any, summarize: Summarize = None) -> Any:
+    """Freeze a live user's state as an encoded LazyUser; lazy users already are."""
+    if callable(state):
+        return state
+    return LazyUser(encode_user(state), False, summarize(state) if summarize else None)
+
+
+def encode_users(users: Iterable[Tuple[str, int, Any]], compress: bool = True, summarize: Summarize = None) -> bytes:
+    """
+    Encode (user_id, version, state) triples into one snapshot blob. Each user is
+    its own marshal blob, so restore can keep users encoded until first access;
+    a still-encoded LazyUser is written through without decoding it. A state of
+    None is a tombstone: the user was dropped. Each record also carries
+    summarize(state), or the summary a LazyUser was decoded with.
+    """
+    records = []
+    with _gc_paused():
+        for uid, version, state in users:
+            summary = None
+            if state is None:
+                blob = None
+            elif isinstance(state, LazyUser):
+                blob = state.blob if not state.byteswap else encode_user(state())
+                summary = state.summary
+            else:
+                blob = encode_user(state)
+                summary = summarize(state) if summarize else None
+            records.append((uid, version, blob, summary))
+        payload = marshal.dumps(records, MARSHAL_VERSION)
+    flags = _FLAG_BIG_ENDIAN if sys.byteorder == "big" else 0
+    if compress:
+        payload = zlib.compress(payload, 1)
+        flags |= _FLAG_ZLIB
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, flags, MARSHAL_VERSION) + payload
+
+
+def decode_users(blob: bytes, lazy: bool = False) -> List[Tuple[str, int, Any]]:
+    """Decode a snapshot blob; with lazy=True states are returned as LazyUser loaders. Tombstones decode to None."""
+    magic, fmt, flags, _ = _HEADER.unpack_from(blob)
+    if magic != MAGIC or fmt not in READABLE_FORMATS:
+        raise ValueError("not a FitSymphony snapshot (or unsupported format version)")
+    payload = memoryview(blob)[_HEADER.size:]
+    if flags & _FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    byteswap = bool(flags & _FLAG_BIG_ENDIAN) != (sys.byteorder == "big")
+    records = [(r[0], r[1], None if r[2] is None else LazyUser(r[2], byteswap, r[3] if len(r) > 3 else None))
+               for r in marshal.loads(payload)]
+    if lazy:
+        return records
+    with _gc_paused():
+        return [(uid, version, None if state is None else state()) for uid, version, state in records]
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Snapshotter:
+    """
+    Sharded full and incremental snapshots of a MemoryStore.
+
+    Layout of `directory`:
+        manifest.json           shard count and the generation chain to replay
+        g000000-s0003.fsnap     full snapshot of shard 3
+        g000001-s0003.fsnap     shard-3 users whose version changed since g000000,
+                                plus tombstones for shard-3 users dropped since then
+
+    Users are assigned to shards by crc32, so restore reads shards in parallel
+    and a process that owns a subset of users can load only its own shards.
+    By default restore is lazy: users stay encoded until first access, which
+    makes restart cost proportional to bytes read rather than objects built.
+    """
+
+    def __init__(self, directory: str, shards: int = 16, compress: bool = True,
+                 compact_after: int = 16, store: MemoryStore = STATE, summarize: Summarize = None):
+        self.directory = directory
+        self.shards = shards
+        self.compress = compress
+        self.compact_after = compact_after
+        self.store = store
+        self.summarize = summarize
+        self._seen: Dict[str, int] = {}  # user -> version captured by the last snapshot
+        os.makedirs(directory, exist_ok=True)
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def _shard_path(self, gen: int, shard: int) -> str:
+        return os.path.join(self.directory, f"g{gen:06d}-s{shard:04d}.fsnap")
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def snapshot(self, full: bool = False) -> Dict[str, Any]:
+        start = time.perf_counter()
+        manifest = self.manifest()
+        chain = manifest["generations"] if manifest and manifest.get("shards") == self.shards else []
+        full = full or not chain or not self._seen or len(chain) > self.compact_after
+        gen = chain[-1]["id"] + 1 if chain else 0
+
+        by_shard: Dict[int, List[Tuple[str, int, Optional[Dict[str, Any]]]]] = {}
+        captured: Dict[str, int] = {}
+        live = self.store.user_ids()
+        # A full snapshot simply omits dropped users; an incremental one must say so,
+        # or restore would resurrect them from an earlier generation.
+        dropped = [] if full else sorted(set(self._seen).difference(live))
+        for uid in dropped:
+            by_shard.setdefault(shard_of(uid, self.shards), []).append((uid, 0, None))
+        with _gc_paused():
+            for uid in live:
+                if not full and self._seen.get(uid) == self.store.version(uid):
+                    continue
+                # Pack under the store's write lock so the state matches its version exactly;
+                # WAL replay relies on that to skip the writes a snapshot already holds.
+                version, state = self.store.read_consistent(uid, lambda s: _capture(s, self.summarize))
+                captured[uid] = version
+                by_shard.setdefault(shard_of(uid, self.shards), []).append((uid, version, state))
+
+        size = 0
+        for shard, users in by_shard.items():
+            blob = encode_users(users, self.compress)
+            _write_atomic(self._shard_path(gen, shard), blob)
+            size += len(blob)
+
+        entry = {"id": gen, "kind": "full" if full else "incremental", "ts": int(time.time()),
+                 "users": len(captured), "dropped": len(dropped), "bytes": size, "shards": sorted(by_shard)}
+        stale = chain if full else []
+        chain = [entry] if full else chain + [entry]
+        _write_atomic(self._manifest_path(), json.dumps(
+            {"format": FORMAT_VERSION, "shards": self.shards, "generations": chain}, indent=2).encode())
+
+        # The manifest no longer references the previous chain; drop its files.
+        for old in stale:
+            for shard in old["shards"]:
+                try:
+                    os.remove(self._shard_path(old["id"], shard))
+                except FileNotFoundError:
+                    pass
+
+        if full:
+            self._seen = captured
+        else:
+            self._seen.update(captured)
+            for uid in dropped:
+                self._seen.pop(uid, None)
+        return {**entry, "seconds": round(time.perf_counter() - start, 3)}
+
+    def _load_shard(self, chain: List[Dict[str, Any]], shard: int, lazy: bool) -> Dict[str, Tuple[int, Any]]:
+        users: Dict[str, Tuple[int, Any]] = {}
+        for gen in chain:
+            if shard not in gen["shards"]:
+                continue
+            with open(self._shard_path(gen["id"], shard), "rb") as f:
+                for uid, version, state in decode_users(f.read(), lazy=True):
+                    if state is None:
+                        users.pop(uid, None)  # tombstone
+                    else:
+                        users[uid] = (version, state)  # later generations win
+        if not lazy:
+            with _gc_paused():
+                users = {uid: (version, state()) for uid, (version, state) in users.items()}
+        return users
+
+    def restore(self, shards: Optional[Iterable[int]] = None, workers: int = 4, lazy: bool = True) -> Dict[str, Any]:
+        start = time.perf_counter()
+        manifest = self.manifest()
+        if not manifest:
+            raise FileNotFoundError(f"no snapshot manifest in {self.directory}")
+        if manifest.get("format") not in READABLE_FORMATS:
+            raise ValueError(f"unsupported snapshot format {manifest.get('format')}")
+        self.shards = manifest["shards"]
+        chain = manifest["generations"]
+        selected = list(range(self.shards)) if shards is None else list(shards)
+
+        count = 0
+        with _gc_paused(), ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for users in pool.map(lambda s: self._load_shard(chain, s, lazy), selected):
+                for uid, (version, state) in users.items():
+                    if lazy:
+                        self.store.import_user_lazy(uid, state, version)
+                    else:
+                        self.store.import_user(uid, state, version)
+                    self._seen[uid] = self.store.version(uid)
+                count += len(users)
+        return {"users": count, "shards": len(selected), "generations": len(chain),
+                "seconds": round(time.perf_counter() - start, 3)}
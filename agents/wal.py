@@ -0,0 +1,374 @@
+# agents/wal.py
+import glob
+import json
+import marshal
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from .base_agent import STATE, MemoryStore
+from .snapshot import LazyUser, Snapshotter, Summarize
+
+MARSHAL_VERSION = 4
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Frame: payload length, crc32 of payload, marshal((op, user_id, key, value, version))
+_FRAME = struct.Struct("<II")
+
+
+def _segment_name(seq: int) -> str:
+    return f"wal-{seq:08d}.log"
+
+
+def _segments(directory: str) -> List[Tuple[int, str]]:
+    out = []
+    for path in glob.glob(os.path.join(directory, "wal-*.log")):
+        try:
+            out.append((int(os.path.basename(path)[4:12]), path))
+        except ValueError:
+            continue
+    return sorted(out)
+
+
+def _encode(op: str, user_id: str, key: Optional[str], value: Any, version: int) -> bytes:
+    if op == "import_lazy":
+        if isinstance(value, LazyUser):
+            value = (value.blob, value.byteswap, value.summary)
+        else:
+            op, value = "import", value()
+    try:
+        payload = marshal.dumps((op, user_id, key, value, version), MARSHAL_VERSION)
+    except ValueError:
+        # not marshal-safe (e.g. a datetime in a payload): store what the JSON API would return
+        value = json.loads(json.dumps(value, default=str))
+        payload = marshal.dumps((op, user_id, key, value, version), MARSHAL_VERSION)
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path: str) -> Tuple[List[tuple], bool]:
+    """Records of one segment, and whether it ended cleanly (False: torn or corrupt tail)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    records, pos = [], 0
+    while pos < len(data):
+        if pos + _FRAME.size > len(data):
+            return records, False
+        size, crc = _FRAME.unpack_from(data, pos)
+        payload = data[pos + _FRAME.size:pos + _FRAME.size + size]
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            return records, False
+        records.append(marshal.loads(payload))
+        pos += _FRAME.size + size
+    return records, True
+
+
+class WriteBehindLog:
+    """
+    Write-behind persistence for a MemoryStore: snapshot + write-ahead log.
+
+    Attached as the store's journal, every write is encoded into a WAL frame and
+    queued, and the caller returns at memory speed. A background thread drains
+    the queue in group commits (one write, and one fsync under the "always"
+    policy, per batch). The queue is bounded: when it is full, writers block until
+    the flusher catches up instead of growing memory without limit.
+
+    fsync policies:
+      always    fsync every group commit (a crash loses only the queued tail)
+      interval  fsync at most every `fsync_interval_s` (default); the flusher wakes
+                up to fsync the last writes even when no more traffic arrives
+      never     leave it to the OS page cache
+
+    A group that fails to write is retried `max_retries` times, `retry_wait_s`
+    apart. After that the flusher stops: flush() returns False, later writes are
+    only counted as dropped, and stats() reports "failed". A checkpoint still
+    snapshots the store, which persists everything the WAL could not.
+
+    Recovery restores the latest snapshot and replays the WAL over it. Records
+    carry the user's version, so those a snapshot already contains are skipped.
+    `checkpoint` snapshots and drops the WAL segments the snapshot covers.
+    """
+
+    def __init__(self, directory: str, store: MemoryStore = STATE, fsync: str = "interval",
+                 fsync_interval_s: float = 1.0, max_pending: int = 10_000, group_max: int = 512,
+                 group_wait_s: float = 0.002, snapshot_shards: int = 16, checkpoint_interval_s: Optional[float] = None,
+                 summarize: Summarize = None, max_retries: int = 10, retry_wait_s: float = 0.5):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.store = store
+        self.fsync = fsync
+        self.fsync_interval_s = fsync_interval_s
+        self.max_pending = max_pending
+        self.group_max = group_max
+        self.group_wait_s = group_wait_s
+        self.checkpoint_interval_s = checkpoint_interval_s
+        self.max_retries = max_retries
+        self.retry_wait_s = retry_wait_s
+        self.snapshots = Snapshotter(os.path.join(directory, "snapshots"), shards=snapshot_shards, store=store,
+                                     summarize=summarize)
+        self.wal_dir = os.path.join(directory, "wal")
+        os.makedirs(self.wal_dir, exist_ok=True)
+
+        self._cv = threading.Condition()
+        self._pending: Deque[Tuple[int, float, bytes]] = deque()
+        self._seq = 0          # last enqueued record
+        self._written = 0      # last record handed to the OS
+        self._file_lock = threading.Lock()
+        self._file = None
+        self._segment = 0
+        self._last_fsync = time.monotonic()
+        self._dirty = False    # written but not yet fsynced
+        self._failed: Optional[BaseException] = None
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self._stop = threading.Event()
+        self._latencies: Deque[float] = deque(maxlen=4096)
+        self._stats = {"records": 0, "groups": 0, "bytes": 0, "fsyncs": 0, "blocked": 0,
+                       "max_pending_seen": 0, "checkpoints": 0, "errors": 0, "dropped": 0}
+
+    # -------------------------------
+    # Lifecycle
+    # -------------------------------
+    def open(self) -> Dict[str, Any]:
+        """Recover the store from disk, then start journaling its writes."""
+        recovered = self.recover()
+        self._open_segment(max([s for s, _ in _segments(self.wal_dir)], default=0) + 1)
+        self.store.attach_journal(self.record)
+        workers = [(self._run, "wal-flush")]
+        if self.checkpoint_interval_s:
+            workers.append((self._run_checkpoints, "wal-checkpoint"))
+        for target, name in workers:
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return recovered
+
+    def close(self, checkpoint: bool = True) -> None:
+        self.store.attach_journal(None)
+        self.flush()
+        if checkpoint:
+            self.checkpoint()
+        self._stop.set()
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+        with self._file_lock:
+            if self._file:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def recover(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        restored = 0
+        if self.snapshots.manifest():
+            restored = self.snapshots.restore()["users"]
+        applied = skipped = 0
+        clean = True
+        for _, path in _segments(self.wal_dir):
+            records, ok = read_segment(path)
+            for op, uid, key, value, version in records:
+                if op == "import_lazy":
+                    value = LazyUser(*value)
+                if self.store.apply_journal(op, uid, key, value, version):
+                    applied += 1
+                else:
+                    skipped += 1
+            clean = clean and ok
+        return {"snapshot_users": restored, "applied": applied, "skipped": skipped,
+                "clean_tail": clean, "seconds": round(time.perf_counter() - start, 3)}
+
+    # -------------------------------
+    # Producer side (journal hook)
+    # -------------------------------
+    def record(self, op: str, user_id: str, key: Optional[str], value: Any, version: int) -> int:
+        frame = _encode(op, user_id, key, value, version)
+        with self._cv:
+            if self._failed is not None:
+                self._stats["dropped"] += 1  # only the next checkpoint persists this write
+                return self._seq
+            if len(self._pending) >= self.max_pending and not self._closed:
+                self._stats["blocked"] += 1
+                while len(self._pending) >= self.max_pending and not self._closed and self._failed is None:
+                    self._cv.wait()
+            self._seq += 1
+            self._pending.append((self._seq, time.perf_counter(), frame))
+            if len(self._pending) > self._stats["max_pending_seen"]:
+                self._stats["max_pending_seen"] = len(self._pending)
+            self._cv.notify_all()
+            return self._seq
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until everything recorded so far has been written (and fsynced unless
+        policy is never). False on timeout or when the flusher has given up.
+        """
+        with self._cv:
+            target = self._seq
+        if self._file is None:
+            return target == 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            while self._written < target:
+                if not self._threads or self._failed is not None:
+                    break
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    return False
+                self._cv.wait(wait)
+            if self._failed is not None:
+                return False
+        if self._written < target:  # flusher not running: drain inline
+            self._drain()
+        if self.fsync != "never":
+            self._sync()
+        return True
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """Snapshot, then delete the WAL segments the snapshot makes redundant."""
+        self.flush()
+        with self._file_lock:
+            covered = self._segment
+            self._open_segment_locked(covered + 1)
+        snap = self.snapshots.snapshot()
+        for seq, path in _segments(self.wal_dir):
+            if seq <= covered:
+                os.remove(path)
+        with self._cv:
+            self._stats["checkpoints"] += 1
+        return snap
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cv:
+            s = dict(self._stats)
+            s["pending"] = len(self._pending)
+            lat = sorted(self._latencies)
+        s.update(fsync=self.fsync, segment=self._segment, failed=self._failed is not None,
+                 avg_group=round(s["records"] / s["groups"], 1) if s["groups"] else 0.0)
+        if lat:
+            s["flush_ms"] = {"p50": round(lat[len(lat) // 2], 3), "p95": round(lat[int(len(lat) * 0.95) - 1], 3),
+                             "p99": round(lat[int(len(lat) * 0.99) - 1], 3), "max": round(lat[-1], 3)}
+        return s
+
+    # -------------------------------
+    # Flusher side
+    # -------------------------------
+    def _open_segment(self, seq: int) -> None:
+        with self._file_lock:
+            self._open_segment_locked(seq)
+
+    def _open_segment_locked(self, seq: int) -> None:
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        self._segment = seq
+        self._file = open(os.path.join(self.wal_dir, _segment_name(seq)), "ab")
+
+    def _sync(self) -> None:
+        with self._file_lock:
+            if self._file:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._dirty = False
+        self._last_fsync = time.monotonic()
+        with self._cv:
+            self._stats["fsyncs"] += 1
+
+    def _fsync_due(self) -> Optional[float]:
+        """Seconds until the interval policy must fsync written data; None if nothing is due."""
+        if self.fsync != "interval" or not self._dirty:
+            return None
+        return self._last_fsync + self.fsync_interval_s - time.monotonic()
+
+    def _take_group(self) -> List[Tuple[int, float, bytes]]:
+        """The next group to commit; empty when closed, or when an interval fsync is due."""
+        with self._cv:
+            while not self._pending and not self._closed:
+                due = self._fsync_due()
+                if due is not None and due <= 0:
+                    return []
+                self._cv.wait(due)
+            # let concurrent writers join this group, up to group_max or group_wait_s
+            deadline = time.monotonic() + self.group_wait_s
+            while len(self._pending) < self.group_max and not self._closed:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._cv.wait(left)
+            group = [self._pending.popleft() for _ in range(min(self.group_max, len(self._pending)))]
+            self._cv.notify_all()
+            return group
+
+    def _drain(self) -> None:
+        while True:
+            with self._cv:
+                if not self._pending:
+                    return
+                group = [self._pending.popleft() for _ in range(min(self.group_max, len(self._pending)))]
+            self._commit(group)
+
+    def _commit(self, group: List[Tuple[int, float, bytes]]) -> None:
+        data = b"".join(frame for _, _, frame in group)
+        with self._file_lock:
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync == "always" or (
+                    self.fsync == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval_s):
+                os.fsync(self._file.fileno())
+                self._last_fsync = time.monotonic()
+                synced = True
+            else:
+                synced = False
+            self._dirty = self._dirty or not synced
+        now = time.perf_counter()
+        with self._cv:
+            self._written = max(self._written, group[-1][0])
+            self._latencies.extend((now - t) * 1000 for _, t, _ in group)
+            self._stats["records"] += len(group)
+            self._stats["groups"] += 1
+            self._stats["bytes"] += len(data)
+            self._stats["fsyncs"] += synced
+            self._cv.notify_all()
+
+    def _run(self) -> None:
+        failures = 0
+        while True:
+            group = self._take_group()
+            if not group:
+                if self._closed:
+                    return
+                try:
+                    self._sync()  # interval fsync came due with no new writes
+                except Exception:
+                    with self._cv:
+                        self._stats["errors"] += 1
+                continue
+            try:
+                self._commit(group)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                with self._cv:
+                    self._stats["errors"] += 1
+                    # put the group back so nothing acknowledged is silently dropped
+                    self._pending.extendleft(reversed(group))
+                    if failures > self.max_retries:
+                        self._failed = e
+                        self._cv.notify_all()
+                        return
+                    self._cv.wait(self.retry_wait_s)
+
+    def _run_checkpoints(self) -> None:
+        while not self._stop.wait(self.checkpoint_interval_s):
+            try:
+                self.checkpoint()
+            except Exception:
+                with self._cv:
+                    self._stats["errors"] += 1
@@ -1,4 +1,5 @@
 # agents/wearable_agent.py
+from datetime import date
 from typing import Dict, Any
 from .base_agent import STATE, log_event
 
@@ -6,6 +7,8 @@ from .base_agent import STATE, log_event
 # {"hr_rest":62,"hr_avg":96,"sleep_hours":5.8,"steps":9100,"vo2max":41.3,"date":"2025-10-14"}
 class WearableAgent:
     def ingest(self, user_id: str, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        # stamp undated readings with today, like ProgressAgent.log
+        metrics = {**metrics, "date": metrics.get("date") or date.today().isoformat()}
         STATE.append(user_id, "wearables", metrics)
         log_event(user_id, "WearableAgent", "ingest_metrics", payload=metrics)
         return {"status": "ok"}
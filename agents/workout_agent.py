@@ -1,33 +1,39 @@
 # agents/workout_agent.py
-from typing import Dict, Any, List
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple
 from .base_agent import log_event
+from .profile_agent import CanonicalProfile, Goal, Level
 
 BASE_PLANS = {
-    "Fat Loss": ["Jump Rope", "Mountain Climbers", "Cycling (Low Impact)", "Core Planks"],
-    "Muscle Gain": ["Squats", "Deadlifts", "Bench Press", "Rows", "Overhead Press"],
-    "Endurance": ["Cycling", "Jogging", "Rowing", "Swimming", "Elliptical"],
-    "General Fitness": ["Yoga", "Brisk Walk", "Bodyweight Circuit", "Stretching", "Core Stability"]
+    Goal.FAT_LOSS: ["Jump Rope", "Mountain Climbers", "Cycling (Low Impact)", "Core Planks"],
+    Goal.MUSCLE_GAIN: ["Squats", "Deadlifts", "Bench Press", "Rows", "Overhead Press"],
+    Goal.ENDURANCE: ["Cycling", "Jogging", "Rowing", "Swimming", "Elliptical"],
+    Goal.GENERAL_FITNESS: ["Yoga", "Brisk Walk", "Bodyweight Circuit", "Stretching", "Core Stability"]
 }
+VOLUME = {Level.BEGINNER: 2, Level.INTERMEDIATE: 3, Level.ADVANCED: 4}
 
-class WorkoutAgent:
-    def generate(self, user_id: str, profile: Dict[str, Any], days: int = 7) -> List[Dict[str, Any]]:
-        goal = profile.get("goal", "General Fitness")
-        level = profile.get("level", "Beginner")
-        constraints = [c.lower() for c in profile.get("constraints", [])]
 
-        base = BASE_PLANS.get(goal, BASE_PLANS["General Fitness"]).copy()
+@lru_cache(maxsize=None)
+def _template(goal: Goal, level: Level, low_impact: bool) -> Tuple[Tuple[str, ...], int]:
+    """Exercises and sets for one (goal, level, low-impact) combination; a few dozen exist in total."""
+    base = list(BASE_PLANS[goal])
+
+    # safety
+    if low_impact:
+        base = [x for x in base if "Jump Rope" not in x and "Mountain Climbers" not in x]
+        if "Cycling (Low Impact)" not in base:
+            base.append("Cycling (Low Impact)")
 
-        # safety
-        if any("injury" in c or "knee" in c for c in constraints):
-            base = [x for x in base if "Jump Rope" not in x and "Mountain Climbers" not in x]
-            if "Cycling (Low Impact)" not in base:
-                base.append("Cycling (Low Impact)")
+    return tuple(base[:3]), VOLUME[level]
 
-        volume = {"Beginner": 2, "Intermediate": 3, "Advanced": 4}.get(level, 2)
 
-        plan = []
-        for d in range(days):
-            plan.append({"day": d + 1, "exercises": base[:3], "sets": volume, "notes": ""})
+class WorkoutAgent:
+    def generate(self, user_id: str, profile: CanonicalProfile, days: int = 7) -> List[Dict[str, Any]]:
+        exercises, volume = _template(*profile.template_key)
+
+        # fresh day dicts: callers tune sets and exercises in place
+        plan = [{"day": d + 1, "exercises": list(exercises), "sets": volume, "notes": ""} for d in range(days)]
 
-        log_event(user_id, "WorkoutAgent", "generate_plan", payload={"goal": goal, "level": level, "days": days})
+        log_event(user_id, "WorkoutAgent", "generate_plan",
+                  payload={"goal": profile.goal.label, "level": profile.level.label, "days": days})
         return plan
@@ -1,11 +1,60 @@
 # app.py
-from fastapi import FastAPI, HTTPException
+import hmac
+import json
+import os
+import threading
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from agents.orchestrator import Orchestrator
+from agents.base_agent import STATE
+from agents.response_cache import ResponseCache
+from agents.leaderboard import board_scores
+from agents.snapshot import decode_users, encode_users
+from agents.replay import EventRecorder
+from agents.wal import WriteBehindLog
 
 app = FastAPI(title="FitSymphony AI – REST API", version="1.2.0")
-orc = Orchestrator()
+# Optional traffic recording for `python replay.py`
+RECORD_PATH = os.getenv("FITSYMPHONY_RECORD", "")
+recorder = EventRecorder(RECORD_PATH) if RECORD_PATH else None
+orc = Orchestrator(recorder=recorder)
+cache = ResponseCache()
+
+# Set by router.py for the workers it spawns; the /internal routes are disabled without it.
+INTERNAL_TOKEN = os.getenv("FITSYMPHONY_INTERNAL_TOKEN", "")
+
+# Optional persistence: recover STATE from snapshot + WAL at startup, then journal writes behind the request path.
+DATA_DIR = os.getenv("FITSYMPHONY_DATA_DIR", "")
+wal = None
+if DATA_DIR:
+    wal = WriteBehindLog(DATA_DIR, fsync=os.getenv("FITSYMPHONY_FSYNC", "interval"),
+                         checkpoint_interval_s=float(os.getenv("FITSYMPHONY_CHECKPOINT_S", "300")),
+                         summarize=board_scores)
+    wal.open()
+
+
+def rank_users(user_ids: List[str]) -> None:
+    """
+    Leaderboards are in-memory: re-file recovered or migrated users off the request path.
+    Users still encoded are filed from the scores stored with them and stay encoded.
+    """
+    def run():
+        for uid in user_ids:
+            orc.leaderboards.load(uid)
+    threading.Thread(target=run, name="leaderboard-load", daemon=True).start()
+
+
+rank_users(STATE.user_ids())
+
+
+@app.on_event("shutdown")
+def close_wal():
+    if wal is not None:
+        wal.close()
+    if recorder is not None:
+        recorder.close()
 
 # -------------------------------
 # Request Models
@@ -39,6 +88,10 @@ class AskRequest(BaseModel):
     question: str
 
 
+class UserIdsRequest(BaseModel):
+    user_ids: List[str]
+
+
 # -------------------------------
 # Routes
 # -------------------------------
@@ -47,10 +100,31 @@ def health():
     return {"status": "ok", "agent": "FitSymphony AI"}
 
 
+def cached_read(request: Request, route: str, event: str, user_id: str) -> Response:
+    """
+    Serve a side-effect-free read through the response cache. The user's state
+    version decides freshness: a matching If-None-Match costs one dict lookup.
+    """
+    version = STATE.version(user_id)
+    etag = cache.etag(route, user_id, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if cache.not_modified(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = cache.get(route, user_id, version)
+    if body is None:
+        result = orc.handle_event(event, user_id, {})
+        body = json.dumps(jsonable_encoder(result)).encode()
+        cache.put(route, user_id, version, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.post("/create_profile")
 def create_profile(req: ProfileRequest):
     try:
         return orc.handle_event("create_profile", req.user_id, {"profile": req.profile})
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -59,6 +133,8 @@ def create_profile(req: ProfileRequest):
 def generate_plan(req: PlanRequest):
     try:
         return orc.handle_event("generate_plan", req.user_id, req.model_dump())
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -79,6 +155,116 @@ def log_progress(req: ProgressRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/progress/{user_id}")
+def get_progress(user_id: str, request: Request):
+    try:
+        return cached_read(request, "progress", "get_progress", user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/badges/{user_id}")
+def get_badges(user_id: str, request: Request):
+    try:
+        return cached_read(request, "badges", "get_badges", user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/metrics/{user_id}")
+def get_metrics(user_id: str, request: Request):
+    try:
+        return cached_read(request, "metrics", "get_metrics", user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"status": "ok", **cache.stats()}
+
+
+@app.get("/persistence/stats")
+def persistence_stats():
+    if wal is None:
+        return {"status": "disabled"}
+    return {"status": "ok", **wal.stats()}
+
+
+@app.get("/leaderboards/{metric}")
+def leaderboard(metric: str, goal: Optional[str] = None, level: Optional[str] = None, limit: int = 10):
+    try:
+        return orc.handle_event("get_leaderboard", "", {"metric": metric, "goal": goal, "level": level, "limit": limit})
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/leaderboards/{metric}/percentile")
+def leaderboard_percentile(metric: str, value: float, goal: Optional[str] = None, level: Optional[str] = None):
+    try:
+        return orc.handle_event("get_percentile", "", {"metric": metric, "value": value, "goal": goal, "level": level})
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/leaderboards/{metric}/users/{user_id}")
+def leaderboard_rank(metric: str, user_id: str, scope: str = "cohort"):
+    try:
+        return orc.handle_event("get_rank", user_id, {"metric": metric, "scope": scope})
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/plans/{user_id}/versions")
+def plan_history(user_id: str):
+    try:
+        return orc.handle_event("get_plan_history", user_id, {})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/plans/{user_id}/versions/{version}")
+def plan_version(user_id: str, version: int):
+    try:
+        return orc.handle_event("get_plan_version", user_id, {"version": version})
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/plans/{user_id}/diff")
+def plan_diff(user_id: str, from_version: int, to_version: Optional[int] = None):
+    try:
+        return orc.handle_event("get_plan_diff", user_id, {"from_version": from_version, "to_version": to_version})
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/precompute/stats")
+def precompute_stats():
+    try:
+        return orc.handle_event("precompute_stats", "", {})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/rules/stats")
+def rule_stats():
+    try:
+        return orc.handle_event("rule_stats", "", {})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/ask_ai")
 def ask_ai(req: AskRequest):
     """Conversational endpoint that uses AskAgent via Orchestrator"""
@@ -88,3 +274,65 @@ def ask_ai(req: AskRequest):
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# -------------------------------
+# Shard migration (router.py only)
+# -------------------------------
+def require_internal(request: Request):
+    token = request.headers.get("x-internal-token", "")
+    if not INTERNAL_TOKEN or not hmac.compare_digest(token, INTERNAL_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@app.get("/internal/users")
+def internal_users(request: Request):
+    require_internal(request)
+    return {"users": {uid: STATE.version(uid) for uid in STATE.user_ids()}}
+
+
+@app.post("/internal/export")
+def internal_export(req: UserIdsRequest, request: Request):
+    """
+    Encoded state for the given users; still-lazy users are passed through undecoded.
+    Exported users leave this worker's leaderboards at once, before the new owner
+    ranks them, so merged boards never count a moving user twice.
+    """
+    require_internal(request)
+    known = set(STATE.user_ids())
+    users = [(uid, STATE.version(uid), STATE.lazy_loader(uid) or STATE.export_user(uid))
+             for uid in req.user_ids if uid in known]
+    for uid, _, _ in users:
+        orc.leaderboards.drop(uid)
+    return Response(content=encode_users(users, summarize=board_scores), media_type="application/octet-stream")
+
+
+@app.post("/internal/import")
+async def internal_import(request: Request):
+    require_internal(request)
+    users = decode_users(await request.body(), lazy=True)
+    for uid, version, loader in users:
+        STATE.import_user_lazy(uid, loader, version)
+    rank_users([uid for uid, _, _ in users])
+    return {"status": "ok", "imported": len(users)}
+
+
+@app.post("/internal/rank")
+def internal_rank(req: UserIdsRequest, request: Request):
+    """Re-file exported users whose migration was rolled back."""
+    require_internal(request)
+    known = set(STATE.user_ids())
+    uids = [uid for uid in req.user_ids if uid in known]
+    rank_users(uids)
+    return {"status": "ok", "ranked": len(uids)}
+
+
+@app.post("/internal/drop")
+def internal_drop(req: UserIdsRequest, request: Request):
+    require_internal(request)
+    for uid in req.user_ids:
+        STATE.drop_user(uid)
+        orc.leaderboards.drop(uid)
+        orc.profile.forget(uid)
+        orc.gamify.forget(uid)
+    return {"status": "ok", "dropped": len(req.user_ids)}
@@ -0,0 +1,59 @@
+# benchmarks/bench_leaderboard.py
+"""
+Leaderboard update, rank and percentile latency at scale.
+
+    python -m benchmarks.bench_leaderboard --users 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+from agents.leaderboard import ALL, Leaderboards
+
+GOALS = ("fat_loss", "muscle_gain", "endurance", "general_fitness")
+LEVELS = ("beginner", "intermediate", "advanced")
+
+
+def percentiles(times_ms):
+    times_ms = sorted(times_ms)
+    return statistics.median(times_ms), times_ms[int(len(times_ms) * 0.99) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    boards = Leaderboards()
+    users = [f"user-{i}" for i in range(args.users)]
+    cohorts = {u: f"{rng.choice(GOALS)}/{rng.choice(LEVELS)}" for u in users}
+
+    t = time.perf_counter()
+    for u in users:
+        boards.set("adherence", u, round(rng.uniform(0, 100), 1), cohorts[u])
+    load_s = time.perf_counter() - t
+    print(f"{args.users:,} users filed in {load_s:.1f} s ({args.users / load_s:,.0f} inserts/s, all + cohort board)")
+
+    sample = [rng.choice(users) for _ in range(args.queries)]
+    ops = {
+        "update": lambda u: boards.set("adherence", u, round(rng.uniform(0, 100), 1), cohorts[u]),
+        "rank (cohort)": lambda u: boards.rank("adherence", u),
+        "rank (all)": lambda u: boards.rank("adherence", u, ALL),
+        "percentile": lambda u: boards.standing("adherence", rng.uniform(0, 100)),
+        "top 10": lambda u: boards.top("adherence", cohorts[u], 10),
+    }
+    print(f"{'operation':<16}{'p50 µs':>9}{'p99 µs':>9}")
+    for name, op in ops.items():
+        times = []
+        for u in sample:
+            t = time.perf_counter()
+            op(u)
+            times.append((time.perf_counter() - t) * 1e6)
+        p50, p99 = percentiles(times)
+        print(f"{name:<16}{p50:>9.1f}{p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
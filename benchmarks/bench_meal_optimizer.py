@@ -0,0 +1,76 @@
+# benchmarks/bench_meal_optimizer.py
+"""
+Meal plan optimizer latency over a synthetic food table.
+
+    python -m benchmarks.bench_meal_optimizer --foods 10000
+"""
+import argparse
+import csv
+import os
+import random
+import statistics
+import tempfile
+import time
+from agents.food_db import COLUMNS, CSV_PATH, FoodDB, compile_csv
+from agents.meal_optimizer import MealOptimizer
+
+PROFILES = [
+    {"age": 28, "goal": "Fat Loss", "level": "Beginner"},
+    {"age": 35, "goal": "Muscle Gain", "level": "Advanced", "constraints": ["lactose intolerant"]},
+    {"age": 42, "goal": "Endurance", "level": "Intermediate", "preferences": ["vegan"]},
+    {"age": 51, "goal": "General Fitness", "level": "Beginner", "preferences": ["chicken", "no fish"]},
+]
+
+
+def synthetic_db(foods: int, seed: int = 11) -> FoodDB:
+    """Jittered variants of the bundled foods, compiled in memory."""
+    rng = random.Random(seed)
+    with open(CSV_PATH, newline="", encoding="utf-8") as f:
+        base = list(csv.DictReader(f))
+    path = os.path.join(tempfile.mkdtemp(prefix="foods-bench-"), "foods.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["name", *COLUMNS, "tags"])
+        writer.writeheader()
+        for i in range(foods):
+            row = dict(rng.choice(base))
+            row["name"] = f"{row['name']} #{i}"
+            for c in COLUMNS:
+                row[c] = round(float(row[c] or 0) * rng.uniform(0.7, 1.3), 1)
+            writer.writerow(row)
+    try:
+        return FoodDB(compile_csv(path))
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--foods", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    db = synthetic_db(args.foods)
+    t = time.perf_counter()
+    optimizer = MealOptimizer(db)
+    setup_ms = (time.perf_counter() - t) * 1000
+    print(f"{len(db)} foods, table build {setup_ms:.1f} ms (once per database)")
+
+    print(f"{'profile':<18}{'p50 ms':>9}{'p95 ms':>9}{'kcal err %':>12}{'protein err %':>15}")
+    for profile in PROFILES:
+        times, plan = [], None
+        for _ in range(args.runs):
+            t = time.perf_counter()
+            plan = optimizer.plan(profile, args.days, weight_kg=75)
+            times.append((time.perf_counter() - t) * 1000)
+        times.sort()
+        target = plan["targets"]
+        kcal_err = statistics.mean(abs(d["totals"]["calories"] / target["calories"] - 1) for d in plan["days"]) * 100
+        prot_err = statistics.mean(abs(d["totals"]["protein_g"] / target["protein_g"] - 1) for d in plan["days"]) * 100
+        print(f"{profile['goal']:<18}{statistics.median(times):>9.2f}{times[int(len(times) * 0.95) - 1]:>9.2f}"
+              f"{kcal_err:>12.1f}{prot_err:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_prompt_prefix.py
+"""
+Prefill time saved by prompt prefix caching against a local Ollama server.
+
+    python -m benchmarks.bench_prompt_prefix --calls 10
+
+Each of the app's prompts is sent through /api/chat with num_predict=1, so the
+timing is almost all prompt evaluation, in two phases:
+  - cold: a random nonce at the start of the system message defeats prefix reuse;
+  - warm: the real, byte-stable system prefix, as the agents send it.
+Ollama reports prompt_eval_count/prompt_eval_duration for the tokens it actually
+evaluated, so the difference is the prefill the KV cache saved.
+"""
+import argparse
+import json
+import statistics
+import uuid
+import requests
+from agents.langchain_core import (OLLAMA_BASE_URL, OLLAMA_KEEP_ALIVE, OLLAMA_MODEL, NUM_CTX,
+                                   ask_prompt, feedback_prompt, rule_prompt)
+
+ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+PROFILE = {"name": "Asha", "age": 31, "goal": "Muscle Gain", "level": "Intermediate",
+           "preferences": ["vegetarian"], "constraints": ["knee pain"]}
+CONTEXT = {"plans": {"workout": [{"day": d + 1, "exercises": ["Squats", "Rows", "Bench Press"], "sets": 3}
+                                 for d in range(7)]},
+           "recent_logs": [{"agent": "FeedbackAgent", "action": "llm_feedback_parse"}] * 5,
+           "rules": {"rules": "[]"}}
+
+CASES = {
+    "feedback": (feedback_prompt, lambda i: {"feedback": f"workout {i} felt too hard on my knees"}),
+    "rules": (rule_prompt, lambda i: {"profile": json.dumps(PROFILE, indent=2, sort_keys=True),
+                                      "feedback_summary": f"{i} sessions skipped this week"}),
+    "ask": (ask_prompt, lambda i: {"context": json.dumps(CONTEXT, indent=2, sort_keys=True),
+                                   "question": f"Why do I have {i % 4 + 3} sets today?"}),
+}
+
+
+def chat(messages, nonce: str = "") -> dict:
+    if nonce:
+        messages = [{**messages[0], "content": f"[{nonce}]\n" + messages[0]["content"]}, *messages[1:]]
+    res = requests.post(f"{OLLAMA_BASE_URL}/api/chat", timeout=300, json={
+        "model": OLLAMA_MODEL, "messages": messages, "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"num_ctx": NUM_CTX, "num_predict": 1, "temperature": 0},
+    })
+    res.raise_for_status()
+    return res.json()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=10)
+    args = parser.parse_args()
+
+    try:
+        chat([{"role": "user", "content": "ok"}])  # load the model once, outside the timings
+    except requests.RequestException as e:
+        raise SystemExit(f"Ollama not reachable at {OLLAMA_BASE_URL} ({e}); start it with `ollama serve`.")
+
+    print(f"model {OLLAMA_MODEL}, num_ctx {NUM_CTX}, keep_alive {OLLAMA_KEEP_ALIVE}")
+    print(f"{'prompt':<10}{'cold tok':>10}{'cold ms':>10}{'warm tok':>10}{'warm ms':>10}{'saved ms/call':>15}")
+    for name, (prompt, variables) in CASES.items():
+        cold_tok, cold_ms, warm_tok, warm_ms = [], [], [], []
+        calls = [[{"role": ROLES[m.type], "content": m.content} for m in prompt.format_messages(**variables(i))]
+                 for i in range(args.calls)]
+        # Phases run back to back: interleaving would evict the warm prefix from a single cache slot
+        for messages in calls:
+            cold = chat(messages, nonce=uuid.uuid4().hex)
+            cold_tok.append(cold.get("prompt_eval_count", 0))
+            cold_ms.append(cold.get("prompt_eval_duration", 0) / 1e6)
+        for messages in calls:
+            warm = chat(messages)
+            warm_tok.append(warm.get("prompt_eval_count", 0))
+            warm_ms.append(warm.get("prompt_eval_duration", 0) / 1e6)
+        # The first warm call may still be priming the cache; report the steady state
+        steady = slice(1, None) if args.calls > 1 else slice(None)
+        c_ms, w_ms = statistics.mean(cold_ms[steady]), statistics.mean(warm_ms[steady])
+        print(f"{name:<10}{statistics.mean(cold_tok[steady]):>10.0f}{c_ms:>10.1f}"
+              f"{statistics.mean(warm_tok[steady]):>10.0f}{w_ms:>10.1f}{c_ms - w_ms:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
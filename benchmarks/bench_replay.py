@@ -0,0 +1,86 @@
+# benchmarks/bench_replay.py
+"""
+End-to-end regression benchmark: synthesize a recorded traffic mix, then replay it.
+
+    python -m benchmarks.bench_replay --users 500 --events 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+from agents.replay import EventRecorder, print_report, replay
+
+GOALS = ("fat_loss", "muscle_gain", "endurance", "general_fitness")
+LEVELS = ("beginner", "intermediate", "advanced")
+FEEDBACK = ("too hard today", "felt easy, want more", "knees sore after jumping", "good session")
+# event -> share of traffic after onboarding
+MIX = {
+    "log_progress": 0.35, "ingest_wearable": 0.25, "get_progress": 0.10, "get_metrics": 0.05,
+    "get_badges": 0.05, "generate_plan": 0.05, "submit_feedback": 0.05, "get_leaderboard": 0.02,
+    "get_rank": 0.03, "get_plan_history": 0.03, "ask_ai": 0.02,
+}
+
+
+def synthesize(path: str, users: int, events: int, seed: int = 5) -> None:
+    rng = random.Random(seed)
+    rec = EventRecorder(path)
+    t = 1_760_000_000.0
+    today = date.today()
+    uids = [f"user-{i:05d}" for i in range(users)]
+
+    def put(event, uid, payload):
+        nonlocal t
+        t += rng.expovariate(100)  # ~100 events/s as recorded
+        rec.record(t, event, uid, payload, 0.0, True)
+
+    for uid in uids:
+        put("create_profile", uid, {"profile": {
+            "name": uid, "age": rng.randint(18, 70), "goal": rng.choice(GOALS), "level": rng.choice(LEVELS),
+            "preferences": rng.sample(["vegetarian", "no fish", "chicken", "spicy food"], rng.randint(0, 2)),
+            "constraints": rng.sample(["knee injury", "lactose intolerant"], rng.randint(0, 1))}})
+        put("generate_plan", uid, {"days": 7})
+
+    names, weights = list(MIX), list(MIX.values())
+    logged = set()  # only users with a score can be ranked
+    for _ in range(events - 2 * users):
+        event, uid = rng.choices(names, weights)[0], rng.choice(uids)
+        if event == "get_rank" and uid not in logged:
+            event = "get_progress"
+        if event == "log_progress":
+            logged.add(uid)
+        day = (today - timedelta(days=rng.randint(0, 6))).isoformat()
+        payload = {
+            "log_progress": lambda: {"date": day, "weight_kg": round(rng.uniform(55, 95), 1),
+                                     "workout_minutes": rng.randint(0, 90), "kcals_burned": rng.randint(100, 700)},
+            "ingest_wearable": lambda: {"date": day, "hr_rest": rng.randint(50, 70), "hr_avg": rng.randint(70, 120),
+                                        "sleep_hours": round(rng.uniform(4, 9), 1), "steps": rng.randint(2000, 15000)},
+            "generate_plan": lambda: {"days": 7},
+            "submit_feedback": lambda: {"feedback_text": rng.choice(FEEDBACK)},
+            "get_leaderboard": lambda: {"metric": rng.choice(("adherence", "weekly_kcals", "weekly_steps"))},
+            "get_rank": lambda: {"metric": "adherence"},
+            "ask_ai": lambda: {"question": "Why did my sets change this week?"},
+        }.get(event, dict)()
+        put(event, uid, payload)
+    rec.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--speedup", type=float, default=0.0)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="replay-bench-"), "traffic.rec")
+    try:
+        synthesize(path, args.users, args.events)
+        print(f"recording: {args.events} events, {os.path.getsize(path) / 1024:.0f} KB")
+        print_report(replay(path, speedup=args.speedup, sample_every=max(1, args.events // 10)))
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
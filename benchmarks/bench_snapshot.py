@@ -0,0 +1,97 @@
+# benchmarks/bench_snapshot.py
+"""
+Snapshot size and restore time vs. plain JSON for a synthetic user population.
+
+    python -m benchmarks.bench_snapshot --users 100000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from agents.base_agent import MemoryStore
+from agents.snapshot import Snapshotter
+
+
+def synthetic_store(users: int, seed: int = 7) -> MemoryStore:
+    rng = random.Random(seed)
+    store = MemoryStore()
+    for i in range(users):
+        uid = f"user-{i:07d}"
+        workout = [{"day": d + 1, "exercises": ["Squats", "Rows", "Bench Press"], "sets": 3, "notes": ""} for d in range(7)]
+        nutrition = [{"day": d + 1, "item": "dal rice", "nutrition_info": [{"name": "dal rice", "calories": 320.5}]} for d in range(7)]
+        store.import_user(uid, {
+            "profile": {"name": uid, "age": rng.randint(18, 70), "goal": "Muscle Gain", "level": "Beginner",
+                        "preferences": [], "constraints": []},
+            "plans": {"workout": workout, "nutrition": nutrition},
+            "plan_versions": [{"version": 0, "ts": 1760000000, "reason": "generate_plan",
+                               "checkpoint": {"workout": workout, "nutrition": nutrition}}],
+            "progress": [{"date": f"2025-10-{d + 1:02d}", "weight_kg": round(rng.uniform(55, 95), 1),
+                          "workout_minutes": rng.randint(0, 90), "kcals_burned": rng.randint(100, 700), "notes": None}
+                         for d in range(20)],
+            "wearables": [{"hr_rest": rng.randint(50, 70), "hr_avg": rng.randint(70, 120),
+                           "sleep_hours": round(rng.uniform(4, 9), 1), "steps": rng.randint(2000, 15000)}
+                          for _ in range(20)],
+            "logs": [{"id": f"{i:08x}-{j:04x}", "ts": 1760000000 + j, "agent": "ProgressAgent",
+                      "action": "log_progress", "reason": "", "payload": {}} for j in range(30)],
+            "badges": [],
+        }, version=rng.randint(1, 200))
+    return store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"building {args.users} synthetic users ...")
+    store = synthetic_store(args.users)
+    workdir = tempfile.mkdtemp(prefix="fsnap-bench-")
+    try:
+        # JSON baseline, given the same GC pause the snapshot code uses
+        gc.disable()
+        t = time.perf_counter()
+        raw = json.dumps({uid: store.export_user(uid) for uid in store.user_ids()}).encode()
+        json_dump_s = time.perf_counter() - t
+        with open(os.path.join(workdir, "state.json"), "wb") as f:
+            f.write(raw)
+        t = time.perf_counter()
+        with open(os.path.join(workdir, "state.json"), "rb") as f:
+            loaded = json.loads(f.read())
+        target = MemoryStore()
+        for uid, state in loaded.items():
+            target.import_user(uid, state)
+        json_load_s = time.perf_counter() - t
+        gc.enable()
+        del loaded, target
+
+        # Sharded binary snapshot
+        snap_dir = os.path.join(workdir, "snap")
+        snap = Snapshotter(snap_dir, shards=args.shards, store=store)
+        full = snap.snapshot(full=True)
+        for uid in store.user_ids()[: max(1, args.users // 100)]:
+            store.append(uid, "progress", {"date": "2025-11-01", "weight_kg": 70.0,
+                                           "workout_minutes": 30, "kcals_burned": 250, "notes": None})
+        incr = snap.snapshot()
+        restore = Snapshotter(snap_dir, store=MemoryStore()).restore(workers=args.workers, lazy=False)
+        lazy = Snapshotter(snap_dir, store=MemoryStore()).restore(workers=args.workers)
+
+        print(f"{'format':<24}{'bytes':>14}{'write s':>10}{'load s':>10}")
+        print(f"{'json':<24}{len(raw):>14,}{json_dump_s:>10.2f}{json_load_s:>10.2f}")
+        print(f"{'fsnap full':<24}{full['bytes']:>14,}{full['seconds']:>10.2f}{restore['seconds']:>10.2f}")
+        print(f"{'fsnap lazy restore':<24}{'':>14}{'':>10}{lazy['seconds']:>10.2f}")
+        print(f"{'fsnap incremental (1%)':<24}{incr['bytes']:>14,}{incr['seconds']:>10.2f}{'':>10}")
+        print(f"size ratio json/fsnap: {len(raw) / max(1, full['bytes']):.1f}x, "
+              f"load speed-up: {json_load_s / max(1e-9, restore['seconds']):.1f}x eager, "
+              f"{json_load_s / max(1e-9, lazy['seconds']):.1f}x lazy")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# replay.py
+"""
+Replay a recorded event log against a fresh orchestrator and report latency and state growth.
+
+    FITSYMPHONY_RECORD=traffic.rec uvicorn app:app
+    python replay.py traffic.rec --speedup 10 --json report.json
+
+See agents/replay.py for what is recorded and how backends are stubbed.
+"""
+import argparse
+import json
+from agents.replay import print_report, replay
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded FitSymphony event log")
+    parser.add_argument("path")
+    parser.add_argument("--speedup", type=float, default=0.0, help="0 = back to back (default)")
+    parser.add_argument("--sample-every", type=int, default=1000)
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--json", help="also write the full report here")
+    args = parser.parse_args()
+
+    report = replay(args.path, speedup=args.speedup, sample_every=args.sample_every, limit=args.limit)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
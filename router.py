@@ -0,0 +1,389 @@
+# router.py
+"""
+User-affinity front router for running the API on several worker processes.
+
+    python router.py --workers 4 --port 8000
+
+Each worker is a plain `uvicorn app:app` process with its own in-memory STATE.
+The router consistent-hashes every request's user_id to the worker that owns
+that user, so all of a user's reads and writes land in one process; leaderboard
+reads are merged from every worker's boards. Adding or
+removing a worker migrates only the users whose owner changes, through the
+workers' token-protected /internal routes.
+"""
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from json import JSONDecodeError, loads
+from typing import Any, Dict, List, Optional
+import requests
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, Response
+from starlette.concurrency import run_in_threadpool
+from agents.hash_ring import HashRing
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# /<route>/{user_id}/... paths; POST bodies carry "user_id" instead
+USER_ROUTES = {"progress", "badges", "metrics", "plans"}
+# process-wide stats: answered by every worker and returned side by side
+FANOUT_ROUTES = {"cache/stats", "precompute/stats", "persistence/stats"}
+FORWARD_HEADERS = ("content-type", "if-none-match")
+RETURN_HEADERS = ("content-type", "etag", "cache-control")
+
+
+class WorkerPool:
+    """Spawns and stops `uvicorn app:app` worker processes on consecutive local ports."""
+
+    def __init__(self, host: str = "127.0.0.1", base_port: int = 9100, startup_timeout: float = 60.0):
+        self.host = host
+        self.base_port = base_port
+        self.startup_timeout = startup_timeout
+        self.token = secrets.token_hex(16)
+        self.urls: Dict[str, str] = {}
+        self._procs: Dict[str, subprocess.Popen] = {}
+        self._next = 0
+        self.session = requests.Session()
+        self.session.headers["X-Internal-Token"] = self.token
+
+    def spawn(self) -> str:
+        node, port = f"w{self._next}", self.base_port + self._next
+        self._next += 1
+        env = {**os.environ, "FITSYMPHONY_INTERNAL_TOKEN": self.token}
+        if os.getenv("FITSYMPHONY_DATA_DIR"):
+            # each worker persists only the users it owns
+            env["FITSYMPHONY_DATA_DIR"] = os.path.join(os.environ["FITSYMPHONY_DATA_DIR"], node)
+        if os.getenv("FITSYMPHONY_RECORD"):
+            env["FITSYMPHONY_RECORD"] = f"{os.environ['FITSYMPHONY_RECORD']}.{node}"
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", self.host, "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env,
+        )
+        url = f"http://{self.host}:{port}"
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                break
+            try:
+                if self.session.get(f"{url}/health", timeout=1).ok:
+                    self._procs[node], self.urls[node] = proc, url
+                    return node
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        proc.terminate()
+        raise RuntimeError(f"worker {node} failed to start on port {port}")
+
+    def stop(self, node: str) -> None:
+        proc = self._procs.pop(node, None)
+        self.urls.pop(node, None)
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def stop_all(self) -> None:
+        for node in list(self._procs):
+            self.stop(node)
+
+
+class Router:
+    """
+    Routes user_ids over a HashRing of workers and rebalances when workers change.
+
+    During a rebalance only users whose owner differs between the current and the
+    target ring are held back, including users first seen mid-rebalance: their
+    requests wait until every in-flight request for them has finished, their state
+    has been copied to the new owner and the ring has switched. Everyone else keeps
+    flowing. Workers are listed only after those in-flight requests drain, so a user
+    created on the old owner cannot be missed by the copy.
+
+    Merged leaderboards may briefly miss a moving user but never count one twice:
+    the old owner unranks users as it exports them. If a rebalance fails, copies
+    already imported are dropped again and the old owner re-ranks its users.
+    """
+
+    def __init__(self, pool: WorkerPool, vnodes: int = 128):
+        self.pool = pool
+        self.ring = HashRing(vnodes=vnodes)
+        self._target: Optional[HashRing] = None
+        self._cv = threading.Condition()
+        self._active: Counter = Counter()
+        self._rebalance_lock = threading.Lock()
+        self.stats = {"forwarded": 0, "waited": 0, "rebalances": 0, "users_moved": 0}
+
+    # -------------------------------
+    # Request path
+    # -------------------------------
+    def _in_transit(self, user_id: str) -> bool:
+        """Caller holds _cv."""
+        return self._target is not None and self._target.node_for(user_id) != self.ring.node_for(user_id)
+
+    def acquire(self, user_id: str) -> str:
+        with self._cv:
+            if self._in_transit(user_id):
+                self.stats["waited"] += 1
+                while self._in_transit(user_id):
+                    self._cv.wait()
+            self._active[user_id] += 1
+            self.stats["forwarded"] += 1
+            node = (self._target or self.ring).node_for(user_id)
+            return self.pool.urls[node]
+
+    def release(self, user_id: str) -> None:
+        with self._cv:
+            self._active[user_id] -= 1
+            if self._active[user_id] <= 0:
+                del self._active[user_id]
+                if self._in_transit(user_id):
+                    self._cv.notify_all()
+
+    def forward(self, method: str, path: str, user_id: Optional[str], headers: Dict[str, str],
+                params: Any, body: bytes) -> requests.Response:
+        if user_id is None:
+            url = self.pool.urls[self.ring.nodes[0]]
+            return self.pool.session.request(method, f"{url}/{path}", headers=headers, params=params, data=body, timeout=300)
+        url = self.acquire(user_id)
+        try:
+            return self.pool.session.request(method, f"{url}/{path}", headers=headers, params=params, data=body, timeout=300)
+        finally:
+            self.release(user_id)
+
+    def fanout(self, path: str, params: Any = None) -> Dict[str, Any]:
+        return {node: self.pool.session.get(f"{self.pool.urls[node]}/{path}", params=params, timeout=30).json()
+                for node in self.ring.nodes}
+
+    def _gather(self, path: str, params: Any) -> List[Dict[str, Any]]:
+        """GET on every worker; a 4xx from any of them (bad metric, cohort) is the answer."""
+        out = []
+        for node in self.ring.nodes:
+            res = self.pool.session.get(f"{self.pool.urls[node]}/{path}", params=params, timeout=30)
+            if res.status_code >= 400:
+                raise HTTPException(status_code=res.status_code, detail=res.json().get("detail"))
+            out.append(res.json())
+        return out
+
+    def leaderboard(self, metric: str, params: Dict[str, str]) -> Dict[str, Any]:
+        """Global top-N: each worker's top-N merged, ranks recomputed over the union."""
+        boards = self._gather(f"leaderboards/{metric}", params)
+        limit = max(1, min(int(params.get("limit", 10)), 100))
+        rows = sorted((r for b in boards for r in b["entries"]), key=lambda r: (-r["score"], r["user_id"]))[:limit]
+        rank, prev = 0, None
+        for i, row in enumerate(rows):
+            if row["score"] != prev:
+                rank, prev = i + 1, row["score"]
+            row["rank"] = rank
+        return {**boards[0], "total": sum(b["total"] for b in boards), "entries": rows}
+
+    def standing(self, metric: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Percentile across workers: above/equal/below counts add up."""
+        parts = self._gather(f"leaderboards/{metric}/percentile", params)
+        out = {**parts[0], **{k: sum(p[k] for p in parts) for k in ("above", "equal", "below", "total")}}
+        out["percentile"] = round(100.0 * (out["below"] + 0.5 * out["equal"]) / out["total"], 2) if out["total"] else None
+        return out
+
+    def rank(self, metric: str, user_id: str, params: Dict[str, str]) -> Response:
+        """The owner knows the user's score and cohort; every worker counts who beats it."""
+        res = self.forward("GET", f"leaderboards/{metric}/users/{user_id}", user_id, {}, params, b"")
+        if res.status_code != 200:
+            return Response(content=res.content, status_code=res.status_code, media_type="application/json")
+        own = res.json()
+        query: Dict[str, Any] = {"value": own["score"]}
+        if own["scope"] != "all":
+            query["goal"], query["level"] = own["cohort"].split("/", 1)
+        s = self.standing(metric, query)
+        return {**own, "rank": s["above"] + 1, "total": s["total"], "percentile": s["percentile"]}
+
+    # -------------------------------
+    # Membership changes
+    # -------------------------------
+    def users(self) -> Dict[str, Dict[str, int]]:
+        return {node: self.pool.session.get(f"{self.pool.urls[node]}/internal/users", timeout=30).json()["users"]
+                for node in self.ring.nodes}
+
+    def add_worker(self) -> Dict[str, Any]:
+        node = self.pool.spawn()
+        ring = self.ring.copy()
+        ring.add(node)
+        try:
+            moved = self._rebalance(ring)
+        except Exception:
+            self.pool.stop(node)
+            raise
+        return {"node": node, "moved": moved, "nodes": self.ring.nodes}
+
+    def remove_worker(self, node: str) -> Dict[str, Any]:
+        if node not in self.ring:
+            raise KeyError(node)
+        if len(self.ring) == 1:
+            raise ValueError("cannot remove the last worker")
+        ring = self.ring.copy()
+        ring.remove(node)
+        moved = self._rebalance(ring)
+        self.pool.stop(node)
+        return {"node": node, "moved": moved, "nodes": self.ring.nodes}
+
+    def _rebalance(self, ring: HashRing) -> int:
+        with self._rebalance_lock:
+            with self._cv:
+                self._target = ring
+                while any(self._in_transit(uid) for uid in self._active):
+                    self._cv.wait()
+            try:
+                moves = {}
+                for node, users in self.users().items():
+                    for uid in users:
+                        new = ring.node_for(uid)
+                        if new != node:
+                            moves[uid] = (node, new)
+                batches: Dict[tuple, List[str]] = defaultdict(list)
+                for uid, pair in moves.items():
+                    batches[pair].append(uid)
+                session = self.pool.session
+                exported, imported = [], []
+                try:
+                    for (old, new), uids in batches.items():
+                        exported.append((old, uids))
+                        blob = session.post(f"{self.pool.urls[old]}/internal/export", json={"user_ids": uids}, timeout=300)
+                        blob.raise_for_status()
+                        imported.append((new, uids))
+                        session.post(f"{self.pool.urls[new]}/internal/import", data=blob.content, timeout=300,
+                                     headers={"Content-Type": "application/octet-stream"}).raise_for_status()
+                except Exception:
+                    self._roll_back(exported, imported)
+                    raise
+                with self._cv:
+                    self.ring = ring
+                for (old, _), uids in batches.items():
+                    session.post(f"{self.pool.urls[old]}/internal/drop", json={"user_ids": uids}, timeout=300)
+                self.stats["rebalances"] += 1
+                self.stats["users_moved"] += len(moves)
+                return len(moves)
+            finally:
+                with self._cv:
+                    self._target = None
+                    self._cv.notify_all()
+
+    def _roll_back(self, exported: List[tuple], imported: List[tuple]) -> None:
+        """Best effort: forget copies on the would-be owners, re-rank users on the old ones."""
+        for path, done in (("internal/drop", imported), ("internal/rank", exported)):
+            for node, uids in done:
+                try:
+                    self.pool.session.post(f"{self.pool.urls[node]}/{path}", json={"user_ids": uids}, timeout=300)
+                except requests.RequestException:
+                    pass
+
+
+def user_of(path: str, body: bytes) -> Optional[str]:
+    parts = path.strip("/").split("/")
+    if parts[0] in USER_ROUTES and len(parts) > 1:
+        return parts[1]
+    if body:
+        try:
+            data = loads(body)
+        except (JSONDecodeError, UnicodeDecodeError):
+            return None
+        if isinstance(data, dict) and data.get("user_id") is not None:
+            return str(data["user_id"])
+    return None
+
+
+app = FastAPI(title="FitSymphony AI – Router", version="1.2.0")
+ROUTER: Optional[Router] = None
+
+
+def require_local(request: Request):
+    if request.client is None or request.client.host not in ("127.0.0.1", "::1", "localhost"):
+        raise HTTPException(status_code=403, detail="router admin is local-only")
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "agent": "FitSymphony AI", "workers": ROUTER.ring.nodes}
+
+
+@app.get("/router/ring")
+def ring_status(request: Request):
+    require_local(request)
+    users = ROUTER.users()
+    return {"nodes": {node: {"url": ROUTER.pool.urls[node], "users": len(users[node])} for node in ROUTER.ring.nodes},
+            "vnodes": ROUTER.ring.vnodes, **ROUTER.stats}
+
+
+@app.post("/router/workers")
+def add_worker(request: Request):
+    require_local(request)
+    try:
+        return ROUTER.add_worker()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.delete("/router/workers/{node}")
+def remove_worker(node: str, request: Request):
+    require_local(request)
+    try:
+        return ROUTER.remove_worker(node)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown worker {node}")
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+async def proxy(path: str, request: Request):
+    if path.startswith("internal/"):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if path in FANOUT_ROUTES:
+        return await run_in_threadpool(ROUTER.fanout, path)
+    parts = path.strip("/").split("/")
+    if parts[0] == "leaderboards" and request.method == "GET" and len(parts) in (2, 3, 4):
+        params = dict(request.query_params)
+        if len(parts) == 2:
+            return await run_in_threadpool(ROUTER.leaderboard, parts[1], params)
+        if parts[2] == "percentile":
+            return await run_in_threadpool(ROUTER.standing, parts[1], params)
+        if parts[2] == "users" and len(parts) == 4:
+            return await run_in_threadpool(ROUTER.rank, parts[1], parts[3], params)
+    body = await request.body()
+    headers = {h: request.headers[h] for h in FORWARD_HEADERS if h in request.headers}
+    try:
+        res = await run_in_threadpool(ROUTER.forward, request.method, path, user_of(path, body),
+                                      headers, list(request.query_params.multi_items()), body)
+    except requests.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"worker unavailable: {e}")
+    return Response(content=res.content, status_code=res.status_code,
+                    headers={h: res.headers[h] for h in RETURN_HEADERS if h in res.headers})
+
+
+def main() -> None:
+    global ROUTER
+    parser = argparse.ArgumentParser(description="FitSymphony user-affinity router")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--worker-port", type=int, default=9100, help="first worker port; workers use consecutive ports")
+    parser.add_argument("--vnodes", type=int, default=128)
+    args = parser.parse_args()
+
+    pool = WorkerPool(base_port=args.worker_port)
+    ROUTER = Router(pool, vnodes=args.vnodes)
+    try:
+        for _ in range(max(1, args.workers)):
+            ROUTER.ring.add(pool.spawn())
+        uvicorn.run(app, host=args.host, port=args.port)
+    finally:
+        pool.stop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,7 @@ st.title("💪 FitSymphony AI – Your Personal Fitness Coach")
 # -------------------------------
 page = st.sidebar.radio(
     "Navigate",
-    ["🏠 Create Profile", "📅 Generate Plan", "💬 Feedback", "📊 Log Progress", "🤖 Ask AI"]
+    ["🏠 Create Profile", "📅 Generate Plan", "💬 Feedback", "📊 Log Progress", "📈 Dashboard", "🤖 Ask AI"]
 )
 
 st.sidebar.info("Use the sidebar to interact with your FitSymphony AI backend.")
@@ -36,6 +36,31 @@ def call_api(endpoint, payload):
         return None
 
 
+def get_cached(endpoint):
+    """
+    GET a read endpoint with If-None-Match, so polling an unchanged
+    dashboard is answered with an empty 304 and served from session state.
+    """
+    cached = st.session_state.setdefault("etag_cache", {})
+    headers = {}
+    if endpoint in cached:
+        headers["If-None-Match"] = cached[endpoint][0]
+    try:
+        res = requests.get(f"{BASE_URL}/{endpoint}", headers=headers)
+        if res.status_code == 304:
+            return cached[endpoint][1]
+        if res.status_code == 200:
+            data = res.json()
+            if res.headers.get("ETag"):
+                cached[endpoint] = (res.headers["ETag"], data)
+            return data
+        st.error(f"Error {res.status_code}: {res.text}")
+        return None
+    except Exception as e:
+        st.error(f"Connection error: {e}")
+        return None
+
+
 # -------------------------------
 # 1️⃣ Create Profile
 # -------------------------------
@@ -137,7 +162,34 @@ elif page == "📊 Log Progress":
 
 
 # -------------------------------
-# 5️⃣ Ask AI
+# 5️⃣ Dashboard
+# -------------------------------
+elif page == "📈 Dashboard":
+    st.header("📈 Progress Dashboard")
+
+    user_id = st.text_input("User ID", value="shephin")
+
+    st.button("Refresh")  # any interaction reruns the page; unchanged data costs a 304
+
+    if user_id:
+        metrics = get_cached(f"metrics/{user_id}")
+        progress = get_cached(f"progress/{user_id}")
+        badges = get_cached(f"badges/{user_id}")
+
+        if metrics:
+            col1, col2 = st.columns(2)
+            col1.metric("Adherence Score", metrics.get("adherence_score", 0))
+            col2.metric("Plan Revisions", metrics.get("plan_revisions", 0))
+        if progress:
+            st.subheader("📊 Summary")
+            st.json(progress.get("summary", {}))
+        if badges:
+            st.subheader("🏅 Badges")
+            st.json(badges.get("badges", []))
+
+
+# -------------------------------
+# 6️⃣ Ask AI
 # -------------------------------
 elif page == "🤖 Ask AI":
     st.header("🤖 Chat with FitSymphony AI")
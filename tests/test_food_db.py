@@ -0,0 +1,82 @@
+# tests/test_food_db.py
+import struct
+import numpy as np
+import agents.nutrition_agent as nutrition_agent
+from agents.food_db import _HEADER, COLUMNS, CSV_PATH, FUZZY_MIN, FoodDB, compile_csv, get_food_db
+from agents.nutrition_agent import NutritionAgent
+from agents.profile_agent import canonicalize
+
+
+def _db() -> FoodDB:
+    return FoodDB(compile_csv(CSV_PATH))
+
+
+def test_columns_are_little_endian_views_of_the_packed_data():
+    buf = compile_csv(CSV_PATH)
+    db = FoodDB(buf)
+    n = len(db)
+    for i, c in enumerate(COLUMNS):
+        col = db.columns[c]
+        assert col.dtype == np.dtype("<f4")
+        packed = struct.unpack_from(f"<{n}f", buf, _HEADER.size + i * 4 * n)
+        assert col.tolist() == list(packed)
+
+
+def test_exact_lookup_ignores_case_and_punctuation():
+    db = _db()
+    items = db.lookup("  Boiled   EGGS! ")
+    assert items == [{"name": "boiled eggs", "serving_size_g": 100.0, "calories": 155.0, "protein_g": 13.0,
+                      "carbohydrates_total_g": 1.1, "fat_total_g": 11.0, "fiber_g": 0.0, "sugar_g": 1.1,
+                      "sodium_mg": 124.0}]
+    assert all(type(v) is float for k, v in items[0].items() if k != "name")
+
+
+def test_multi_food_query_is_segmented_longest_match_first():
+    db = _db()
+    names = [i["name"] for i in db.lookup("chicken breast with brown rice and a banana")]
+    assert names == ["chicken breast", "brown rice", "banana"]
+
+
+def test_fuzzy_match_tolerates_typos():
+    db = _db()
+    idx, score = db.fuzzy("boiled egs")
+    assert db.names[idx] == "boiled eggs"
+    assert FUZZY_MIN <= score < 1.0
+    assert [i["name"] for i in db.lookup("brown rcie")] == ["brown rice"]
+
+
+def test_unknown_food_falls_through():
+    db = _db()
+    assert db.lookup("xylophone quartz") is None
+    assert db.lookup("   ") is None
+
+
+def test_prefix_search():
+    db = _db()
+    assert db.prefix("chicken b") == ["chicken biryani", "chicken breast", "chicken breast rice",
+                                      "chicken burrito bowl"]
+    assert db.prefix("zzz") == []
+
+
+def test_nutrition_agent_uses_local_db_before_the_api(monkeypatch):
+    remote = []
+    monkeypatch.setattr(NutritionAgent, "_fetch_remote", lambda self, q: remote.append(q) or [{"name": "api"}])
+    agent = NutritionAgent()
+
+    assert agent._fetch_nutrition("Banana") == get_food_db().lookup("banana")
+    assert remote == []
+    assert agent._fetch_nutrition("xylophone quartz") == [{"name": "api"}]
+    assert remote == ["xylophone quartz"]
+
+
+def test_meal_plan_items_are_scaled_db_records(monkeypatch):
+    monkeypatch.setattr(nutrition_agent, "log_event", lambda *a, **k: None)
+    monkeypatch.setattr(NutritionAgent, "_latest_weight", lambda self, uid: 70.0)
+    profile = canonicalize({"age": 30, "goal": "General Fitness", "level": "Beginner"})
+    db = get_food_db()
+    meals = NutritionAgent().generate("test-food-db", profile, days=1)
+    assert len(meals) == 1
+    for meal, info in zip(meals[0]["meals"], meals[0]["nutrition_info"]):
+        rec = db.lookup(meal["item"])[0]
+        assert info["name"] == rec["name"]
+        assert info["calories"] == round(rec["calories"] * meal["servings"], 1)
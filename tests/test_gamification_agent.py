@@ -0,0 +1,62 @@
+# tests/test_gamification_agent.py
+import copy
+import uuid
+from datetime import date
+from agents.base_agent import STATE
+from agents.gamification_agent import GamificationAgent
+
+
+def _log(uid: str, n: int) -> None:
+    for _ in range(n):
+        STATE.append(uid, "progress", {"date": date.today().isoformat(), "workout_minutes": 10})
+
+
+def _move(uid: str, leaving: GamificationAgent) -> None:
+    """What /internal/export + /internal/drop + /internal/import do to one worker's view."""
+    state, version = copy.deepcopy(STATE.export_user(uid)), STATE.version(uid)
+    STATE.drop_user(uid)
+    leaving.forget(uid)
+    STATE.import_user(uid, state, version)
+
+
+def test_returning_user_is_not_re_awarded():
+    here, there, uid = GamificationAgent(), GamificationAgent(), f"test-{uuid.uuid4().hex}"
+    _log(uid, 1)
+    here.evaluate(uid)
+    _move(uid, here)
+    _log(uid, 4)
+    there.evaluate(uid)
+    _move(uid, there)
+    names = [b["name"] for b in here.evaluate(uid)["badges"]]
+    assert "Logbook 5" in names
+    assert len(names) == len(set(names))
+
+
+def test_rebuilt_tracker_does_not_move_old_history_to_today(monkeypatch):
+    import agents.progress_agent
+    from datetime import timedelta
+    from agents.progress_agent import ProgressAgent, ProgressLog
+
+    class LastMonth(date):
+        @classmethod
+        def today(cls):
+            return date.today() - timedelta(days=30)
+
+    uid = f"test-{uuid.uuid4().hex}"
+    monkeypatch.setattr(agents.progress_agent, "date", LastMonth)
+    for _ in range(5):  # undated, as ProgressRequest sends them
+        ProgressAgent().log(uid, ProgressLog(workout_minutes=30))
+    monkeypatch.undo()
+
+    names = [b["name"] for b in GamificationAgent().evaluate(uid)["badges"]]
+    assert "Logbook 5" in names
+    assert "Consistency Star" not in names
+
+
+def test_legacy_undated_entries_count_only_towards_totals():
+    uid = f"test-{uuid.uuid4().hex}"
+    for _ in range(5):
+        STATE.append(uid, "progress", {"workout_minutes": 30})
+    names = [b["name"] for b in GamificationAgent().evaluate(uid)["badges"]]
+    assert "Logbook 5" in names
+    assert "Consistency Star" not in names and not any(n.startswith("Streak") for n in names)
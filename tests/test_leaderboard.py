@@ -0,0 +1,56 @@
+# tests/test_leaderboard.py
+import uuid
+from datetime import date
+from agents.base_agent import STATE
+from agents.leaderboard import Leaderboards, board_scores
+from agents.snapshot import decode_users, encode_users
+
+
+def _state() -> dict:
+    today = date.today().isoformat()
+    return {
+        "profile": {"goal": "Fat Loss", "level": "Beginner"},
+        "progress": [{"date": today, "workout_minutes": 40, "kcals_burned": 300} for _ in range(3)],
+        "wearables": [{"date": today, "steps": 9000}],
+    }
+
+
+def test_lazy_user_is_ranked_without_decoding():
+    uid = f"test-{uuid.uuid4().hex}"
+    blob = encode_users([(uid, 5, _state())], summarize=board_scores)
+    [(_, version, loader)] = decode_users(blob, lazy=True)
+    STATE.import_user_lazy(uid, loader, version)
+    try:
+        boards = Leaderboards()
+        boards.load(uid)
+        assert STATE.lazy_loader(uid) is loader  # still encoded
+        assert boards.rank("weekly_kcals", uid)["score"] == 900.0
+        assert boards.rank("weekly_steps", uid)["cohort"] == "fat_loss/beginner"
+    finally:
+        STATE.drop_user(uid)
+
+
+def test_saved_scores_match_a_full_load():
+    uid = f"test-{uuid.uuid4().hex}"
+    STATE.import_user(uid, _state(), 1)
+    try:
+        decoded, saved = Leaderboards(), Leaderboards()
+        decoded.load(uid)
+        [(_, _, loader)] = decode_users(encode_users([(uid, 1, _state())], summarize=board_scores), lazy=True)
+        STATE.import_user_lazy(uid, loader, 2)
+        saved.load(uid)
+        for metric in ("adherence", "weekly_kcals", "weekly_steps"):
+            assert saved.rank(metric, uid) == decoded.rank(metric, uid)
+    finally:
+        STATE.drop_user(uid)
+
+
+def test_user_without_profile_is_ranked_overall():
+    from agents.orchestrator import Orchestrator
+    orc, uid = Orchestrator(precompute=False), f"test-{uuid.uuid4().hex}"
+    orc.handle_event("log_progress", uid, {"date": date.today().isoformat(), "workout_minutes": 45})
+    rank = orc.handle_event("get_rank", uid, {"metric": "adherence"})
+    assert rank["scope"] == "all"
+    # what Router.rank asks every worker for with a cohort-scoped answer
+    standing = orc.handle_event("get_percentile", uid, {"metric": "adherence", "value": rank["score"]})
+    assert standing["total"] == rank["total"]
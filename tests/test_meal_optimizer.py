@@ -0,0 +1,89 @@
+# tests/test_meal_optimizer.py
+import numpy as np
+import pytest
+from agents.food_db import FoodDB, compile_csv, get_food_db
+from agents.meal_optimizer import MACROS, PORTIONS, SLOTS, TOLERANCE, MealOptimizer, daily_targets
+from agents.profile_agent import canonicalize
+
+
+def _profile(goal="General Fitness", level="Beginner", constraints=()):
+    return canonicalize({"age": 30, "goal": goal, "level": level, "constraints": list(constraints)})
+
+
+@pytest.mark.parametrize("goal", ["Fat Loss", "Muscle Gain", "Endurance", "General Fitness"])
+@pytest.mark.parametrize("level", ["Beginner", "Intermediate"])
+def test_days_land_within_tolerance_of_the_targets(goal, level):
+    db = get_food_db()
+    profile = _profile(goal, level)
+    plan = MealOptimizer(db).plan(profile, days=7, weight_kg=70)
+
+    assert plan["targets"] == daily_targets(profile, 70)
+    assert plan["met"] is True
+    assert len(plan["days"]) == 7
+    for day in plan["days"]:
+        assert day["off_target"] == {}
+        for m in MACROS:
+            assert abs(day["totals"][m] - plan["targets"][m]) <= TOLERANCE[m] * plan["targets"][m]
+        # totals are the served portions of the foods' own values
+        expect = sum(np.array([db.columns[m][meal["food_id"]] for m in MACROS]) * meal["servings"]
+                     for meal in day["meals"])
+        assert [day["totals"][m] for m in MACROS] == pytest.approx(expect.tolist(), abs=0.1)
+
+
+@pytest.mark.parametrize("constraints,banned", [
+    (["no dairy", "no gluten"], {"dairy", "gluten"}),
+    (["nut allergy", "no fish"], {"nuts", "fish"}),
+])
+def test_excluded_food_groups_never_appear(constraints, banned):
+    db = get_food_db()
+    plan = MealOptimizer(db).plan(_profile(constraints=constraints), days=7)
+    assert set(plan["exclude"]) == banned
+    served = [meal["food_id"] for day in plan["days"] for meal in day["meals"]]
+    assert served
+    assert not any(db.tags[i] & banned for i in served)
+
+
+@pytest.mark.parametrize("constraints,allowed", [
+    (["vegan"], lambda tags: "vegan" in tags),
+    (["pescatarian"], lambda tags: "vegetarian" in tags or "fish" in tags),
+])
+def test_diets_only_serve_allowed_foods(constraints, allowed):
+    db = get_food_db()
+    plan = MealOptimizer(db).plan(_profile(constraints=constraints), days=7)
+    served = [meal["food_id"] for day in plan["days"] for meal in day["meals"]]
+    assert served
+    assert all(allowed(db.tags[i]) for i in served)
+
+
+def test_portions_and_repeats_are_capped():
+    plan = MealOptimizer(get_food_db()).plan(_profile("Muscle Gain", "Advanced"), days=7, weight_kg=95)
+    for day in plan["days"]:
+        assert [m["slot"] for m in day["meals"]] == [s for s, _ in SLOTS]
+        assert all(m["servings"] in PORTIONS.tolist() for m in day["meals"])
+        ids = [m["food_id"] for m in day["meals"]]
+        assert len(ids) == len(set(ids))  # no food twice in one day
+
+
+def test_unreachable_targets_are_reported_not_raised():
+    plan = MealOptimizer(get_food_db()).plan(_profile("Muscle Gain", "Advanced"), days=2, weight_kg=250)
+    assert plan["met"] is False
+    for day in plan["days"]:
+        assert len(day["meals"]) == len(SLOTS)
+        assert all(m["servings"] == PORTIONS.max() for m in day["meals"])  # as close as the caps allow
+        assert day["off_target"]["calories"] < -TOLERANCE["calories"]
+
+
+def test_diet_with_no_allowed_food_returns_empty_days(tmp_path):
+    csv_path = tmp_path / "foods.csv"
+    csv_path.write_text(
+        "name,serving_size_g,calories,protein_g,carbohydrates_total_g,fat_total_g,fiber_g,sugar_g,sodium_mg,tags\n"
+        "cheese omelette,150,300,20,2,23,0,1,400,breakfast;dairy;egg\n"
+        "mac and cheese,300,600,22,70,26,3,6,900,lunch;dinner;dairy;gluten\n"
+        "yogurt,150,90,9,10,1,0,9,60,snack;dairy\n")
+    db = FoodDB(compile_csv(str(csv_path)))
+    plan = MealOptimizer(db).plan(_profile(constraints=["lactose intolerant"]), days=2)
+    assert plan["exclude"] == ["dairy"]
+    assert plan["met"] is False
+    for day in plan["days"]:
+        assert day["meals"] == []
+        assert day["off_target"] == {m: -1.0 for m in MACROS}
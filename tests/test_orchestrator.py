@@ -0,0 +1,43 @@
+# tests/test_orchestrator.py
+import uuid
+from agents.base_agent import STATE
+from agents.orchestrator import Orchestrator
+from agents.replay import stub_backends
+
+PROFILE = {"name": "Test", "age": 30, "goal": "fat_loss", "level": "beginner",
+           "preferences": [], "constraints": ["knee injury"]}
+
+
+def _orchestrator():
+    orc = Orchestrator(precompute=False)
+    stub_backends(orc)
+    return orc, f"test-{uuid.uuid4().hex}"
+
+
+def test_build_plan_has_no_side_effects():
+    orc, uid = _orchestrator()
+    orc.handle_event("create_profile", uid, {"profile": PROFILE})
+    version, logs = STATE.version(uid), len(STATE.get(uid, "logs", []))
+    built = orc._build_plan(uid, 7)
+    assert STATE.version(uid) == version
+    assert len(STATE.get(uid, "logs", [])) == logs
+    assert {entry["agent"] for _, entry in built["logs"]} >= {"WorkoutAgent", "CoordinatorAgent"}
+
+
+def test_generate_plan_commits_build_logs():
+    orc, uid = _orchestrator()
+    orc.handle_event("create_profile", uid, {"profile": PROFILE})
+    orc.handle_event("generate_plan", uid, {"days": 3})
+    agents = [entry["agent"] for entry in STATE.get(uid, "logs", [])]
+    assert "WorkoutAgent" in agents
+    assert agents[-1] == "Orchestrator"
+
+
+def test_rule_stats_counts_rules_that_fire():
+    orc, uid = _orchestrator()
+    orc.handle_event("create_profile", uid, {"profile": PROFILE})
+    orc.handle_event("ingest_wearable", uid, {"sleep_hours": 5, "hr_avg": 80})
+    orc.handle_event("generate_plan", uid, {"days": 3})
+    stats = orc.handle_event("rule_stats", "", {})
+    assert stats["users"] == 1
+    assert stats["rules"] == {"wearable.sleep_hours < 6 or wearable.hr_avg >= 100": 1}
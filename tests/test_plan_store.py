@@ -0,0 +1,42 @@
+# tests/test_plan_store.py
+import random
+import uuid
+from agents.plan_store import CHECKPOINT_EVERY, PlanStore
+
+
+def _uid() -> str:
+    return f"test-{uuid.uuid4().hex}"
+
+
+def _day(day: int, rng: random.Random) -> dict:
+    return {"day": day, "item": rng.choice(["oats", "dal rice", "salad"]), "sets": rng.randint(1, 5)}
+
+
+def test_emptied_section_is_rebuilt_empty():
+    store, uid = PlanStore(), _uid()
+    store.commit(uid, {"workout": [], "nutrition": [{"day": 1, "item": "oats"}]})
+    store.commit(uid, {"workout": [], "nutrition": []})
+    store.commit(uid, {"workout": [{"day": 1, "sets": 2}], "nutrition": []})
+    assert store.get(uid, 1) == {"workout": [], "nutrition": []}
+    assert store.get(uid, 0)["nutrition"] == [{"day": 1, "item": "oats"}]
+
+
+def test_every_version_rebuilds_exactly():
+    rng = random.Random(26)
+    store, uid = PlanStore(), _uid()
+    committed = []
+    for _ in range(2 * CHECKPOINT_EVERY + 8):
+        plan = {s: [_day(d, rng) for d in rng.sample(range(1, 8), rng.randint(0, 4))] for s in ("workout", "nutrition")}
+        store.commit(uid, plan)
+        committed.append(plan)
+    for version, plan in enumerate(committed):
+        assert store.get(uid, version) == plan, version
+
+
+def test_feedback_without_plan_commits_no_version():
+    from agents.orchestrator import Orchestrator
+    orc, uid = Orchestrator(precompute=False), _uid()
+    orc.feedback.interpret = lambda user_id, text: {"workout": {"delta_sets": -1}}
+    result = orc.handle_event("submit_feedback", uid, {"feedback_text": "too hard"})
+    assert result["plan_version"] is None
+    assert orc.plans.count(uid) == 0
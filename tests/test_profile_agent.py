@@ -0,0 +1,19 @@
+# tests/test_profile_agent.py
+import pytest
+from agents.profile_agent import Flag, canonicalize
+
+
+def _flags(constraints=(), preferences=()) -> Flag:
+    return Flag(canonicalize({"constraints": list(constraints), "preferences": list(preferences)}).flags)
+
+
+@pytest.mark.parametrize("text", ["no more than 30 minutes", "see my nutritionist", "no veggies", "noodles with cheese"])
+def test_words_inside_other_words_do_not_match(text):
+    assert _flags(preferences=[text]) == Flag.NONE
+
+
+def test_whole_words_and_plurals_match():
+    assert _flags(constraints=["sore knees"]) == Flag.LOW_IMPACT
+    assert _flags(preferences=["no nuts", "peanut-free snacks"]) == Flag.NO_NUTS
+    assert _flags(preferences=["I don't eat eggs", "allergic to almonds"]) == Flag.NO_EGG | Flag.NO_NUTS
+    assert _flags(constraints=["lactose intolerant"], preferences=["vegetarian"]) == Flag.NO_DAIRY | Flag.VEGETARIAN
@@ -0,0 +1,34 @@
+# tests/test_replay.py
+import uuid
+from agents.base_agent import STATE
+from agents.orchestrator import Orchestrator
+from agents.replay import EventRecorder, normalized_state, read_recording, replay, stub_backends
+
+
+def test_replay_reproduces_the_recorded_state(tmp_path):
+    path = str(tmp_path / "traffic.rec")
+    recorder = EventRecorder(path)
+    orc = Orchestrator(precompute=False, recorder=recorder)
+    stub_backends(orc)
+    uids = [f"test-{uuid.uuid4().hex}" for _ in range(2)]
+    for i, uid in enumerate(uids):
+        orc.handle_event("create_profile", uid, {"profile": {
+            "name": uid, "age": 30 + i, "goal": "fat_loss", "level": "beginner",
+            "preferences": ["vegetarian"], "constraints": ["knee injury"] if i else []}})
+        orc.handle_event("generate_plan", uid, {"days": 3})
+        for minutes in (20, 45, 60, 35):
+            orc.handle_event("log_progress", uid, {"workout_minutes": minutes, "kcals_burned": 10 * minutes})
+        orc.handle_event("ingest_wearable", uid, {"steps": 9000, "sleep_hours": 5.5, "hr_avg": 90})
+        orc.handle_event("submit_feedback", uid, {"feedback_text": "too hard today"})
+        orc.handle_event("generate_plan", uid, {"days": 3})
+        orc.handle_event("get_badges", uid, {})
+    recorder.close()
+    recorded = normalized_state(uids)
+    assert len(list(read_recording(path))) == recorder.records
+
+    report = replay(path, reset=True)
+    assert report["events"] == recorder.records
+    assert report["outcome_mismatches"] == 0
+    assert normalized_state(uids) == recorded
+    for uid in uids:
+        STATE.drop_user(uid)
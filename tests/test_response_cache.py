@@ -0,0 +1,86 @@
+# tests/test_response_cache.py
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from agents.base_agent import STATE
+from agents.replay import stub_backends
+from agents.response_cache import ResponseCache
+
+
+def test_etag_changes_with_version_route_and_user():
+    cache = ResponseCache()
+    tag = cache.etag("progress", "alice", 3)
+    assert tag == cache.etag("progress", "alice", 3)
+    assert tag != cache.etag("progress", "alice", 4)
+    assert tag != cache.etag("badges", "alice", 3)
+    assert tag != cache.etag("progress", "bob", 3)
+    assert tag != ResponseCache().etag("progress", "alice", 3)  # new process, new epoch
+
+
+@pytest.mark.parametrize("header", ['{tag}', 'W/{tag}', '"other", {tag}', '"other",W/{tag}', '*'])
+def test_matching_if_none_match(header):
+    cache = ResponseCache()
+    tag = cache.etag("progress", "alice", 1)
+    assert cache.not_modified(header.format(tag=tag), tag)
+
+
+@pytest.mark.parametrize("header", [None, "", '"other"', 'W/"other", "more"'])
+def test_non_matching_if_none_match(header):
+    cache = ResponseCache()
+    assert not cache.not_modified(header, cache.etag("progress", "alice", 1))
+
+
+def test_lru_eviction_and_version_check():
+    cache = ResponseCache(max_entries=2)
+    cache.put("progress", "a", 1, b"a")
+    cache.put("progress", "b", 1, b"b")
+    assert cache.get("progress", "a", 1) == b"a"  # a is now the most recent
+    cache.put("progress", "c", 1, b"c")
+    assert cache.get("progress", "b", 1) is None
+    assert cache.get("progress", "a", 1) == b"a"
+    assert cache.get("progress", "c", 1) == b"c"
+    assert cache.get("progress", "c", 2) is None  # stale version
+    assert cache.stats()["entries"] == 2
+
+
+@pytest.fixture(scope="module")
+def client():
+    import app
+    stub_backends(app.orc)
+    with TestClient(app.app) as c:
+        yield c
+
+
+@pytest.fixture
+def uid(client):
+    uid = f"test-{uuid.uuid4().hex}"
+    client.post("/create_profile", json={"user_id": uid, "profile": {
+        "name": "Test", "age": 30, "goal": "fat_loss", "level": "beginner"}}).raise_for_status()
+    client.post("/log_progress", json={"user_id": uid, "workout_minutes": 40, "kcals_burned": 300}).raise_for_status()
+    client.post("/generate_plan", json={"user_id": uid, "days": 3}).raise_for_status()
+    client.post("/generate_plan", json={"user_id": uid, "days": 3}).raise_for_status()
+    yield uid
+    STATE.drop_user(uid)
+
+
+@pytest.mark.parametrize("route", ["progress", "badges", "metrics"])
+def test_304_until_a_write_changes_the_etag(client, uid, route):
+    first = client.get(f"/{route}/{uid}")
+    tag = first.headers["etag"]
+    assert client.get(f"/{route}/{uid}", headers={"If-None-Match": tag}).status_code == 304
+    assert client.get(f"/{route}/{uid}", headers={"If-None-Match": f'"x", W/{tag}'}).status_code == 304
+    again = client.get(f"/{route}/{uid}")
+    assert again.headers["etag"] == tag and again.content == first.content
+
+    client.post("/log_progress", json={"user_id": uid, "workout_minutes": 50}).raise_for_status()
+    fresh = client.get(f"/{route}/{uid}", headers={"If-None-Match": tag})
+    assert fresh.status_code == 200 and fresh.headers["etag"] != tag
+
+
+def test_get_routes_do_not_bump_the_state_version(client, uid):
+    version = STATE.version(uid)
+    for path in (f"/progress/{uid}", f"/badges/{uid}", f"/metrics/{uid}", "/leaderboards/adherence",
+                 f"/leaderboards/adherence/users/{uid}", "/leaderboards/adherence/percentile?value=50",
+                 f"/plans/{uid}/versions", f"/plans/{uid}/versions/0", f"/plans/{uid}/diff?from_version=0"):
+        assert client.get(path).status_code == 200, path
+        assert STATE.version(uid) == version, path
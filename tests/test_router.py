@@ -0,0 +1,101 @@
+# tests/test_router.py
+import time
+import uuid
+from types import SimpleNamespace
+import pytest
+import requests
+from fastapi.testclient import TestClient
+from agents.base_agent import STATE
+from agents.hash_ring import HashRing
+from agents.replay import stub_backends
+from router import Router
+
+
+class _Response:
+    def __init__(self, body=None, content=b""):
+        self._body, self.content = body, content
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        pass
+
+
+class _Session:
+    """Two fake workers; w0 owns `users`, and imports fail when asked to."""
+
+    def __init__(self, users, fail_import):
+        self.users, self.fail_import, self.calls = users, fail_import, []
+
+    def get(self, url, **kwargs):
+        return _Response({"users": {uid: 1 for uid in self.users} if url.startswith("http://w0/") else {}})
+
+    def post(self, url, **kwargs):
+        node, path = url[len("http://"):].split("/", 1)
+        self.calls.append((path, node))
+        if path == "internal/import" and self.fail_import:
+            raise requests.ConnectionError("worker went away")
+        return _Response({"status": "ok"}, content=b"blob")
+
+
+def _router(fail_import):
+    session = _Session([], fail_import)
+    router = Router(SimpleNamespace(urls={"w0": "http://w0", "w1": "http://w1"}, session=session), vnodes=16)
+    router.ring.add("w0")
+    target = router.ring.copy()
+    target.add("w1")
+    session.users = [uid for uid in (f"user-{i}" for i in range(50)) if target.node_for(uid) == "w1"]
+    assert session.users
+    return router, target, session
+
+
+def test_rebalance_unranks_on_export_and_drops_after_the_switch():
+    router, target, session = _router(fail_import=False)
+    assert router._rebalance(target) == len(session.users)
+    assert session.calls == [("internal/export", "w0"), ("internal/import", "w1"), ("internal/drop", "w0")]
+    assert router.ring is target
+
+
+def test_failed_import_is_rolled_back():
+    router, target, session = _router(fail_import=True)
+    ring = router.ring
+    with pytest.raises(requests.ConnectionError):
+        router._rebalance(target)
+    # the half-imported copy is forgotten and the old owner ranks its users again
+    assert session.calls == [("internal/export", "w0"), ("internal/import", "w1"),
+                             ("internal/drop", "w1"), ("internal/rank", "w0")]
+    assert router.ring is ring and router._target is None
+
+
+@pytest.fixture(scope="module")
+def worker():
+    import app
+    stub_backends(app.orc)
+    with TestClient(app.app) as c:
+        yield app, c
+
+
+def test_export_unranks_and_rank_restores(worker, monkeypatch):
+    app, client = worker
+    monkeypatch.setattr(app, "INTERNAL_TOKEN", "secret")
+    headers = {"X-Internal-Token": "secret"}
+    uid = f"test-{uuid.uuid4().hex}"
+    client.post("/create_profile", json={"user_id": uid, "profile": {
+        "name": "Test", "age": 30, "goal": "fat_loss", "level": "beginner"}}).raise_for_status()
+    client.post("/log_progress", json={"user_id": uid, "workout_minutes": 40, "kcals_burned": 300}).raise_for_status()
+    try:
+        assert app.orc.leaderboards.rank("weekly_kcals", uid)["score"] == 300.0
+
+        res = client.post("/internal/export", json={"user_ids": [uid]}, headers=headers)
+        assert res.status_code == 200 and res.content
+        assert app.orc.leaderboards.rank("weekly_kcals", uid) is None  # off the boards while moving
+        assert STATE.get(uid, "profile") is not None                    # but still stored here
+
+        assert client.post("/internal/rank", json={"user_ids": [uid]}, headers=headers).json()["ranked"] == 1
+        deadline = time.monotonic() + 5
+        while app.orc.leaderboards.rank("weekly_kcals", uid) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert app.orc.leaderboards.rank("weekly_kcals", uid)["score"] == 300.0
+    finally:
+        client.post("/internal/drop", json={"user_ids": [uid]}, headers=headers)
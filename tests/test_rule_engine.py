@@ -0,0 +1,71 @@
+# tests/test_rule_engine.py
+import pytest
+from agents.rule_engine import FIELDS, RuleEngine, compile_condition
+
+
+@pytest.mark.parametrize("source", [
+    "profile.goal * 100000000000000 == 'x'",
+    "profile.level + 'x' == 'y'",
+    "progress.count * 100000000000000 > 1",
+])
+def test_unsafe_arithmetic_is_rejected(source):
+    with pytest.raises(ValueError):
+        compile_condition(source)
+
+
+def test_arithmetic_error_skips_only_that_rule():
+    engine = RuleEngine()
+    engine.load("u", [
+        {"condition": "wearable.steps / progress.count > 1", "action": "delta_sets(1)"},
+        {"condition": "wearable.steps > 1", "action": "delta_sets(-1)"},
+    ])
+    row = engine.signals({}, {"steps": 100}, {"count": 0})
+    assert [steps for _, steps in engine.evaluate("u", row)] == [(("delta_sets", -1),)]
+
+
+def test_text_comparisons_ignore_case():
+    engine = RuleEngine()
+    row = engine.signals({"goal": "Fat Loss", "level": "Beginner"}, {}, {})
+    assert compile_condition("profile.goal == 'Fat Loss'").scalar(row)
+    assert compile_condition("profile.level in ('BEGINNER', 'Intermediate')").scalar(row)
+
+
+PARITY_CONDITIONS = [
+    "wearable.steps / progress.count > 10",
+    "progress.count == 0 or wearable.steps / progress.count > 10",
+    "progress.count > 0 and wearable.steps / progress.count > 10",
+    "not (wearable.sleep_hours < 6)",
+    "wearable.hr_avg >= 100 or wearable.sleep_hours < 6",
+    "0 < progress.count < wearable.steps / progress.count",
+    "profile.goal in ('Fat Loss', 'endurance') and not profile.level == 'Advanced'",
+    "-wearable.hr_rest + 2 * wearable.hr_avg > 150",
+    "profile.goal > 5",
+]
+
+
+@pytest.mark.parametrize("source", ["progress.count and wearable.steps > 5000", "not progress.count", "wearable.steps"])
+def test_truthiness_of_fields_is_rejected(source):
+    with pytest.raises(ValueError):
+        compile_condition(source)
+
+
+def test_batch_matches_scalar_evaluation():
+    import random
+    rng = random.Random(27)
+    engine, rows, uids = RuleEngine(), [], []
+    for i in range(300):
+        uid = f"u{i}"
+        engine.load(uid, [{"condition": c, "action": "delta_sets(1)"}
+                          for c in rng.sample(PARITY_CONDITIONS, rng.randint(1, len(PARITY_CONDITIONS)))])
+        pick = lambda *values: rng.choice(values)
+        rows.append(engine.signals(
+            {"goal": pick("Fat Loss", "Endurance", None), "level": pick("Advanced", "Beginner", None)},
+            {"steps": pick(0, 900, 12000, None), "sleep_hours": pick(5, 8, None),
+             "hr_avg": pick(90, 120, None), "hr_rest": pick(50, 70, None)},
+            {"count": pick(0, 1, 30, None)},
+        ))
+        uids.append(uid)
+    columns = {name: [row[name.replace(".", "__")] for row in rows] for name in FIELDS}
+    batch = engine.evaluate_batch(uids, columns)
+    for uid, row in zip(uids, rows):
+        assert [c.source for c, _ in batch[uid]] == [c.source for c, _ in engine.evaluate(uid, row)], row
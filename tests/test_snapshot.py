@@ -0,0 +1,94 @@
+# tests/test_snapshot.py
+import json
+import marshal
+import os
+import zlib
+from agents.base_agent import MemoryStore
+from agents.snapshot import (_COLS_TAG, _HEADER, _FLAG_ZLIB, MAGIC, _Packer, MARSHAL_VERSION, LazyUser, Snapshotter, decode_users,
+                             encode_user, encode_users)
+
+
+def _state() -> dict:
+    day = {"day": 1, "exercises": ["Squats"], "sets": 3}
+    return {
+        "profile": {"name": "Alice", "age": 31, "goal": "Fat Loss", "constraints": []},
+        # same-shaped records: packed as columns, with None in int, float and text columns
+        "progress": [{"date": f"2026-01-0{i + 1}", "weight_kg": None if i == 2 else 70.5 - i,
+                      "workout_minutes": None if i == 1 else 30 + i, "notes": None} for i in range(6)],
+        # records with missing keys: not columnar, must survive as they are
+        "wearables": [{"steps": 9000}, {"steps": 7000, "sleep_hours": 6.5}, {}, {"hr_avg": 90}],
+        "big": [{"n": 2 ** 70} for _ in range(4)],  # beyond int64: not packed
+        "plans": {"workout": [day], "nutrition": []},
+        "plan_versions": [{"version": 0, "checkpoint": {"workout": [day]}}],
+        "flags": (1, "two", None, True, b"\x00"),
+    }
+
+
+def test_encode_decode_round_trip():
+    state = _state()
+    packed = _Packer().pack_state(state)
+    assert packed["progress"][0] == _COLS_TAG
+    assert isinstance(packed["wearables"], list) and isinstance(packed["big"], list)
+    [(uid, version, decoded)] = decode_users(encode_users([("alice", 7, state)]))
+    assert (uid, version, decoded) == ("alice", 7, state)
+    # shared objects are written once and shared again on restore
+    assert decoded["plans"]["workout"][0] is decoded["plan_versions"][0]["checkpoint"]["workout"][0]
+
+
+def test_uncompressed_and_lazy_decode():
+    blob = encode_users([("alice", 1, _state())], compress=False)
+    [(_, _, loader)] = decode_users(blob, lazy=True)
+    assert isinstance(loader, LazyUser) and loader() == _state()
+
+
+def test_incremental_chain_with_dropped_user(tmp_path):
+    store = MemoryStore()
+    snaps = Snapshotter(str(tmp_path), shards=4, store=store)
+    for uid in ("alice", "bob", "carol"):
+        store.import_user(uid, _state(), 1)
+    assert snaps.snapshot()["kind"] == "full"
+    store.append("bob", "progress", {"date": "2026-02-01", "weight_kg": 69.0})
+    assert snaps.snapshot()["users"] == 1
+    store.drop_user("alice")
+    store.set("dave", "profile", {"name": "Dave"})
+    inc = snaps.snapshot()
+    assert (inc["kind"], inc["users"], inc["dropped"]) == ("incremental", 1, 1)
+    assert len(snaps.manifest()["generations"]) == 3
+
+    restored = MemoryStore()
+    assert Snapshotter(str(tmp_path), store=restored).restore(lazy=False)["users"] == 3
+    assert sorted(restored.user_ids()) == ["bob", "carol", "dave"]
+    for uid in ("bob", "carol", "dave"):
+        assert restored.export_user(uid) == store.export_user(uid)
+        assert restored.version(uid) == store.version(uid)
+
+
+def test_lazy_restore_decodes_on_first_access(tmp_path):
+    store = MemoryStore()
+    store.import_user("alice", _state(), 3)
+    Snapshotter(str(tmp_path), store=store).snapshot()
+
+    restored = MemoryStore()
+    Snapshotter(str(tmp_path), store=restored).restore()
+    assert isinstance(restored.lazy_loader("alice"), LazyUser)
+    assert restored.version("alice") == 3
+    assert restored.get("alice", "profile") == _state()["profile"]
+    assert restored.lazy_loader("alice") is None
+    assert restored.export_user("alice") == _state()
+
+
+def test_reads_format_version_1(tmp_path):
+    # version 1: (user_id, version, blob) records, no summary
+    payload = zlib.compress(marshal.dumps([("alice", 4, encode_user(_state()))], MARSHAL_VERSION), 1)
+    blob = _HEADER.pack(MAGIC, 1, _FLAG_ZLIB, MARSHAL_VERSION) + payload
+    [(uid, version, loader)] = decode_users(blob, lazy=True)
+    assert (uid, version, loader.summary, loader()) == ("alice", 4, None, _state())
+
+    with open(os.path.join(tmp_path, "g000000-s0000.fsnap"), "wb") as f:
+        f.write(blob)
+    with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+        json.dump({"format": 1, "shards": 1, "generations": [
+            {"id": 0, "kind": "full", "ts": 0, "users": 1, "bytes": len(blob), "shards": [0]}]}, f)
+    store = MemoryStore()
+    Snapshotter(str(tmp_path), store=store).restore()
+    assert store.export_user("alice") == _state()
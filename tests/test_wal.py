@@ -0,0 +1,135 @@
+# tests/test_wal.py
+import glob
+import os
+import time
+import pytest
+from agents.base_agent import MemoryStore
+from agents.wal import WriteBehindLog, read_segment
+
+
+def _open(directory: str) -> tuple:
+    store = MemoryStore()
+    wal = WriteBehindLog(directory, store=store, snapshot_shards=4)
+    wal.open()
+    return store, wal
+
+
+def test_dropped_user_stays_dropped_after_checkpoint(tmp_path):
+    store, wal = _open(str(tmp_path))
+    store.set("alice", "profile", {"name": "Alice"})
+    store.set("bob", "profile", {"name": "Bob"})
+    wal.checkpoint()
+    store.drop_user("alice")
+    assert wal.checkpoint()["kind"] == "incremental"
+    wal.close(checkpoint=False)
+
+    store, wal = _open(str(tmp_path))
+    try:
+        assert store.user_ids() == ["bob"]
+        assert store.get("bob", "profile") == {"name": "Bob"}
+    finally:
+        wal.close(checkpoint=False)
+
+
+def test_user_readded_after_drop_is_restored(tmp_path):
+    store, wal = _open(str(tmp_path))
+    store.set("alice", "profile", {"name": "Alice"})
+    wal.checkpoint()
+    store.drop_user("alice")
+    wal.checkpoint()
+    store.set("alice", "profile", {"name": "Alice 2"})
+    wal.checkpoint()
+    wal.close(checkpoint=False)
+
+    store, wal = _open(str(tmp_path))
+    try:
+        assert store.get("alice", "profile") == {"name": "Alice 2"}
+    finally:
+        wal.close(checkpoint=False)
+
+
+def _wait(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.mark.parametrize("policy, synced", [("always", True), ("interval", True), ("never", False)])
+def test_fsync_policy_without_further_traffic(tmp_path, policy, synced):
+    store = MemoryStore()
+    wal = WriteBehindLog(str(tmp_path), store=store, fsync=policy, fsync_interval_s=0.2)
+    wal.open()
+    try:
+        store.set("alice", "profile", {"name": "Alice"})
+        assert _wait(lambda: wal.stats()["records"] == 1)
+        # "interval" must fsync on its own once the interval passes, with no later write to trigger it
+        assert _wait(lambda: wal.stats()["fsyncs"] > 0, timeout=2.0) == synced
+    finally:
+        wal.close(checkpoint=False)
+
+
+def _segment(directory: str) -> str:
+    [path] = glob.glob(os.path.join(directory, "wal", "wal-*.log"))
+    return path
+
+
+def _write_segment(directory: str, names) -> str:
+    store, wal = _open(directory)
+    for name in names:
+        store.set(name, "profile", {"name": name})
+    wal.close(checkpoint=False)
+    for path in glob.glob(os.path.join(directory, "wal", "wal-*.log")):
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+    return _segment(directory)
+
+
+def test_torn_tail_is_dropped_on_recovery(tmp_path):
+    path = _write_segment(str(tmp_path), ["alice", "bob"])
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00\x01\x02")  # a frame header cut short by a crash
+    store, wal = _open(str(tmp_path))
+    try:
+        assert sorted(store.user_ids()) == ["alice", "bob"]
+    finally:
+        wal.close(checkpoint=False)
+
+
+def test_crc_corrupt_tail_is_dropped_on_recovery(tmp_path):
+    path = _write_segment(str(tmp_path), ["alice", "bob"])
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    records, clean = read_segment(path)
+    assert not clean and [r[1] for r in records] == ["alice"]
+    store = MemoryStore()
+    assert WriteBehindLog(str(tmp_path), store=store).recover()["clean_tail"] is False
+    assert store.user_ids() == ["alice"]
+
+
+def test_failing_writes_do_not_hang_flush_or_close(tmp_path, monkeypatch):
+    store = MemoryStore()
+    wal = WriteBehindLog(str(tmp_path), store=store, max_retries=2, retry_wait_s=0.01)
+    wal.open()
+
+    def broken(group):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(wal, "_commit", broken)
+    store.set("alice", "profile", {"name": "Alice"})
+    assert wal.flush(timeout=5) is False
+    assert wal.stats()["failed"]
+    store.set("bob", "profile", {"name": "Bob"})
+    assert wal.stats()["dropped"] == 1
+    wal.close()  # the closing checkpoint still persists both users
+
+    store, wal = _open(str(tmp_path))
+    try:
+        assert sorted(store.user_ids()) == ["alice", "bob"]
+    finally:
+        wal.close(checkpoint=False)